@@ -0,0 +1,73 @@
+"""
+Asset discovery on a large page: one findAll per asset kind
+(the way get_page_assets used to work) against one walk driven by the rules table
+
+    python -m benchmarks.discovery [--elements 50000] [--repeat 5]
+"""
+import argparse
+import timeit
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from page_loader.discovery import ASSET_RULES, find_assets
+
+PAGE_URL = "https://foo.bar/page"
+
+ELEMENT_TEMPLATES = (
+    '<div class="card"><p>paragraph {index}</p></div>',
+    '<img src="/images/{index}.png" srcset="/images/{index}@2x.png 2x">',
+    '<script src="/js/{index}.js"></script>',
+    '<link href="/css/{index}.css" rel="stylesheet">',
+    '<span><a href="/pages/{index}">link {index}</a></span>',
+    '<video src="/media/{index}.mp4"></video>',
+)
+
+
+def generate_page(elements: int) -> str:
+    body = "".join(
+        ELEMENT_TEMPLATES[index % len(ELEMENT_TEMPLATES)].format(index=index)
+        for index in range(elements)
+    )
+    return f"<html><body>{body}</body></html>"
+
+
+def find_assets_per_tag(soup: BeautifulSoup, page_url: str) -> Dict[str, List[Tag]]:
+    # one full walk per rule
+    domain = urlsplit(page_url).netloc
+    assets: Dict[str, List[Tag]] = {}
+    for rule in ASSET_RULES:
+        assets.setdefault(rule.attribute, []).extend(
+            tag
+            for tag in soup.findAll(rule.tag)
+            if tag.attrs.get(rule.attribute)
+            and rule.accepts(tag.attrs[rule.attribute], domain)
+        )
+    return assets
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--elements", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    soup = BeautifulSoup(generate_page(args.elements), features="html.parser")
+    assert find_assets_per_tag(soup, PAGE_URL) == find_assets(soup, PAGE_URL)
+
+    print(f"{args.elements} elements, best of {args.repeat} runs")
+    for name, function in (
+        ("walk per rule", find_assets_per_tag),
+        ("single walk", find_assets),
+    ):
+        seconds = min(
+            timeit.repeat(
+                lambda: function(soup, PAGE_URL), number=1, repeat=args.repeat
+            )
+        )
+        print(f"{name:>14}: {seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
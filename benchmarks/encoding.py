@@ -0,0 +1,71 @@
+"""
+Page encoding guessed by BeautifulSoup (UnicodeDammit) against the encoding
+detected from the Content-Type header and <meta> prescan: time of the decoding
+step, whole parsing time and whether the page text is decoded right
+Guessing cost depends on the installed detector (cchardet, chardet or none)
+
+    python -m benchmarks.encoding [--elements 20000] [--repeat 5]
+"""
+import argparse
+import timeit
+from typing import Optional
+
+from bs4.dammit import UnicodeDammit, chardet_type
+from page_loader.core import parse_page
+from page_loader.encoding import detect_encoding
+
+CONTENT_TYPE = "text/html; charset=windows-1251"
+
+
+def generate_page(elements: int) -> bytes:
+    # no <meta charset>, the parser has to guess by the content
+    body = "".join(
+        f"<div><p>Абзац номер {index}</p><a href='/pages/{index}'>ссылка</a></div>"
+        for index in range(elements)
+    )
+    return f"<html><body>{body}</body></html>".encode("cp1251")
+
+
+def decode(page: bytes, encoding: Optional[str]) -> Optional[str]:
+    # the same decoding step BeautifulSoup runs for bytes
+    known_encodings = [encoding] if encoding else []
+    return UnicodeDammit(page, known_encodings, is_html=True).unicode_markup
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--elements", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    page = generate_page(args.elements)
+    expected_text = page.decode("cp1251")
+
+    detector = getattr(chardet_type, "__module__", None) if chardet_type else None
+    print(
+        f"{args.elements} elements ({len(page)} bytes), best of {args.repeat} runs, "
+        f"detector: {detector or 'none'}"
+    )
+    for name, get_encoding in (
+        ("guessed", lambda: None),
+        ("detected", lambda: detect_encoding(page, CONTENT_TYPE)),
+    ):
+        decoding = min(
+            timeit.repeat(
+                lambda: decode(page, get_encoding()), number=1, repeat=args.repeat
+            )
+        )
+        parsing = min(
+            timeit.repeat(
+                lambda: parse_page(page, get_encoding()), number=1, repeat=args.repeat
+            )
+        )
+        correct = decode(page, get_encoding()) == expected_text
+        print(
+            f"{name:>9}: decoding {decoding * 1000:.1f} ms, "
+            f"parsing {parsing * 1000:.1f} ms, text is decoded right: {correct}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Page with many same-origin assets downloaded over HTTP/1.1 (a connection
+per concurrent asset) against HTTP/2 (DownloadOptions(http2=True), assets
+multiplexed over one connection) from the local TLS server speaking both,
+the server delays every response to emulate the round trip.
+Needs the http2 extra and the openssl command for the self-signed certificate
+
+    python -m benchmarks.http2 [--assets 200] [--workers 16] [--latency 0.02]
+"""
+import argparse
+import heapq
+import os
+import select
+import socket
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, List, Tuple
+
+import h2.config
+import h2.connection
+import h2.events
+from page_loader import http2
+from page_loader.core import download
+from page_loader.options import DownloadOptions
+from page_loader.scheduling import SchedulerSettings, configure_scheduler
+
+ASSET = b"\x89PNG" + b"x" * 4092
+
+
+def generate_page(assets: int) -> bytes:
+    images = "".join(f'<img src="/assets/{index}.png">' for index in range(assets))
+    return f"<html><body>{images}</body></html>".encode()
+
+
+def create_certificate(folder: Path) -> Tuple[Path, Path]:
+    certificate, key = folder.joinpath("cert.pem"), folder.joinpath("key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+            "-keyout", str(key), "-out", str(certificate), "-days", "1",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+        ],
+        check=True,
+        capture_output=True,
+    )  # fmt: skip
+    return certificate, key
+
+
+class BenchmarkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, context: ssl.SSLContext, page: bytes, latency: float):
+        super().__init__(("localhost", 0), Handler)
+        self.context = context
+        self.page = page
+        self.latency = latency
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def get_request(self) -> Tuple[socket.socket, Tuple[str, int]]:
+        sock, address = super().get_request()
+        # the handshake is made by the connection thread
+        wrapped = self.context.wrap_socket(
+            sock, server_side=True, do_handshake_on_connect=False
+        )
+        return wrapped, address
+
+    def get_body(self, path: str) -> bytes:
+        return self.page if path == "/" else ASSET
+
+    def count_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: BenchmarkServer
+
+    def setup(self) -> None:
+        self.request.do_handshake()
+        self.server.count_connection()
+        super().setup()
+
+    def handle(self) -> None:
+        if self.request.selected_alpn_protocol() == "h2":
+            serve_h2(self.request, self.server)
+        else:
+            super().handle()
+
+    def do_GET(self) -> None:  # noqa: N802
+        time.sleep(self.server.latency)
+        body = self.server.get_body(self.path)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def serve_h2(sock: ssl.SSLSocket, server: BenchmarkServer) -> None:
+    connection = h2.connection.H2Connection(
+        h2.config.H2Configuration(client_side=False)
+    )
+    connection.initiate_connection()
+    sock.sendall(connection.data_to_send())
+    # responses are sent after the latency without blocking the other streams
+    due: List[Tuple[float, int, str]] = []
+    pending: Dict[int, bytes] = {}
+    while True:
+        timeout = max(due[0][0] - time.monotonic(), 0) if due else None
+        if sock.pending() or select.select([sock], [], [], timeout)[0]:
+            if not receive_requests(sock, connection, due, server.latency):
+                return
+        while due and due[0][0] <= time.monotonic():
+            __, stream_id, path = heapq.heappop(due)
+            body = server.get_body(path)
+            connection.send_headers(
+                stream_id, [(":status", "200"), ("content-length", str(len(body)))]
+            )
+            pending[stream_id] = body
+        send_pending(connection, pending)
+        sock.sendall(connection.data_to_send())
+
+
+def receive_requests(
+    sock: ssl.SSLSocket,
+    connection: h2.connection.H2Connection,
+    due: List[Tuple[float, int, str]],
+    latency: float,
+) -> bool:
+    data = sock.recv(65535)
+    if not data:
+        return False
+    for event in connection.receive_data(data):
+        if isinstance(event, h2.events.RequestReceived):
+            path = dict(event.headers)[b":path"].decode()
+            heapq.heappush(due, (time.monotonic() + latency, event.stream_id, path))
+    return True
+
+
+def send_pending(
+    connection: h2.connection.H2Connection, pending: Dict[int, bytes]
+) -> None:
+    # the rest waits for the window update of the client
+    for stream_id, body in list(pending.items()):
+        size = min(
+            connection.local_flow_control_window(stream_id),
+            connection.max_outbound_frame_size,
+        )
+        while body and size > 0:
+            connection.send_data(stream_id, body[:size])
+            body = body[size:]
+            size = min(
+                connection.local_flow_control_window(stream_id),
+                connection.max_outbound_frame_size,
+            )
+        pending[stream_id] = body
+        if not body:
+            connection.end_stream(stream_id)
+            del pending[stream_id]
+
+
+def run(server: BenchmarkServer, options: DownloadOptions) -> Tuple[float, int]:
+    configure_scheduler(
+        SchedulerSettings(
+            rate=None,
+            max_concurrency=options.asset_workers,
+            initial_concurrency=options.asset_workers,
+        )
+    )
+    http2.close_client()
+    server.connections = 0
+    page_url = f"https://localhost:{server.server_address[1]}/"
+    with TemporaryDirectory() as folder:
+        started_at = time.perf_counter()
+        download(page_url, Path(folder), options)
+        seconds = time.perf_counter() - started_at
+    return seconds, server.connections
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--assets", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as folder:
+        certificate, key = create_certificate(Path(folder))
+        os.environ["REQUESTS_CA_BUNDLE"] = str(certificate)
+        os.environ["SSL_CERT_FILE"] = str(certificate)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certificate, key)
+        context.set_alpn_protocols(["h2", "http/1.1"])
+        server = BenchmarkServer(context, generate_page(args.assets), args.latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(
+            f"{args.assets} assets of {len(ASSET)} bytes, {args.workers} workers, "
+            f"{args.latency * 1000:.0f} ms latency"
+        )
+        for name, use_http2 in (("HTTP/1.1", False), ("HTTP/2", True)):
+            options = DownloadOptions(asset_workers=args.workers, http2=use_http2)
+            seconds, connections = run(server, options)
+            print(
+                f"{name:>10}: {seconds:.2f} s, {args.assets / seconds:.0f} assets/s, "
+                f"{connections} connections"
+            )
+        http2.close_client()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Memory of the page pipeline (process_page_content stages) over synthetic
+pages of increasing size: tracemalloc peak of every stage and peak RSS
+of a fresh process per page, both checked against MEMORY_BUDGETS.
+Assets are replayed from the recorded corpus, so no network is needed
+
+    python -m benchmarks.memory [--sizes 1 2 4] [--top 5] [--no-rss]
+
+Exits with 1 if any budget is exceeded
+"""
+import argparse
+import multiprocessing
+import re
+import sys
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from page_loader.context import DownloadContext
+from page_loader.core import (
+    get_page_assets,
+    parse_page,
+    process_assets,
+    update_page_assets,
+)
+from page_loader.file_operations import (
+    FileWriter,
+    generate_file_name_from_page_url,
+    generate_file_name_prefix_from_page_url,
+)
+from page_loader.options import DownloadOptions
+from page_loader.recording import (
+    RecordedResponse,
+    Recorder,
+    RecordingSettings,
+    configure_recording,
+)
+
+try:
+    import resource
+except ImportError:  # peak RSS isn't measured on Windows
+    resource = None  # type: ignore[assignment]
+
+MB = 1024 * 1024
+PAGE_URL = "https://foo.bar/page"
+# one image per element, so a page has an asset per ASSET_EVERY elements
+ASSET_EVERY = 40
+ASSET = b"\x89PNG" + b"x" * 4092
+ELEMENT = (
+    '<div class="card"><h2>Card {index}</h2><p>Paragraph {index} of the card, '
+    "long enough to look like a page text rather than markup only.</p>"
+    '<a href="/pages/{index}">more</a></div>'
+)
+IMAGE_SRC_PATTERN = re.compile(rb'<img src="([^"]+)">')
+PROC_STATUS = Path("/proc/self/status")
+PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+PEAK_RSS_PATTERN = re.compile(r"VmHWM:\s+(\d+) kB")
+OPTIONS = DownloadOptions(asset_workers=4)
+
+# Budgets in MB per MB of the page: the peak traced by tracemalloc while
+# the stage runs (everything kept alive by the previous stages included),
+# and the peak RSS growth of the whole pipeline. Measured with bs4 4.10
+# html.parser on CPython 3.11 plus ~25% headroom, the ratios are about
+# the same for 0.25M-4M pages, so the pipeline memory grows linearly
+MEMORY_BUDGETS: Dict[str, float] = {
+    # raw page and the soup, ~24x of the page
+    "parse": 31.0,
+    # asset tags found in the soup
+    "find assets": 30.0,
+    # asset bodies are handed to the writer as they are downloaded, not kept
+    "download assets": 33.0,
+    # attributes are updated in place (no soup copy), the page is prettified
+    "rewrite": 35.0,
+    # the prettified page is queued and written
+    "write": 35.0,
+    "peak rss": 40.0,
+}
+
+
+@dataclass(frozen=True)
+class StageMemory:
+    name: str
+    # bytes traced at the end of the stage and at its peak
+    current: int
+    peak: int
+    top: List[str] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class PageMemory:
+    page_size: int
+    stages: List[StageMemory]
+    # peak RSS growth while the page is processed, None if it isn't measured
+    peak_rss: Optional[int] = None
+
+
+def generate_page(size: int) -> bytes:
+    # about size bytes of cards with an image per ASSET_EVERY cards
+    parts = ["<html><head><title>Memory</title></head><body>"]
+    length = 0
+    index = 0
+    while length < size:
+        part = ELEMENT.format(index=index)
+        if index % ASSET_EVERY == 0:
+            part += f'<img src="/images/{index}.png">'
+        parts.append(part)
+        length += len(part)
+        index += 1
+    parts.append("</body></html>")
+    return "".join(parts).encode()
+
+
+def get_asset_urls(page: bytes) -> List[str]:
+    # not parsed, the soup would raise RSS high-water mark before the pipeline
+    return [f"https://foo.bar{src.decode()}" for src in IMAGE_SRC_PATTERN.findall(page)]
+
+
+def record_assets(corpus: Path, page: bytes) -> None:
+    recorder = Recorder(corpus)
+    for url in get_asset_urls(page):
+        response = RecordedResponse(200, {"Content-Type": "image/png"}, ASSET, None)
+        recorder.record(url, None, response)
+    recorder.close()
+
+
+class StageProfiler:
+    """
+    Records traced memory of the pipeline stages, peaks are counted from
+    the memory traced when the profiler is created, so the page itself
+    and everything allocated by the previous stages is included
+    """
+
+    def __init__(self, top: int = 0):
+        self.top = top
+        self.stages: List[StageMemory] = []
+        self._baseline = tracemalloc.get_traced_memory()[0]
+        self._snapshot = tracemalloc.take_snapshot() if top else None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        tracemalloc.reset_peak()
+        yield
+        current, peak = tracemalloc.get_traced_memory()
+        self.stages.append(
+            StageMemory(
+                name=name,
+                current=current - self._baseline,
+                peak=peak - self._baseline,
+                top=self._get_top(),
+            )
+        )
+
+    def _get_top(self) -> List[str]:
+        # allocation sites which grew the most since the previous stage
+        if self._snapshot is None:
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        statistics = snapshot.compare_to(self._snapshot, "lineno")
+        self._snapshot = snapshot
+        return [str(statistic) for statistic in statistics[: self.top]]
+
+
+def run_pipeline(
+    page: bytes, folder: Path, profiler: Optional[StageProfiler] = None
+) -> None:
+    # the stages of page_loader.core.process_page_content
+    stage = profiler.stage if profiler is not None else no_stage
+    context = DownloadContext.create(OPTIONS, PAGE_URL)
+    with FileWriter(OPTIONS.durability) as writer:
+        with stage("parse"):
+            soup = parse_page(page, "utf-8")
+        with stage("find assets"):
+            assets = get_page_assets(soup, PAGE_URL, OPTIONS.asset_filter)
+        with stage("download assets"):
+            updated_assets = process_assets(
+                assets,
+                PAGE_URL,
+                generate_file_name_prefix_from_page_url(PAGE_URL),
+                folder,
+                context,
+                writer,
+            )
+        with stage("rewrite"):
+            content = update_page_assets(soup, updated_assets, in_place=True)
+        with stage("write"):
+            page_path = folder.joinpath(generate_file_name_from_page_url(PAGE_URL))
+            writer.write(page_path, content)
+            # waits for the writer thread, closing it again on exit is no-op
+            writer.close()
+
+
+@contextmanager
+def no_stage(name: str) -> Iterator[None]:
+    yield
+
+
+def profile_stages(page: bytes, corpus: Path, top: int = 0) -> List[StageMemory]:
+    """
+    Runs the pipeline over the page with tracemalloc
+
+    :param page: page content
+    :type page: bytes
+    :param corpus: recorded corpus with the page assets, see record_assets
+    :type corpus: Path
+    :param top: number of the top allocation sites reported per stage
+    :type top: int
+    :return: memory of the stages
+    :rtype: List[StageMemory]
+    """
+    configure_recording(RecordingSettings(replay=corpus))
+    try:
+        with TemporaryDirectory() as folder:
+            tracemalloc.start()
+            try:
+                profiler = StageProfiler(top)
+                run_pipeline(page, Path(folder), profiler)
+            finally:
+                tracemalloc.stop()
+    finally:
+        configure_recording(RecordingSettings())
+    return profiler.stages
+
+
+def reset_peak_rss() -> None:
+    # Linux keeps the high-water mark of the forking parent over exec,
+    # the spawned process resets it to its own current RSS
+    try:
+        PROC_CLEAR_REFS.write_text("5")
+    except OSError:
+        pass
+
+
+def get_peak_rss() -> int:
+    try:
+        status = PROC_STATUS.read_text()
+    except OSError:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    match = PEAK_RSS_PATTERN.search(status)
+    return int(match.group(1)) * 1024 if match else 0
+
+
+def measure_peak_rss(page_size: int) -> int:
+    # runs in a fresh process, so the heap of the previous pages isn't reused
+    page = generate_page(page_size)
+    with TemporaryDirectory() as corpus:
+        record_assets(Path(corpus), page)
+        configure_recording(RecordingSettings(replay=Path(corpus)))
+        with TemporaryDirectory() as folder:
+            reset_peak_rss()
+            baseline = get_peak_rss()
+            run_pipeline(page, Path(folder))
+            return get_peak_rss() - baseline
+
+
+def profile_peak_rss(page_size: int) -> Optional[int]:
+    """
+    Peak RSS growth of the pipeline over the page of the size,
+    measured in the spawned process
+
+    :param page_size: page size in bytes
+    :type page_size: int
+    :return: bytes or None if RSS can't be measured on this platform
+    :rtype: Optional[int]
+    """
+    if resource is None:
+        return None
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=context) as executor:
+        return executor.submit(measure_peak_rss, page_size).result()
+
+
+def profile_page(page_size: int, rss: bool = True, top: int = 0) -> PageMemory:
+    page = generate_page(page_size)
+    with TemporaryDirectory() as corpus:
+        record_assets(Path(corpus), page)
+        stages = profile_stages(page, Path(corpus), top)
+    peak_rss = profile_peak_rss(page_size) if rss else None
+    return PageMemory(page_size=len(page), stages=stages, peak_rss=peak_rss)
+
+
+def get_usage(page_memory: PageMemory) -> Dict[str, float]:
+    # MB per MB of the page
+    usage = {
+        stage.name: stage.peak / page_memory.page_size for stage in page_memory.stages
+    }
+    if page_memory.peak_rss is not None:
+        usage["peak rss"] = page_memory.peak_rss / page_memory.page_size
+    return usage
+
+
+def check_budgets(page_memory: PageMemory) -> List[str]:
+    """
+    :return: descriptions of the exceeded budgets
+    :rtype: List[str]
+    """
+    return [
+        f"{name} of {page_memory.page_size / MB:.1f}M page uses "
+        f"{ratio:.1f}M per page MB, the budget is {MEMORY_BUDGETS[name]:.1f}M"
+        for name, ratio in get_usage(page_memory).items()
+        if ratio > MEMORY_BUDGETS[name]
+    ]
+
+
+def print_page_memory(page_memory: PageMemory) -> None:
+    print(f"{page_memory.page_size / MB:.1f}M page")
+    usage = get_usage(page_memory)
+    for stage in page_memory.stages:
+        print(
+            f"{stage.name:>16}: peak {stage.peak / MB:6.1f}M, "
+            f"kept {stage.current / MB:6.1f}M, "
+            f"{usage[stage.name]:4.1f}M/MB (budget {MEMORY_BUDGETS[stage.name]})"
+        )
+        for line in stage.top:
+            print(f"{'':>18}{line}")
+    if page_memory.peak_rss is not None:
+        print(
+            f"{'peak rss':>16}: {page_memory.peak_rss / MB:6.1f}M, "
+            f"{usage['peak rss']:4.1f}M/MB (budget {MEMORY_BUDGETS['peak rss']})"
+        )
+
+
+def main(arguments: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--top", type=int, default=0)
+    parser.add_argument("--no-rss", action="store_true")
+    args = parser.parse_args(arguments)
+
+    violations = []
+    for size in args.sizes:
+        page_memory = profile_page(int(size * MB), not args.no_rss, args.top)
+        print_page_memory(page_memory)
+        violations.extend(check_budgets(page_memory))
+    for violation in violations:
+        print(f"over budget: {violation}", file=sys.stderr)
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Localization of a batch of saved pages: process_page_file_in_processes
+against the in-thread parsing (GIL bound) of DownloadOptions(processes=0).
+Assets are replayed from the recorded corpus with the synthetic latency,
+so the pool worker is free for other pages while they are downloaded
+
+    python -m benchmarks.processes [--pages 16] [--size 1] [--workers N]
+        [--latency 0.05]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from benchmarks.memory import MB, PAGE_URL, generate_page, record_assets
+from page_loader.context import DownloadContext
+from page_loader.core import (
+    process_page_content,
+    process_page_file_in_processes,
+)
+from page_loader.options import DownloadOptions
+from page_loader.processes import shutdown_process_pool
+from page_loader.recording import RecordingSettings, configure_recording
+
+
+def localize_page(page_path: Path, folder: Path, options: DownloadOptions) -> None:
+    folder.mkdir(parents=True)
+    context = DownloadContext.create(options, page_url=PAGE_URL)
+    if options.processes > 0:
+        process_page_file_in_processes(PAGE_URL, str(page_path), folder, context)
+    else:
+        process_page_content(PAGE_URL, page_path.read_bytes(), folder, context)
+
+
+def run(page_path: Path, pages: int, folder: Path, options: DownloadOptions) -> float:
+    # every page is a download of its own, as in batch work or serve mode
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(pages) as executor:
+        futures = [
+            executor.submit(
+                localize_page, page_path, folder.joinpath(str(index)), options
+            )
+            for index in range(pages)
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - started_at
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--size", type=float, default=1, help="page size in MB")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    page = generate_page(int(args.size * MB))
+    with TemporaryDirectory() as corpus, TemporaryDirectory() as folder:
+        record_assets(Path(corpus), page)
+        configure_recording(
+            RecordingSettings(replay=Path(corpus), latency=args.latency)
+        )
+        page_path = Path(folder, "page.html")
+        page_path.write_bytes(page)
+
+        print(f"{args.pages} pages of {args.size} MB, {args.workers} workers")
+        seconds = run(page_path, args.pages, Path(folder, "threads"), DownloadOptions())
+        print(f"      threads: {seconds:.2f} s, {args.pages / seconds:.1f} pages/s")
+
+        options = DownloadOptions(processes=args.workers)
+        # spawned workers import page_loader on the first task
+        run(page_path, args.workers, Path(folder, "warm-up"), options)
+        seconds = run(page_path, args.pages, Path(folder, "processes"), options)
+        print(f"    processes: {seconds:.2f} s, {args.pages / seconds:.1f} pages/s")
+        shutdown_process_pool()
+        configure_recording(RecordingSettings())
+
+
+if __name__ == "__main__":
+    main()
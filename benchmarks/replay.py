@@ -0,0 +1,63 @@
+"""
+Pages recorded with `page-loader --record CORPUS` downloaded again from the
+corpus, without the network and the host scheduler: with zero latency the
+time is spent on parsing, rewriting and writing only
+
+    page-loader --record /tmp/corpus https://site.com/blog
+    python -m benchmarks.replay /tmp/corpus [--repeat 3] [--latency 0]
+"""
+import argparse
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+
+from page_loader.core import download
+from page_loader.options import DownloadOptions
+from page_loader.recording import (
+    RecordingSettings,
+    configure_recording,
+    read_index,
+)
+from requests.structures import CaseInsensitiveDict
+
+
+def get_page_urls(corpus: Path) -> List[str]:
+    # successful html responses of the corpus are its pages
+    page_urls = {
+        entry["url"]
+        for entry in read_index(corpus)
+        if entry["status_code"] == 200
+        and entry["rejected"] is None
+        and "html" in CaseInsensitiveDict(entry["headers"]).get("Content-Type", "")
+    }
+    return sorted(page_urls)
+
+
+def run(page_urls: List[str], options: DownloadOptions) -> float:
+    started_at = time.perf_counter()
+    with TemporaryDirectory() as folder:
+        for page_url in page_urls:
+            download(page_url, Path(folder), options)
+    return time.perf_counter() - started_at
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("corpus", type=Path)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--asset-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    page_urls = get_page_urls(args.corpus)
+    configure_recording(RecordingSettings(replay=args.corpus, latency=args.latency))
+    options = DownloadOptions(asset_workers=args.asset_workers, best_effort=True)
+    print(f"{len(page_urls)} pages, best of {args.repeat} runs")
+    seconds = min(run(page_urls, options) for __ in range(args.repeat))
+    print(f"    replay: {seconds:.2f} s, {len(page_urls) / seconds:.1f} pages/s")
+    configure_recording(RecordingSettings())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,13 @@
-from .core import download
+from .core import (
+    download,
+    download_with_report,
+    iterate_download_events,
+    localize_page_file,
+)
 
-__all__ = ["download"]
+__all__ = [
+    "download",
+    "download_with_report",
+    "iterate_download_events",
+    "localize_page_file",
+]
@@ -0,0 +1,467 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from page_loader.core import download_with_report
+from page_loader.events import Event
+from page_loader.file_operations import (
+    generate_file_name_from_page_url,
+    remove_assets_folder,
+)
+from page_loader.logging import get_logger
+from page_loader.options import DownloadOptions
+from page_loader.urls import normalize_url
+
+logger = get_logger("page_loader.batch")
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_INTERVAL = 5.0
+# leased pages downloaded at once by one worker
+DEFAULT_CONCURRENCY = 4
+# seconds to wait for the database lock held by other workers
+LOCK_TIMEOUT = 60.0
+
+
+class PageStatus:
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    -- generate_file_name_from_page_url, one url per output file
+    file_name TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    worker TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    file_path TEXT,
+    error TEXT,
+    added_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_status ON pages (status, added_at);
+CREATE TABLE IF NOT EXISTS sitemaps (
+    url TEXT PRIMARY KEY,
+    -- start of the last complete ingestion, see page_loader.sitemaps
+    ingested_at REAL NOT NULL
+);
+"""
+
+
+@dataclass(frozen=True)
+class Lease:
+    url: str
+    worker: str
+    attempt: int
+
+
+class BatchQueue:
+    """
+    Queue of page urls in the SQLite database on the shared storage
+    Workers on any number of hosts claim urls with leases: a leased url
+    is given to another worker when its lease isn't renewed in time
+    (the worker has crashed or lost the storage). Every claim, renewal
+    and result is one short transaction under the database file lock
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        connection = self._connect()
+        try:
+            # executescript commits on its own
+            connection.executescript(SCHEMA)
+        finally:
+            connection.close()
+
+    def add(self, urls: Iterable[str], requeue: bool = False) -> int:
+        """
+        Adds page urls, already known urls are skipped, as well as urls
+        which would be saved under the file name of another url
+
+        :param urls: page urls
+        :type urls: Iterable[str]
+        :param requeue: known done or failed urls are made pending again,
+            e.g. pages modified since they were downloaded
+        :type requeue: bool
+        :return: number of added (or requeued) urls
+        :rtype: int
+        """
+        added = 0
+        now = time.time()
+        with self._transaction() as connection:
+            for url in urls:
+                url = normalize_url(url.strip())
+                file_name = generate_file_name_from_page_url(url)
+                cursor = connection.execute(
+                    "INSERT OR IGNORE INTO pages "
+                    "(url, file_name, status, added_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (url, file_name, PageStatus.PENDING, now, now),
+                )
+                if not cursor.rowcount and requeue:
+                    cursor = self._requeue(connection, url, now)
+                if cursor.rowcount:
+                    added += 1
+                else:
+                    self._warn_if_name_is_taken(connection, url, file_name)
+        return added
+
+    def claim(self, worker: str) -> Optional[Lease]:
+        """
+        Leases the oldest pending url or url with expired lease
+
+        :param worker: worker id
+        :type worker: str
+        :return: lease or None if there is nothing to claim
+        :rtype: Optional[Lease]
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE pages SET status = ?, error = ?, worker = NULL, "
+                "updated_at = ? "
+                "WHERE status = ? AND lease_expires_at < ? AND attempts >= ?",
+                (
+                    PageStatus.FAILED,
+                    "lease expired",
+                    now,
+                    PageStatus.LEASED,
+                    now,
+                    self.max_attempts,
+                ),
+            )
+            row = connection.execute(
+                "SELECT url, attempts FROM pages "
+                "WHERE status = ? OR (status = ? AND lease_expires_at < ?) "
+                "ORDER BY added_at LIMIT 1",
+                (PageStatus.PENDING, PageStatus.LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            url, attempts = row
+            connection.execute(
+                "UPDATE pages SET status = ?, worker = ?, lease_expires_at = ?, "
+                "attempts = ?, updated_at = ? WHERE url = ?",
+                (
+                    PageStatus.LEASED,
+                    worker,
+                    now + self.lease_seconds,
+                    attempts + 1,
+                    now,
+                    url,
+                ),
+            )
+        return Lease(url=url, worker=worker, attempt=attempts + 1)
+
+    def renew(self, lease: Lease) -> bool:
+        """
+        Extends the lease
+
+        :param lease: lease to extend
+        :type lease: Lease
+        :return: False if the lease is lost (expired and claimed by other worker)
+        :rtype: bool
+        """
+        now = time.time()
+        return self._update_leased(
+            lease,
+            "lease_expires_at = ?, updated_at = ?",
+            (now + self.lease_seconds, now),
+        )
+
+    def complete(self, lease: Lease, file_path: str) -> bool:
+        return self._update_leased(
+            lease,
+            "status = ?, file_path = ?, error = NULL, updated_at = ?",
+            (PageStatus.DONE, file_path, time.time()),
+        )
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        """
+        Returns the url into the queue or marks it failed after max attempts
+
+        :param lease: lease of the failed url
+        :type lease: Lease
+        :param error: error description
+        :type error: str
+        :return: False if the lease is lost
+        :rtype: bool
+        """
+        status = (
+            PageStatus.FAILED
+            if lease.attempt >= self.max_attempts
+            else PageStatus.PENDING
+        )
+        return self._update_leased(
+            lease,
+            "status = ?, error = ?, worker = NULL, updated_at = ?",
+            (status, error, time.time()),
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._reading() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM pages GROUP BY status"
+            ).fetchall()
+        stats = {
+            status: 0
+            for status in (
+                PageStatus.PENDING,
+                PageStatus.LEASED,
+                PageStatus.DONE,
+                PageStatus.FAILED,
+            )
+        }
+        stats.update(dict(rows))
+        return stats
+
+    def failures(self) -> List[Dict[str, str]]:
+        with self._reading() as connection:
+            rows = connection.execute(
+                "SELECT url, error FROM pages WHERE status = ? ORDER BY added_at",
+                (PageStatus.FAILED,),
+            ).fetchall()
+        return [{"url": url, "error": error} for url, error in rows]
+
+    def get_ingested_at(self, sitemap_url: str) -> Optional[float]:
+        with self._reading() as connection:
+            row = connection.execute(
+                "SELECT ingested_at FROM sitemaps WHERE url = ?", (sitemap_url,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_ingested_at(self, sitemap_url: str, ingested_at: float) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sitemaps (url, ingested_at) VALUES (?, ?)",
+                (sitemap_url, ingested_at),
+            )
+
+    def _requeue(
+        self, connection: sqlite3.Connection, url: str, now: float
+    ) -> sqlite3.Cursor:
+        # leased urls are being downloaded right now
+        return connection.execute(
+            "UPDATE pages SET status = ?, attempts = 0, error = NULL, "
+            "updated_at = ? WHERE url = ? AND status IN (?, ?)",
+            (PageStatus.PENDING, now, url, PageStatus.DONE, PageStatus.FAILED),
+        )
+
+    def _update_leased(self, lease: Lease, assignments: str, values: tuple) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f"UPDATE pages SET {assignments} "
+                "WHERE url = ? AND worker = ? AND status = ? AND attempts = ?",
+                (*values, lease.url, lease.worker, PageStatus.LEASED, lease.attempt),
+            )
+        return cursor.rowcount == 1
+
+    def _warn_if_name_is_taken(
+        self, connection: sqlite3.Connection, url: str, file_name: str
+    ) -> None:
+        row = connection.execute(
+            "SELECT url FROM pages WHERE file_name = ? AND url != ?",
+            (file_name, url),
+        ).fetchone()
+        if row is not None:
+            logger.warning(f"{url} is skipped, {row[0]} is saved to {file_name}")
+
+    def _connect(self) -> sqlite3.Connection:
+        # connection per transaction, so the queue could be shared by threads
+        return sqlite3.connect(
+            str(self.path), timeout=LOCK_TIMEOUT, isolation_level=None
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self._connect()
+        try:
+            # takes the write lock right away, claims never race
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        # plain reads don't take the write lock, so they never block workers
+        connection = self._connect()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+
+def get_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class LeaseKeeper:
+    """
+    Renews the lease on its own thread while the page is downloaded,
+    the download is aborted with LeaseLost by check once the lease is lost
+    """
+
+    def __init__(self, queue: BatchQueue, lease: Lease):
+        self.queue = queue
+        self.lease = lease
+        self.lost = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._work, name="page-loader-lease", daemon=True
+        )
+
+    def __enter__(self) -> "LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def check(self, event: Optional[Event] = None) -> None:
+        """
+        Download events sink, another worker owns the page after the lease is lost
+
+        :raises LeaseLost: if the lease is lost
+        """
+        if self.lost:
+            raise LeaseLost(f"lease of {self.lease.url} is lost")
+
+    def _work(self) -> None:
+        interval = self.queue.lease_seconds / 3
+        while not self._stopped.wait(interval):
+            try:
+                renewed = self.queue.renew(self.lease)
+            except sqlite3.Error as error:
+                logger.warning(f"lease of {self.lease.url} isn't renewed: {error}")
+                continue
+            if not renewed:
+                logger.warning(f"lease of {self.lease.url} is lost")
+                self.lost = True
+                return
+
+
+def process_lease(
+    queue: BatchQueue, lease: Lease, output: Path, options: DownloadOptions
+) -> None:
+    # assets folder of the crashed attempt or of the requeued page
+    remove_assets_folder(output, lease.url)
+    with LeaseKeeper(queue, lease) as keeper:
+        try:
+            report = download_with_report(
+                lease.url, output, options, on_event=keeper.check
+            )
+        except LeaseLost:
+            logger.warning(f"download of {lease.url} is aborted, its lease was lost")
+            return
+        except Exception as error:
+            logger.error(f"batch page {lease.url} failed: {error!r}")
+            queue.fail(lease, repr(error))
+            return
+    # the page belongs to another worker now, its result isn't recorded
+    if keeper.lost or not queue.complete(lease, report.file_path):
+        logger.warning(f"{lease.url} is saved, but its lease was lost")
+
+
+def run_worker(
+    queue: BatchQueue,
+    output: Path,
+    options: Optional[DownloadOptions] = None,
+    worker: Optional[str] = None,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> int:
+    """
+    Downloads pages from the queue until every url is done or failed
+    While other workers hold leases, the queue is polled, their urls come
+    back if they crash. Pages are saved under generate_file_name_from_page_url
+    names, so workers sharing the output folder never write the same files
+
+    :param queue: shared queue
+    :type queue: BatchQueue
+    :param output: folder to save pages into
+    :type output: Path
+    :param options: download options
+    :type options: Optional[DownloadOptions]
+    :param worker: worker id, unique one is generated if not provided
+    :type worker: Optional[str]
+    :param poll_interval: seconds between claims when nothing is pending
+    :type poll_interval: float
+    :param concurrency: number of leases processed at once, every one
+        on its own thread, so the host scheduler and the process pool
+        are shared by the pages
+    :type concurrency: int
+    :return: number of pages processed by this worker
+    :rtype: int
+    """
+    options = options or DownloadOptions()
+    worker = worker or get_worker_id()
+    # idle threads claim again as soon as another thread is done with its lease
+    lease_done = threading.Condition()
+    arguments = (queue, output, options, worker, poll_interval, lease_done)
+    if concurrency <= 1:
+        return process_leases(*arguments)
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="page-loader-batch"
+    ) as executor:
+        futures = [
+            executor.submit(process_leases, *arguments) for __ in range(concurrency)
+        ]
+        return sum(future.result() for future in futures)
+
+
+def process_leases(
+    queue: BatchQueue,
+    output: Path,
+    options: DownloadOptions,
+    worker: str,
+    poll_interval: float,
+    lease_done: threading.Condition,
+) -> int:
+    # claims and processes leases one by one, see run_worker
+    processed = 0
+    while True:
+        lease = queue.claim(worker)
+        if lease is None:
+            if not queue.stats()[PageStatus.LEASED]:
+                return processed
+            with lease_done:
+                lease_done.wait(poll_interval)
+            continue
+        logger.info(f"{worker} claimed {lease.url}, attempt {lease.attempt}")
+        try:
+            process_lease(queue, lease, output, options)
+        finally:
+            with lease_done:
+                lease_done.notify_all()
+        processed += 1
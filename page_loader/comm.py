@@ -1,34 +1,255 @@
+import atexit
+import random
+import threading
 import time
+from contextlib import contextmanager
+from dataclasses import dataclass
 from http import HTTPStatus
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import requests
+from page_loader import http2, recording
+from page_loader.events import ProgressCallback
+from page_loader.filters import AssetFilter, get_mime_type
 from page_loader.logging import get_logger
-from progress.bar import IncrementalBar
+from page_loader.options import DownloadOptions
+from page_loader.recording import RecordedResponse
+from page_loader.scheduling import DeadlineExceeded, get_scheduler
 
 logger = get_logger("page_loader.comm")
 
+CHUNK_SIZE = 64 * 1024
 
-def get_page_content(page_url: str) -> bytes:
+RETRIABLE_STATUS_CODES = frozenset(
+    {
+        HTTPStatus.TOO_MANY_REQUESTS,
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+        HTTPStatus.BAD_GATEWAY,
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        HTTPStatus.GATEWAY_TIMEOUT,
+    }
+)
+RETRIABLE_EXCEPTIONS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+) + http2.RETRIABLE_EXCEPTIONS
+
+
+class AssetRejected(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class PageResponse:
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    encoding: Optional[str]
+    # seconds from the request to the whole content
+    elapsed: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+# requests response or httpx one of the HTTP/2 client
+Response = Union[requests.Response, "http2.httpx.Response"]
+
+_local = threading.local()
+# sessions of the finished threads, see pooled_session
+_idle_sessions: List[requests.Session] = []
+# all the sessions of the process, they're closed at exit
+_sessions: List[requests.Session] = []
+_sessions_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the requests session of the current thread
+    Sessions are kept alive between calls, so connection pools stay warm
+    for the whole process lifetime (e.g. in the serve mode)
+
+    :return: thread local session
+    :rtype: requests.Session
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = create_session()
+        _local.session = session
+    return session
+
+
+def create_session() -> requests.Session:
+    session = requests.Session()
+    with _sessions_lock:
+        _sessions.append(session)
+    return session
+
+
+@contextmanager
+def pooled_session() -> Iterator[requests.Session]:
+    """
+    Lends an idle session of the process to the current thread and takes it
+    back on exit, so short-lived threads (e.g. asset downloads of one page)
+    reuse warm connection pools instead of opening their own
+
+    :return: session returned by get_session until exit
+    :rtype: Iterator[requests.Session]
+    """
+    with _sessions_lock:
+        session = _idle_sessions.pop() if _idle_sessions else None
+    if session is None:
+        session = create_session()
+    _local.session = session
     try:
-        with requests.get(
-            page_url,
-            stream=True,
-        ) as response:
-            total_size = len(response.content)
-            chunk_size = 1024
-            steps = round(total_size / chunk_size)
-
-            with IncrementalBar(
-                f"Downloading {page_url} content", max=steps, check_tty=False
-            ) as bar:
-                for __ in response.iter_content(chunk_size=chunk_size):
-                    time.sleep(0.001)
-                    bar.next()
-    except Exception:
-        error_message = f"get request to {page_url} failed, see exception message above"
-        logger.error(error_message)
-        raise
+        yield session
+    finally:
+        del _local.session
+        with _sessions_lock:
+            _idle_sessions.append(session)
+
+
+def close_sessions() -> None:
+    """
+    Closes connection pools of all the sessions, a session used again
+    reconnects
+    """
+    with _sessions_lock:
+        for session in _sessions:
+            session.close()
 
+
+atexit.register(close_sessions)
+
+
+def get_page_content(
+    page_url: str,
+    options: Optional[DownloadOptions] = None,
+    deadline: Optional[float] = None,
+    asset_filter: Optional[AssetFilter] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> bytes:
+    """
+    Downloads page content, retries connection errors, timeouts and
+    429/5xx responses with jittered exponential backoff
+
+    :param page_url: url to download
+    :type page_url: str
+    :param options: timeouts and retries options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :param deadline: time.monotonic based time to give up at
+    :type deadline: Optional[float]
+    :param asset_filter: mime type and size rules checked while downloading
+    :type asset_filter: Optional[AssetFilter]
+    :param on_progress: called with received bytes after every received chunk
+    :type on_progress: Optional[ProgressCallback]
+    :return: response content
+    :rtype: bytes
+    :raises DeadlineExceeded: if deadline is reached before the content is received
+    :raises AssetRejected: if response doesn't pass asset filter
+    :raises RuntimeError: if response status code isn't OK
+    """
+    response = get_page_response(
+        page_url, options, deadline, asset_filter, on_progress=on_progress
+    )
+    check_status(page_url, response)
+    return response.content
+
+
+def get_page_response(
+    page_url: str,
+    options: Optional[DownloadOptions] = None,
+    deadline: Optional[float] = None,
+    asset_filter: Optional[AssetFilter] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> PageResponse:
+    """
+    Same as get_page_content, but returns the response of any final status,
+    e.g. 304 of the conditional request
+
+    :param page_url: url to download
+    :type page_url: str
+    :param options: timeouts and retries options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :param deadline: time.monotonic based time to give up at
+    :type deadline: Optional[float]
+    :param asset_filter: mime type and size rules checked while downloading
+    :type asset_filter: Optional[AssetFilter]
+    :param headers: extra request headers, e.g. If-None-Match
+    :type headers: Optional[Mapping[str, str]]
+    :param on_progress: called with received bytes after every received chunk
+    :type on_progress: Optional[ProgressCallback]
+    :return: response
+    :rtype: PageResponse
+    :raises DeadlineExceeded: if deadline is reached before the content is received
+    :raises AssetRejected: if response doesn't pass asset filter
+    """
+    options = options or DownloadOptions()
+    attempt = 0
+    response = try_request_page(
+        page_url, options, deadline, attempt, asset_filter, headers, on_progress
+    )
+    while response is None:
+        attempt += 1
+        wait_before_retry(attempt, options, deadline)
+        response = try_request_page(
+            page_url, options, deadline, attempt, asset_filter, headers, on_progress
+        )
+    return response
+
+
+@contextmanager
+def stream_page(
+    page_url: str, options: Optional[DownloadOptions] = None
+) -> Iterator[IO[bytes]]:
+    """
+    Opens the response body as the file which is read from the connection,
+    for the content which shouldn't be read into memory, e.g. huge sitemaps.
+    Content-Encoding is decoded, the request isn't retried
+
+    :param page_url: url to request
+    :type page_url: str
+    :param options: timeouts options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :return: response body
+    :rtype: Iterator[IO[bytes]]
+    :raises RuntimeError: if response status code isn't OK
+    """
+    timeout = get_timeout(options or DownloadOptions(), None)
+    # the slot is released with the headers, the body is read for as long
+    # as the caller needs without holding the host back
+    with get_scheduler().slot(page_url) as slot:
+        response = get_session().get(page_url, stream=True, timeout=timeout)
+        slot.record(response.status_code, response.headers)
+    with response:
+        if response.status_code != HTTPStatus.OK:
+            error_message = (
+                f"get request to {page_url} returned not OK status code - "
+                f"{response.status_code}"
+            )
+            logger.error(error_message)
+            raise RuntimeError(error_message)
+        response.raw.decode_content = True
+        yield response.raw
+
+
+def check_status(page_url: str, response: PageResponse) -> None:
+    """
+    :raises RuntimeError: if response status code isn't OK
+    """
     if response.status_code != HTTPStatus.OK:
         error_message = (
             f"get request to {page_url} returned not OK status code - "
@@ -37,4 +258,385 @@ def get_page_content(page_url: str) -> bytes:
         logger.error(error_message)
         raise RuntimeError(error_message)
 
-    return response.content
+
+def try_request_page(
+    page_url: str,
+    options: DownloadOptions,
+    deadline: Optional[float],
+    attempt: int,
+    asset_filter: Optional[AssetFilter] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> Optional[PageResponse]:
+    """
+    Makes one request attempt, returns None if the request should be retried
+
+    :param page_url: url to request
+    :type page_url: str
+    :param options: download options
+    :type options: DownloadOptions
+    :param deadline: time.monotonic based deadline
+    :type deadline: Optional[float]
+    :param attempt: attempt number, starts from 0
+    :type attempt: int
+    :param asset_filter: mime type and size rules
+    :type asset_filter: Optional[AssetFilter]
+    :param headers: extra request headers
+    :type headers: Optional[Mapping[str, str]]
+    :param on_progress: called with received bytes after every received chunk
+    :type on_progress: Optional[ProgressCallback]
+    :return: response or None
+    :rtype: Optional[PageResponse]
+    :raises DeadlineExceeded: if the deadline is reached
+    :raises AssetRejected: if response doesn't pass asset filter
+    """
+    can_retry = attempt < options.retries
+    timeout = get_timeout(options, deadline)
+    try:
+        response = request_page(
+            page_url,
+            timeout,
+            asset_filter,
+            headers,
+            on_progress,
+            options.http2,
+            deadline,
+        )
+    except (AssetRejected, DeadlineExceeded):
+        raise
+    except Exception as error:
+        if not can_retry or not isinstance(error, RETRIABLE_EXCEPTIONS):
+            logger.error(
+                f"get request to {page_url} failed, see exception message above"
+            )
+            raise
+        logger.warning(f"get request to {page_url} failed: {error!r}, retrying")
+        return None
+
+    if response.status_code in RETRIABLE_STATUS_CODES and can_retry:
+        logger.warning(
+            f"get request to {page_url} returned {response.status_code}, retrying"
+        )
+        return None
+    return response
+
+
+def request_page(
+    page_url: str,
+    timeout: Tuple[float, float],
+    asset_filter: Optional[AssetFilter] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    use_http2: bool = False,
+    deadline: Optional[float] = None,
+) -> PageResponse:
+    """
+    Fetches the page, see fetch_page. With the recording configured
+    (see page_loader.recording) responses and asset filter rejections are
+    recorded, or served from the recorded corpus instead of the network
+
+    :param page_url: url to request
+    :type page_url: str
+    :param timeout: connect and read timeouts
+    :type timeout: Tuple[float, float]
+    :param asset_filter: mime type and size rules
+    :type asset_filter: Optional[AssetFilter]
+    :param headers: extra request headers
+    :type headers: Optional[Mapping[str, str]]
+    :param on_progress: called with received bytes after every received chunk
+    :type on_progress: Optional[ProgressCallback]
+    :param use_http2: request https urls with HTTP/2, see page_loader.http2
+    :type use_http2: bool
+    :param deadline: time.monotonic based deadline
+    :type deadline: Optional[float]
+    :return: response
+    :rtype: PageResponse
+    :raises DeadlineExceeded: if the deadline is reached while waiting
+        for the host scheduler or reading the content
+    :raises AssetRejected: if response doesn't pass asset filter
+    :raises NotRecorded: if the replayed request isn't recorded
+    """
+    replayer = recording.get_replayer()
+    if replayer is not None:
+        recorded = replayer.get(page_url, headers)
+        return replay_page(page_url, recorded, asset_filter, on_progress)
+    recorder = recording.get_recorder()
+    if recorder is None:
+        return fetch_page(
+            page_url, timeout, asset_filter, headers, on_progress, use_http2, deadline
+        )
+    try:
+        response = fetch_page(
+            page_url, timeout, asset_filter, headers, on_progress, use_http2, deadline
+        )
+    except AssetRejected as error:
+        rejection = RecordedResponse(0, {}, b"", None, rejected=str(error))
+        recorder.record(page_url, headers, rejection)
+        raise
+    recorder.record(page_url, headers, record_response(response))
+    return response
+
+
+def fetch_page(
+    page_url: str,
+    timeout: Tuple[float, float],
+    asset_filter: Optional[AssetFilter] = None,
+    headers: Optional[Mapping[str, str]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    use_http2: bool = False,
+    deadline: Optional[float] = None,
+) -> PageResponse:
+    """
+    Makes get request through the host scheduler and reads the response content,
+    asset filter is checked as soon as the headers are received and
+    while the content is read, so oversized downloads are aborted early
+
+    :param page_url: url to request
+    :type page_url: str
+    :param timeout: connect and read timeouts
+    :type timeout: Tuple[float, float]
+    :param asset_filter: mime type and size rules
+    :type asset_filter: Optional[AssetFilter]
+    :param headers: extra request headers
+    :type headers: Optional[Mapping[str, str]]
+    :param on_progress: called with received bytes after every received chunk
+    :type on_progress: Optional[ProgressCallback]
+    :param use_http2: request https urls with HTTP/2, see page_loader.http2
+    :type use_http2: bool
+    :param deadline: time.monotonic based deadline
+    :type deadline: Optional[float]
+    :return: response
+    :rtype: PageResponse
+    :raises DeadlineExceeded: if the deadline is reached while waiting
+        for the host scheduler or reading the content
+    :raises AssetRejected: if response doesn't pass asset filter
+    """
+    with get_scheduler().slot(page_url, deadline) as slot:
+        started_at = time.monotonic()
+        with open_response(page_url, timeout, headers, use_http2) as response:
+            slot.record(response.status_code, response.headers)
+            content_length = get_content_length(response.headers)
+            if asset_filter is not None and response.status_code == HTTPStatus.OK:
+                check_headers(page_url, response.headers, content_length, asset_filter)
+            content = read_content(
+                page_url, response, content_length, asset_filter, on_progress, deadline
+            )
+        elapsed = time.monotonic() - started_at
+    return PageResponse(
+        status_code=response.status_code,
+        headers=response.headers,
+        content=content,
+        encoding=response.encoding,
+        elapsed=elapsed,
+    )
+
+
+def record_response(response: PageResponse) -> RecordedResponse:
+    return RecordedResponse(
+        status_code=response.status_code,
+        headers=response.headers,
+        content=response.content,
+        encoding=response.encoding,
+        latency=response.elapsed,
+    )
+
+
+def replay_page(
+    page_url: str,
+    recorded: RecordedResponse,
+    asset_filter: Optional[AssetFilter] = None,
+    on_progress: Optional[ProgressCallback] = None,
+) -> PageResponse:
+    """
+    Checks the recorded response as the fetched one, the host scheduler
+    isn't used, so the corpus is replayed as fast as the latency allows
+
+    :param page_url: requested url
+    :type page_url: str
+    :param recorded: recorded response
+    :type recorded: RecordedResponse
+    :param asset_filter: mime type and size rules
+    :type asset_filter: Optional[AssetFilter]
+    :param on_progress: called with the size of the content
+    :type on_progress: Optional[ProgressCallback]
+    :return: response
+    :rtype: PageResponse
+    :raises AssetRejected: if response doesn't pass asset filter
+        or it was rejected while recording
+    """
+    if recorded.rejected is not None:
+        raise AssetRejected(recorded.rejected)
+    content_length = get_content_length(recorded.headers)
+    if asset_filter is not None and recorded.status_code == HTTPStatus.OK:
+        check_headers(page_url, recorded.headers, content_length, asset_filter)
+        check_size(page_url, len(recorded.content), asset_filter)
+    if on_progress is not None:
+        on_progress(len(recorded.content), content_length)
+    return PageResponse(
+        status_code=recorded.status_code,
+        headers=recorded.headers,
+        content=recorded.content,
+        encoding=recorded.encoding,
+        elapsed=recorded.latency,
+    )
+
+
+@contextmanager
+def open_response(
+    page_url: str,
+    timeout: Tuple[float, float],
+    headers: Optional[Mapping[str, str]],
+    use_http2: bool,
+) -> Iterator[Response]:
+    client = http2.get_http2_client(page_url) if use_http2 else None
+    if client is not None:
+        with http2.stream_http2(client, page_url, timeout, headers) as response:
+            yield response
+        return
+    # plain requests keep the session headers only
+    extra_arguments: Dict[str, Any] = {"headers": headers} if headers else {}
+    with get_session().get(
+        page_url,
+        stream=True,
+        timeout=timeout,
+        **extra_arguments,
+    ) as response:
+        yield response
+
+
+def iterate_chunks(response: Response, chunk_size: int) -> Iterator[bytes]:
+    if isinstance(response, requests.Response):
+        return response.iter_content(chunk_size=chunk_size)
+    return response.iter_bytes(chunk_size)
+
+
+def read_content(
+    page_url: str,
+    response: Response,
+    content_length: Optional[int],
+    asset_filter: Optional[AssetFilter] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    deadline: Optional[float] = None,
+) -> bytes:
+    """
+    Reads response content, size limit and deadline are checked
+    after every chunk, so a slow body can't outlive the page deadline
+
+    :param page_url: requested url
+    :type page_url: str
+    :param response: streamed response
+    :type response: Response
+    :param content_length: Content-Length header value
+    :type content_length: Optional[int]
+    :param asset_filter: size rules
+    :type asset_filter: Optional[AssetFilter]
+    :param on_progress: called with received bytes after every received chunk
+    :type on_progress: Optional[ProgressCallback]
+    :param deadline: time.monotonic based deadline
+    :type deadline: Optional[float]
+    :return: response content
+    :rtype: bytes
+    :raises AssetRejected: if response is larger than the size limit
+    :raises DeadlineExceeded: if the deadline is reached before the last chunk
+    """
+    chunk_size = CHUNK_SIZE
+    if asset_filter is not None and asset_filter.max_size is not None:
+        # oversized response is rejected one byte past the limit
+        chunk_size = min(chunk_size, asset_filter.max_size + 1)
+    chunks = []
+    received = 0
+    for chunk in iterate_chunks(response, chunk_size):
+        received += len(chunk)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"page deadline is reached while reading {page_url}")
+        if asset_filter is not None:
+            check_size(page_url, received, asset_filter)
+        chunks.append(chunk)
+        if on_progress is not None:
+            on_progress(received, content_length)
+    return b"".join(chunks)
+
+
+def check_headers(
+    page_url: str,
+    headers: Mapping[str, str],
+    content_length: Optional[int],
+    asset_filter: AssetFilter,
+) -> None:
+    """
+    Checks response mime type and declared size
+
+    :raises AssetRejected: if response doesn't pass asset filter
+    """
+    mime_type = get_mime_type(headers.get("Content-Type"), page_url)
+    if not asset_filter.accepts_mime_type(mime_type):
+        raise AssetRejected(f"{page_url} mime type {mime_type} isn't allowed")
+    if content_length is not None and not asset_filter.accepts_size(content_length):
+        raise AssetRejected(
+            f"{page_url} is larger than {asset_filter.max_size} bytes "
+            f"(Content-Length: {content_length})"
+        )
+
+
+def check_size(page_url: str, received: int, asset_filter: AssetFilter) -> None:
+    """
+    :raises AssetRejected: if received content is larger than the size limit
+    """
+    if not asset_filter.accepts_size(received):
+        raise AssetRejected(f"{page_url} is larger than {asset_filter.max_size} bytes")
+
+
+def get_content_length(headers: Mapping[str, str]) -> Optional[int]:
+    try:
+        return int(headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_timeout(
+    options: DownloadOptions, deadline: Optional[float]
+) -> Tuple[float, float]:
+    """
+    Returns connect and read timeouts cut by the time left till the deadline
+
+    :param options: download options
+    :type options: DownloadOptions
+    :param deadline: time.monotonic based deadline
+    :type deadline: Optional[float]
+    :return: connect and read timeouts
+    :rtype: Tuple[float, float]
+    :raises DeadlineExceeded: if the deadline is reached
+    """
+    if deadline is None:
+        return options.connect_timeout, options.read_timeout
+    time_left = deadline - time.monotonic()
+    if time_left <= 0:
+        raise DeadlineExceeded("page deadline is reached")
+    return (
+        min(options.connect_timeout, time_left),
+        min(options.read_timeout, time_left),
+    )
+
+
+def get_backoff_delay(attempt: int, options: DownloadOptions) -> float:
+    """
+    Returns "full jitter" exponential backoff delay for the attempt
+
+    :param attempt: retry attempt number, starts from 1
+    :type attempt: int
+    :param options: download options
+    :type options: DownloadOptions
+    :return: delay in seconds
+    :rtype: float
+    """
+    max_delay = min(options.backoff_max, options.backoff_base * 2 ** (attempt - 1))
+    return random.uniform(0, max_delay)
+
+
+def wait_before_retry(
+    attempt: int, options: DownloadOptions, deadline: Optional[float]
+) -> None:
+    delay = get_backoff_delay(attempt, options)
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        raise DeadlineExceeded("page deadline is reached")
+    time.sleep(delay)
@@ -0,0 +1,83 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from page_loader.events import (
+    AssetFailed,
+    AssetProgress,
+    Event,
+    EventSink,
+    ProgressCallback,
+)
+from page_loader.options import DownloadOptions
+
+
+@dataclass(frozen=True)
+class AssetFailure:
+    url: str
+    reason: str
+
+
+@dataclass(frozen=True)
+class DownloadReport:
+    file_path: str
+    # assets which kept their original urls
+    failures: List[AssetFailure]
+
+
+@dataclass
+class DownloadContext:
+    """
+    State of one page download shared by all the processing stages
+    """
+
+    options: DownloadOptions = field(default_factory=DownloadOptions)
+    # time.monotonic based
+    deadline: Optional[float] = None
+    failures: List[AssetFailure] = field(default_factory=list)
+    # for the log records
+    page_url: Optional[str] = None
+    # time.monotonic based
+    started_at: float = field(default_factory=time.monotonic)
+    # asset mime types by urls, recorded for data: uris only
+    mime_types: Dict[str, str] = field(default_factory=dict)
+    on_event: Optional[EventSink] = None
+
+    @classmethod
+    def create(
+        cls,
+        options: Optional[DownloadOptions] = None,
+        page_url: Optional[str] = None,
+        on_event: Optional[EventSink] = None,
+    ) -> "DownloadContext":
+        options = options or DownloadOptions()
+        deadline = None
+        if options.page_deadline is not None:
+            deadline = time.monotonic() + options.page_deadline
+        return cls(
+            options=options, deadline=deadline, page_url=page_url, on_event=on_event
+        )
+
+    def emit(self, event: Event) -> None:
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def get_progress_callback(self, url: str) -> Optional[ProgressCallback]:
+        # no per chunk calls without the sink
+        if self.on_event is None:
+            return None
+
+        def on_progress(received: int, total: Optional[int]) -> None:
+            self.emit(AssetProgress(self.page_url, url, received, total))
+
+        return on_progress
+
+    def record_failure(self, url: str, reason: str) -> None:
+        # list.append is atomic, asset workers could call it concurrently
+        self.failures.append(AssetFailure(url=url, reason=reason))
+        self.emit(AssetFailed(self.page_url, url, reason))
+
+    def record_mime_type(self, url: str, mime_type: Optional[str]) -> None:
+        # dict item assignment is atomic as well
+        if mime_type is not None:
+            self.mime_types[url] = mime_type
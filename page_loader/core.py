@@ -1,34 +1,121 @@
-from copy import copy, deepcopy
-from dataclasses import dataclass
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
+from dataclasses import dataclass, field
+from functools import partial
+from http import HTTPStatus
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Match,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 from urllib.parse import urlsplit
 
 from bs4 import BeautifulSoup
 from bs4.element import Tag
-from page_loader.comm import get_page_content
+from page_loader.comm import (
+    AssetRejected,
+    DeadlineExceeded,
+    PageResponse,
+    check_status,
+    get_page_content,
+    get_page_response,
+    pooled_session,
+)
+from page_loader.context import DownloadContext, DownloadReport
+from page_loader.css import localize_stylesheets
+from page_loader.discovery import find_assets
+from page_loader.encoding import PRESCAN_SIZE, decode_page, detect_encoding
+from page_loader.events import (
+    AssetDone,
+    AssetFailed,
+    AssetQueued,
+    AssetSkipped,
+    AssetStarted,
+    Event,
+    EventSink,
+    PageDone,
+    PageFailed,
+    PageStarted,
+)
 from page_loader.file_operations import (
+    FileNameIndex,
+    FileWriter,
+    check_folder,
     create_assets_folder,
-    generate_file_name,
+    generate_assets_folder_name,
     generate_file_name_from_page_url,
     generate_file_name_prefix_from_page_url,
-    save_assets,
-    save_file,
+    mapped_file,
+    remove_assets_folder,
 )
+from page_loader.filters import AssetFilter, get_mime_type, get_rels
+from page_loader.fingerprints import (
+    Fingerprint,
+    create_fingerprint,
+    get_content_hash,
+    get_fingerprint_path,
+    is_page_saved,
+    load_fingerprint,
+    save_fingerprint,
+)
+from page_loader.inlining import get_data_uri
 from page_loader.logging import get_logger
+from page_loader.options import DownloadOptions
+from page_loader.priorities import AssetInfo, AssetPriority, asset_sizes
+from page_loader.processes import (
+    get_process_pool,
+    stored_content,
+    temporary_file,
+    wait_for_task,
+)
+from page_loader.srcset import (
+    SrcsetCandidate,
+    parse_srcset,
+    select_candidates,
+    serialize_srcset,
+)
+from page_loader.urls import get_base_url, get_url_resolver
 
 logger = get_logger("page_loader.core")
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 @dataclass(frozen=True)
 class PageAssets:
     src: List[Tag]
     href: List[Tag]
+    # img and picture source tags with srcset attribute,
+    # they could be in src list as well
+    srcset: List[Tag] = field(default_factory=list)
+    # object tags
+    data: List[Tag] = field(default_factory=list)
+    # absolute <base href> url, references are resolved against the page url
+    # if there is no <base>
+    base_url: Optional[str] = None
 
     def to_dict(self) -> Dict[str, List[Tag]]:
         return {
             "src": self.src,
             "href": self.href,
+            "data": self.data,
         }
 
 
@@ -36,9 +123,64 @@ class PageAssets:
 class PageAssetsWithUpdatedAssets:
     src: Dict[Tag, Tag]
     href: Dict[Tag, Tag]
+    srcset: Dict[Tag, Tag] = field(default_factory=dict)
+    data: Dict[Tag, Tag] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Dict[Tag, Tag]]:
+        # srcset goes last, its tags could be updated by src already
+        return {
+            "src": self.src,
+            "href": self.href,
+            "data": self.data,
+            "srcset": self.srcset,
+        }
+
+
+@dataclass(frozen=True)
+class IndexedAssetUpdate:
+    """
+    Attributes of the updated asset by the index of its tag,
+    see detach_page_assets
+    """
+
+    index: int
+    attrs: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class PageTemplate:
+    """
+    Parsed page in the form the process renders without parsing it again:
+    the prettified page is in the template file, attributes of every asset
+    tag are replaced there with the marker attribute holding the tag index
+    """
+
+    assets: PageAssets
+    # detached asset tags in the iterate_unique_tags order
+    tags: List[Tag]
+    marker: str
 
 
-def download(page_url: str, output: Path) -> str:
+@dataclass(frozen=True)
+class AssetUpdate:
+    """
+    Plain data form of the updated asset, it's cheap to pass to other processes
+    """
+
+    name: str
+    attribute: str
+    # original attribute value to find the tag by
+    reference: str
+    # all the attributes of the updated tag
+    attrs: Dict[str, Any]
+
+
+def download(
+    page_url: str,
+    output: Path,
+    options: Optional[DownloadOptions] = None,
+    on_event: Optional[EventSink] = None,
+) -> str:
     """
     Downloads and stores page content with assets into provided folder,
     then returns path to saved page
@@ -47,32 +189,365 @@ def download(page_url: str, output: Path) -> str:
     :type page_url: str
     :param output: folder to save page content
     :type output: Path
+    :param options: download options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :param on_event: progress events sink, see page_loader.events
+    :type on_event: Optional[EventSink]
     :return: path to saved page
     :rtype: str
     :raises RuntimeError: if output folder doesn't exist
     """
+    return download_with_report(page_url, output, options, on_event).file_path
+
+
+def download_with_report(
+    page_url: str,
+    output: Path,
+    options: Optional[DownloadOptions] = None,
+    on_event: Optional[EventSink] = None,
+) -> DownloadReport:
+    """
+    Downloads and stores page content with assets into provided folder,
+    then returns path to saved page with assets which weren't downloaded
+
+    :param page_url: page url to download
+    :type page_url: str
+    :param output: folder to save page content
+    :type output: Path
+    :param options: download options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :param on_event: progress events sink, see page_loader.events
+    :type on_event: Optional[EventSink]
+    :return: path to saved page and failed assets
+    :rtype: DownloadReport
+    :raises RuntimeError: if output folder doesn't exist
+    """
+    context = DownloadContext.create(options, page_url, on_event)
+    context.emit(PageStarted(page_url))
+    try:
+        if context.options.skip_unchanged:
+            return download_if_changed(page_url, output, context)
+        return download_page(page_url, output, context)
+    except Exception as error:
+        context.emit(PageFailed(page_url, str(error) or repr(error)))
+        raise
+
+
+def iterate_download_events(
+    page_url: str, output: Path, options: Optional[DownloadOptions] = None
+) -> Iterator[Event]:
+    """
+    Downloads the page on its own thread and yields its events,
+    the last one is PageDone or PageFailed (the error isn't raised)
+
+    :param page_url: page url to download
+    :type page_url: str
+    :param output: folder to save page content
+    :type output: Path
+    :param options: download options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :return: download events
+    :rtype: Iterator[Event]
+    """
+    events: "queue.SimpleQueue[Optional[Event]]" = queue.SimpleQueue()
+
+    def run() -> None:
+        try:
+            download_with_report(page_url, output, options, events.put)
+        except Exception:
+            # reported by PageFailed
+            pass
+        finally:
+            events.put(None)
+
+    thread = threading.Thread(target=run, name="page-loader-download", daemon=True)
+    thread.start()
+    event = events.get()
+    while event is not None:
+        yield event
+        event = events.get()
+    thread.join()
+
+
+def download_page(
+    page_url: str, output: Path, context: DownloadContext
+) -> DownloadReport:
     try:
-        page_content = get_page_content(page_url)
+        response = get_page_response(page_url, context.options, context.deadline)
+        check_status(page_url, response)
     except Exception:
         logger.error(
             f"something went wrong while getting the page {page_url} content, "
             "see exception above"
         )
         raise
+    return save_page(
+        page_url,
+        response.content,
+        output,
+        context,
+        response.headers.get("Content-Type"),
+    )
+
+
+def download_if_changed(
+    page_url: str, output: Path, context: DownloadContext
+) -> DownloadReport:
+    """
+    Skips unchanged pages: the page is requested with validators of the saved
+    page fingerprint, parsing and assets are skipped if the server answers 304
+    or the page body is the same. Changed pages are saved from scratch
+
+    :param page_url: page url to download
+    :type page_url: str
+    :param output: folder to save page content
+    :type output: Path
+    :param context: download state
+    :type context: DownloadContext
+    :return: path to saved page and failed assets
+    :rtype: DownloadReport
+    :raises RuntimeError: if output folder doesn't exist
+    """
+    fingerprint_path = get_fingerprint_path(output, page_url)
+    fingerprint = load_fingerprint(fingerprint_path)
+    if fingerprint is not None and not is_page_saved(output, page_url, fingerprint):
+        fingerprint = None
+    response = get_page_response_if_changed(page_url, context, fingerprint)
+    if response is None:
+        file_path = Path(output).joinpath(generate_file_name_from_page_url(page_url))
+        duration = time.monotonic() - context.started_at
+        logger.info(
+            f"page {page_url} is unchanged",
+            extra={"page_url": page_url, "duration": duration},
+        )
+        context.emit(
+            PageDone(page_url, str(file_path.resolve()), 0, duration, unchanged=True)
+        )
+        return DownloadReport(file_path=str(file_path.resolve()), failures=[])
+
+    remove_assets_folder(output, page_url)
+    report = save_page(
+        page_url,
+        response.content,
+        output,
+        context,
+        response.headers.get("Content-Type"),
+    )
+    if report.failures:
+        # failed assets are retried on the next run
+        fingerprint_path.unlink(missing_ok=True)
+    else:
+        save_fingerprint(
+            fingerprint_path,
+            create_fingerprint(response.content, output, page_url, response.headers),
+        )
+    return report
+
+
+def get_page_response_if_changed(
+    page_url: str, context: DownloadContext, fingerprint: Optional[Fingerprint]
+) -> Optional[PageResponse]:
+    """
+    Requests the page with the fingerprint validators
 
+    :param page_url: page url to download
+    :type page_url: str
+    :param context: download state
+    :type context: DownloadContext
+    :param fingerprint: saved page fingerprint
+    :type fingerprint: Optional[Fingerprint]
+    :return: page response or None if the page is unchanged
+    :rtype: Optional[PageResponse]
+    :raises RuntimeError: if response status code isn't OK
+    """
     try:
-        file_path = process_page_content(page_url, page_content, output)
+        response = get_page_response(
+            page_url,
+            context.options,
+            context.deadline,
+            headers=fingerprint.get_conditional_headers() if fingerprint else None,
+        )
+        if is_unchanged(response, fingerprint):
+            return None
+        check_status(page_url, response)
+    except Exception:
+        logger.error(
+            f"something went wrong while getting the page {page_url} content, "
+            "see exception above"
+        )
+        raise
+    return response
+
+
+def is_unchanged(response: PageResponse, fingerprint: Optional[Fingerprint]) -> bool:
+    if fingerprint is None:
+        return False
+    if response.status_code == HTTPStatus.NOT_MODIFIED:
+        return True
+    return (
+        response.status_code == HTTPStatus.OK
+        and get_content_hash(response.content) == fingerprint.content_hash
+    )
+
+
+def save_page(
+    page_url: str,
+    page_content: bytes,
+    output: Path,
+    context: DownloadContext,
+    content_type: Optional[str] = None,
+) -> DownloadReport:
+    """
+    Processes and saves downloaded page content with assets
+
+    :param page_url: page url
+    :type page_url: str
+    :param page_content: page content
+    :type page_content: bytes
+    :param output: folder to save page content
+    :type output: Path
+    :param context: download state
+    :type context: DownloadContext
+    :param content_type: page Content-Type header value
+    :type content_type: Optional[str]
+    :return: path to saved page and failed assets
+    :rtype: DownloadReport
+    :raises RuntimeError: if output folder doesn't exist
+    """
+    encoding = detect_encoding(page_content, content_type)
+    process_page = (
+        process_page_content_in_processes
+        if context.options.processes > 0
+        else process_page_content
+    )
+    try:
+        file_path = process_page(page_url, page_content, output, context, encoding)
     except Exception:
         logger.error(
             f"something went wrong while processing page {page_url} content, "
             "see exception above"
         )
         raise
+    return report_saved_page(page_url, file_path, len(page_content), context)
+
+
+def localize_page_file(
+    page_path: Union[str, Path],
+    page_url: str,
+    output: Path,
+    options: Optional[DownloadOptions] = None,
+    on_event: Optional[EventSink] = None,
+) -> DownloadReport:
+    """
+    Stores already saved page (e.g. by another crawler) with assets into
+    provided folder without fetching the page itself, only its assets are
+    downloaded. The page file is read through the memory map
+
+    :param page_path: saved page file
+    :type page_path: Union[str, Path]
+    :param page_url: page url, base url for the relative asset urls
+    :type page_url: str
+    :param output: folder to save page content
+    :type output: Path
+    :param options: download options, defaults are used if not provided
+    :type options: Optional[DownloadOptions]
+    :param on_event: progress events sink, see page_loader.events
+    :type on_event: Optional[EventSink]
+    :return: path to saved page and failed assets
+    :rtype: DownloadReport
+    :raises RuntimeError: if output folder doesn't exist
+    :raises OSError: if the page file can't be read
+    """
+    context = DownloadContext.create(options, page_url, on_event)
+    context.emit(PageStarted(page_url))
+    try:
+        return save_page_file(Path(page_path), page_url, output, context)
+    except Exception as error:
+        context.emit(PageFailed(page_url, str(error) or repr(error)))
+        raise
 
-    return file_path
 
+def save_page_file(
+    page_path: Path, page_url: str, output: Path, context: DownloadContext
+) -> DownloadReport:
+    """
+    Processes and saves the page file with assets, worker processes read
+    the page file by path themselves
 
-def process_page_content(page_url: str, content: bytes, folder: Path) -> str:
+    :param page_path: saved page file
+    :type page_path: Path
+    :param page_url: page url
+    :type page_url: str
+    :param output: folder to save page content
+    :type output: Path
+    :param context: download state
+    :type context: DownloadContext
+    :return: path to saved page and failed assets
+    :rtype: DownloadReport
+    :raises RuntimeError: if output folder doesn't exist
+    """
+    try:
+        if context.options.processes > 0:
+            file_path = process_page_file_in_processes(
+                page_url,
+                str(page_path),
+                output,
+                context,
+                detect_file_encoding(page_path),
+            )
+        else:
+            content, encoding = read_page_file(page_path)
+            file_path = process_page_content(
+                page_url, content, output, context, encoding
+            )
+    except Exception:
+        logger.error(
+            f"something went wrong while processing page file {page_path}, "
+            "see exception above"
+        )
+        raise
+    return report_saved_page(page_url, file_path, page_path.stat().st_size, context)
+
+
+def read_page_file(page_path: Path) -> Tuple[str, str]:
+    """
+    Reads the page file for the parser: the page is decoded straight from
+    the memory map, so its bytes aren't copied into memory next to
+    the decoded text
+
+    :param page_path: page file
+    :type page_path: Path
+    :return: page content and its encoding
+    :rtype: Tuple[str, str]
+    """
+    with mapped_file(page_path) as content:
+        return decode_page(content, detect_encoding(content[:PRESCAN_SIZE], None))
+
+
+def detect_file_encoding(page_path: Path) -> Optional[str]:
+    with open(page_path, "rb") as file:
+        return detect_encoding(file.read(PRESCAN_SIZE), None)
+
+
+def report_saved_page(
+    page_url: str, file_path: str, size: int, context: DownloadContext
+) -> DownloadReport:
+    duration = time.monotonic() - context.started_at
+    logger.info(
+        f"page {page_url} is saved to {file_path}",
+        extra={"page_url": page_url, "bytes": size, "duration": duration},
+    )
+    context.emit(PageDone(page_url, file_path, size, duration))
+    return DownloadReport(file_path=file_path, failures=list(context.failures))
+
+
+def process_page_content(
+    page_url: str,
+    content: Union[bytes, str],
+    folder: Path,
+    context: Optional[DownloadContext] = None,
+    encoding: Optional[str] = None,
+) -> str:
     """
     Processes page content and downloads assets into provided folder
     then returns path to saved page
@@ -80,42 +555,277 @@ def process_page_content(page_url: str, content: bytes, folder: Path) -> str:
     :param page_url: page url
     :type page_url: str
     :param content: page content
-    :type content: bytes
+    :type content: Union[bytes, str]
     :param folder: folder to save page contents
     :type folder: Path
+    :param context: download state, new one is created if not provided
+    :type context: Optional[DownloadContext]
+    :param encoding: page encoding, guessed by the parser if not provided
+    :type encoding: Optional[str]
     :return: path to saved page
     :rtype: str
     :raises RuntimeError: if output folder doesn't exist
     """
-    soup = BeautifulSoup(content, features="html.parser")
+    context = context or DownloadContext.create()
+    soup = parse_page(content, encoding)
     file_name_prefix = generate_file_name_prefix_from_page_url(page_url)
     # parse and download page assets
-    page_assets = get_page_assets(soup, page_url)
-    # save assets using base name
-    try:
-        updated_assets = process_assets(
-            assets=page_assets,
-            file_name_prefix=file_name_prefix,
-            page_url=page_url,
-            folder=folder,
-        )
-    except Exception:
-        logger.error(
-            f"something went wrong while assets update for page {page_url}, "
-            "see exception above"
+    page_assets = get_page_assets(soup, page_url, context.options.asset_filter)
+    file_name = generate_file_name_from_page_url(page_url)
+    # files are written by the writer thread while the page is processed
+    with FileWriter(context.options.durability) as writer:
+        # save assets using base name
+        try:
+            updated_assets = process_assets(
+                assets=page_assets,
+                file_name_prefix=file_name_prefix,
+                page_url=page_url,
+                folder=folder,
+                context=context,
+                writer=writer,
+            )
+        except Exception:
+            logger.error(
+                f"something went wrong while assets update for page {page_url}, "
+                "see exception above"
+            )
+            raise
+
+        # update page code with new assets
+        # the soup isn't used afterwards, so it isn't copied
+        updated_content = update_page_assets(soup, updated_assets, in_place=True)
+        # save page new content
+        writer.write(Path(folder).joinpath(file_name), updated_content)
+
+    return str(Path(folder).joinpath(file_name).resolve())
+
+
+def process_page_content_in_processes(
+    page_url: str,
+    content: bytes,
+    folder: Path,
+    context: DownloadContext,
+    encoding: Optional[str] = None,
+) -> str:
+    """
+    Same as process_page_content, but the page is parsed in the process pool
+    while this process downloads assets and renders the page
+    Workers read the page from the temporary file and write the page template
+    into another one, only asset tags are passed back
+
+    :param page_url: page url
+    :type page_url: str
+    :param content: page content
+    :type content: bytes
+    :param folder: folder to save page contents
+    :type folder: Path
+    :param context: download state
+    :type context: DownloadContext
+    :param encoding: page encoding, guessed by the parser if not provided
+    :type encoding: Optional[str]
+    :return: path to saved page
+    :rtype: str
+    :raises RuntimeError: if output folder doesn't exist
+    """
+    with stored_content(content) as page_path:
+        return process_page_file_in_processes(
+            page_url, page_path, folder, context, encoding
         )
-        raise
 
-    # update page code with new assets
-    updated_content = update_page_assets(soup, updated_assets)
-    # save page new content
-    file_name = generate_file_name_from_page_url(page_url)
-    filepath = save_file(updated_content, file_name, folder)
 
+def process_page_file_in_processes(
+    page_url: str,
+    page_path: str,
+    folder: Path,
+    context: DownloadContext,
+    encoding: Optional[str] = None,
+) -> str:
+    """
+    Process pool processing of the page file, see
+    process_page_content_in_processes. The pool task ends with the parsing,
+    so the worker takes other pages while the assets are downloaded,
+    and the page is parsed once: it's rendered from its template
+
+    :param page_url: page url
+    :type page_url: str
+    :param page_path: page content file
+    :type page_path: str
+    :param folder: folder to save page contents
+    :type folder: Path
+    :param context: download state
+    :type context: DownloadContext
+    :param encoding: page encoding, guessed by the parser if not provided
+    :type encoding: Optional[str]
+    :return: path to saved page
+    :rtype: str
+    :raises RuntimeError: if output folder doesn't exist
+    :raises DeadlineExceeded: if the page isn't parsed before the page deadline
+    """
+    pool = get_process_pool(context.options.processes)
+    folder = Path(folder)
+    check_folder(folder)
+    filepath = folder.joinpath(generate_file_name_from_page_url(page_url))
+    with temporary_file() as template_path:
+        future = pool.submit(
+            parse_page_in_worker,
+            page_path,
+            page_url,
+            template_path,
+            context.options.asset_filter,
+            encoding,
+        )
+        template = wait_for_task(future, context.deadline)
+        # assets are written while the page is rendered
+        with FileWriter(context.options.durability) as writer:
+            try:
+                updated_assets = process_assets(
+                    assets=template.assets,
+                    file_name_prefix=generate_file_name_prefix_from_page_url(page_url),
+                    page_url=page_url,
+                    folder=folder,
+                    context=context,
+                    writer=writer,
+                )
+            except Exception:
+                logger.error(
+                    f"something went wrong while assets update for page {page_url}, "
+                    "see exception above"
+                )
+                raise
+            page = Path(template_path).read_text(encoding="utf-8")
+            writer.write(filepath, render_page_template(page, template, updated_assets))
     return str(filepath.resolve())
 
 
-def get_page_assets(soup: BeautifulSoup, page_url: str) -> PageAssets:
+def parse_page_in_worker(
+    page_path: str,
+    page_url: str,
+    template_path: str,
+    asset_filter: Optional[AssetFilter],
+    encoding: Optional[str],
+) -> PageTemplate:
+    """
+    Process pool part of process_page_content_in_processes: parses the page,
+    writes its template and returns its assets as detached tags, which are
+    pickled without the page
+
+    :param page_path: page content file
+    :type page_path: str
+    :param page_url: page url
+    :type page_url: str
+    :param template_path: existing file to write the page template into
+    :type template_path: str
+    :param asset_filter: tag, rel and url rules
+    :type asset_filter: Optional[AssetFilter]
+    :param encoding: page encoding, guessed by the parser if not provided
+    :type encoding: Optional[str]
+    :return: page template
+    :rtype: PageTemplate
+    """
+    soup = parse_page(Path(page_path).read_bytes(), encoding)
+    assets = get_page_assets(soup, page_url, asset_filter)
+    page_assets, tags = detach_page_assets(assets)
+    # no page has this attribute, so the markers are found in the text
+    marker = f"data-page-loader-{uuid.uuid4().hex}"
+    for index, tag in enumerate(iterate_unique_tags(assets)):
+        tag.attrs = {marker: str(index)}
+    # the file isn't created again if the process stopped waiting and removed it
+    with open(template_path, "r+", encoding="utf-8") as file:
+        file.write(soup.prettify())
+    return PageTemplate(assets=page_assets, tags=tags, marker=marker)
+
+
+def render_page_template(
+    page: str, template: PageTemplate, assets: PageAssetsWithUpdatedAssets
+) -> str:
+    """
+    Puts the attributes of the updated asset tags (or the original ones
+    for the untouched assets) in place of the template markers
+
+    :param page: prettified page with the markers, see parse_page_in_worker
+    :type page: str
+    :param template: page template
+    :type template: PageTemplate
+    :param assets: detached page assets connected to updated assets
+    :type assets: PageAssetsWithUpdatedAssets
+    :return: page content
+    :rtype: str
+    """
+    updated_attrs = {
+        update.index: update.attrs
+        for update in get_indexed_asset_updates(assets, template.tags)
+    }
+
+    def render_marker(match: Match) -> str:
+        index = int(match.group(1))
+        tag = template.tags[index]
+        return render_attributes(tag.name, updated_attrs.get(index, tag.attrs))
+
+    return re.sub(rf' {template.marker}="(\d+)"', render_marker, page)
+
+
+def render_attributes(name: str, attrs: Dict[str, Any]) -> str:
+    # bs4 quotes and escapes the values the way prettify does
+    opening_tag = Tag(name=name, attrs=attrs).decode()
+    return opening_tag[len(name) + 1 : opening_tag.index(">")]
+
+
+def iterate_unique_tags(assets: PageAssets) -> Iterator[Tag]:
+    # one tag could be in several lists, it should stay one tag
+    seen = set()
+    for tag in chain(assets.src, assets.href, assets.data, assets.srcset):
+        if id(tag) not in seen:
+            seen.add(id(tag))
+            yield tag
+
+
+def detach_page_assets(assets: PageAssets) -> Tuple[PageAssets, List[Tag]]:
+    """
+    Copies the asset tags without their page
+
+    :param assets: page assets
+    :type assets: PageAssets
+    :return: assets of the detached tags and the detached tags
+        in the iterate_unique_tags order
+    :rtype: Tuple[PageAssets, List[Tag]]
+    """
+    detached_tags = {
+        id(tag): Tag(name=tag.name, attrs=dict(tag.attrs))
+        for tag in iterate_unique_tags(assets)
+    }
+    page_assets = PageAssets(
+        src=[detached_tags[id(tag)] for tag in assets.src],
+        href=[detached_tags[id(tag)] for tag in assets.href],
+        srcset=[detached_tags[id(tag)] for tag in assets.srcset],
+        data=[detached_tags[id(tag)] for tag in assets.data],
+        base_url=assets.base_url,
+    )
+    return page_assets, list(detached_tags.values())
+
+
+def parse_page(
+    content: Union[bytes, str], encoding: Optional[str] = None
+) -> BeautifulSoup:
+    """
+    Parses the page, known encoding spares the parser its encoding guessing
+    (it's still the fallback if the content can't be decoded with it)
+
+    :param content: page content
+    :type content: Union[bytes, str]
+    :param encoding: page encoding, see page_loader.encoding.detect_encoding
+    :type encoding: Optional[str]
+    :return: page soup
+    :rtype: BeautifulSoup
+    """
+    if isinstance(content, str):
+        # already decoded, e.g. by read_page_file
+        encoding = None
+    return BeautifulSoup(content, features="html.parser", from_encoding=encoding)
+
+
+def get_page_assets(
+    soup: BeautifulSoup, page_url: str, asset_filter: Optional[AssetFilter] = None
+) -> PageAssets:
     """
     Extracts assets from the given page
 
@@ -123,27 +833,46 @@ def get_page_assets(soup: BeautifulSoup, page_url: str) -> PageAssets:
     :type soup: BeautifulSoup
     :param page_url: page url
     :type page_url: str
+    :param asset_filter: tag, rel and url rules, all assets are taken if not provided
+    :type asset_filter: Optional[AssetFilter]
     :return: page assets
     :rtype: PageAssets
     """
-    images = list(soup.findAll("img"))
-    domain = urlsplit(page_url).netloc
-    scripts = [
-        script
-        for script in soup.findAll("script")
-        if "src" in script.attrs
-        and (
-            script.attrs["src"].startswith("/")
-            or urlsplit(script.attrs["src"]).netloc == domain
+    found_assets = find_assets(soup, page_url)
+    src = found_assets.get("src", [])
+    href = found_assets.get("href", [])
+    data = found_assets.get("data", [])
+    responsive_images = found_assets.get("srcset", [])
+    base_url = get_base_url(soup, page_url)
+    if asset_filter is None:
+        return PageAssets(
+            src=src, href=href, srcset=responsive_images, data=data, base_url=base_url
+        )
+    filter_base_url = base_url or page_url
+    return PageAssets(
+        src=filter_assets(src, filter_base_url, "src", asset_filter),
+        href=filter_assets(href, filter_base_url, "href", asset_filter),
+        # candidates urls are filtered while processing
+        srcset=[tag for tag in responsive_images if asset_filter.accepts_tag(tag)],
+        data=filter_assets(data, filter_base_url, "data", asset_filter),
+        base_url=base_url,
+    )
+
+
+def filter_assets(
+    assets: List[Tag],
+    base_url: str,
+    reference_attribute: str,
+    asset_filter: AssetFilter,
+) -> List[Tag]:
+    return [
+        asset
+        for asset in assets
+        if asset_filter.accepts_tag(asset)
+        and asset_filter.accepts_url(
+            get_asset_url(asset, base_url, reference_attribute)
         )
     ]
-    links = [
-        link
-        for link in soup.findAll("link")
-        if link.attrs["href"].startswith("/")
-        or urlsplit(link.attrs["href"]).netloc == domain
-    ]
-    return PageAssets(src=images + scripts, href=links)
 
 
 def process_assets(
@@ -151,11 +880,17 @@ def process_assets(
     page_url: str,
     file_name_prefix: str,
     folder: Union[str, Path],
+    context: Optional[DownloadContext] = None,
+    writer: Optional[FileWriter] = None,
 ) -> PageAssetsWithUpdatedAssets:
     """
     Creates the folder for assets storing, downloads and saves asset contents,
     updates asset tags with new reference attribute and returns old assets
     connected to updated assets
+    Every asset is handed to the writer as soon as it's downloaded,
+    stylesheets are handed after their references are rewritten
+    Assets which didn't fit into the page deadline (or failed in the best effort
+    mode) are left untouched
 
     :param assets: page assets
     :type assets: PageAssets
@@ -165,92 +900,523 @@ def process_assets(
     :type file_name_prefix: str
     :param folder: folder to save page contents
     :type folder: Path
+    :param context: download state, new one is created if not provided
+    :type context: Optional[DownloadContext]
+    :param writer: writer to pass assets to, assets are saved before return
+    if not provided
+    :type writer: Optional[FileWriter]
     :return: page assets with updated assets
     :rtype: PageAssetsWithUpdatedAssets
     :raises RuntimeError: if output folder doesn't exist
     """
-    if not assets.src and not assets.href:
+    if not any(assets.to_dict().values()) and not assets.srcset:
         return PageAssetsWithUpdatedAssets(
             src={},
             href={},
         )
+    context = context or DownloadContext.create()
+    if writer is None:
+        with FileWriter(context.options.durability) as own_writer:
+            return process_assets(
+                assets, page_url, file_name_prefix, folder, context, own_writer
+            )
     # create folder
-    assets_folder = generate_file_name_from_page_url(page_url).split(".")[0] + "_files"
+    assets_folder = generate_assets_folder_name(page_url)
     assets_folder_path = create_assets_folder(folder, assets_folder)
+    store = AssetStore(
+        assets_folder_path, FileNameIndex(file_name_prefix, page_url), context, writer
+    )
+    # download and store assets
+    stored_assets = download_page_assets(assets, page_url, store)
+    updated_assets = localize_assets(stored_assets, assets_folder_path)
+    if store.stylesheets:
+        process_stylesheets(store, context)
+    updated_srcset_assets = process_srcset_assets(
+        assets.srcset,
+        updated_assets["src"],
+        store,
+        assets.base_url or page_url,
+        context,
+    )
+    # return assets with new names back
+    return PageAssetsWithUpdatedAssets(
+        src=updated_assets["src"],
+        href=updated_assets["href"],
+        srcset=updated_srcset_assets,
+        data=updated_assets["data"],
+    )
 
-    # download assets
-    assets_content: Dict[str, Dict[Tag, Union[bytes, str]]] = {
-        "src": {},
-        "href": {},
-    }
-    for reference_attribute, assets_of_type in assets.to_dict().items():
-        for asset in assets_of_type:
-            url = get_asset_url(asset, page_url, reference_attribute)
-            assets_content[reference_attribute][asset] = get_page_content(url)
-
-    new_assets_path_content = {}
-    updated_assets: Dict[str, Dict[Tag, Tag]] = {
-        "src": {},
-        "href": {},
-    }
-    for reference_attribute, assets_of_type in assets.to_dict().items():
-        for asset in assets_of_type:
-            new_asset_file_name = generate_file_name(
-                file_name_prefix,
-                asset.attrs[reference_attribute],
-                page_url,
-            )
-            new_asset_path = assets_folder_path.joinpath(new_asset_file_name)
-            # assign new path to old content
-            new_assets_path_content[new_asset_path] = assets_content[
-                reference_attribute
-            ][asset]
 
+@dataclass(frozen=True)
+class StoredAsset:
+    # file name in the assets folder, None for the embedded asset
+    file_name: Optional[str] = None
+    data_uri: Optional[str] = None
+
+    def get_reference(self, assets_folder_path: Path) -> str:
+        # reference from the page
+        return self.data_uri or f"{assets_folder_path.name}/{self.file_name}"
+
+
+class AssetStore:
+    """
+    Stores the assets of one page as soon as they're downloaded, on the
+    download threads: assets smaller than inline_under option become data: uris,
+    others are handed to the writer, so the page never keeps their contents
+    Stylesheets are kept until their references are rewritten
+    if process_css option is set, see process_stylesheets
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        file_names: FileNameIndex,
+        context: DownloadContext,
+        writer: FileWriter,
+    ):
+        self.folder = folder
+        self.file_names = file_names
+        self.context = context
+        self.writer = writer
+        # contents of the stylesheets by their urls
+        self.stylesheets: Dict[str, Union[bytes, str]] = {}
+        self._stylesheet_urls: Set[str] = set()
+
+    def download(
+        self,
+        urls: List[str],
+        stylesheet_urls: Iterable[str] = (),
+        tolerate_failures: bool = False,
+    ) -> List[Optional[StoredAsset]]:
+        """
+        Downloads assets concurrently and stores every one right away
+
+        :param urls: assets urls
+        :type urls: List[str]
+        :param stylesheet_urls: urls of the stylesheets to keep
+        :type stylesheet_urls: Iterable[str]
+        :param tolerate_failures: skip failed assets even if best effort mode is off
+        :type tolerate_failures: bool
+        :return: stored assets in the urls order, None for skipped assets
+        :rtype: List[Optional[StoredAsset]]
+        """
+        self._stylesheet_urls.update(stylesheet_urls)
+        # names are given in the urls order rather than the download order,
+        # so colliding urls get the same names on every run
+        for url in urls:
+            self.file_names.get_file_name(url)
+        return download_assets(urls, self.context, tolerate_failures, self.store)
+
+    def store(self, url: str, content: Union[bytes, str]) -> StoredAsset:
+        file_name = self.file_names.get_file_name(url)
+        stylesheet = url in self._stylesheet_urls
+        if stylesheet and self.context.options.process_css:
+            self.stylesheets[url] = content
+            return StoredAsset(file_name=file_name)
+        # stylesheets stay files, their relative references need the assets folder
+        data_uri = None if stylesheet else get_data_uri(url, content, self.context)
+        if data_uri is not None:
+            return StoredAsset(data_uri=data_uri)
+        self.writer.write(self.folder.joinpath(file_name), content)
+        return StoredAsset(file_name=file_name)
+
+
+def localize_assets(
+    stored_assets: Dict[str, Dict[Tag, StoredAsset]], assets_folder_path: Path
+) -> Dict[str, Dict[Tag, Tag]]:
+    """
+    Connects stored assets to updated assets referencing their files
+    in the assets folder or their data: uris
+
+    :param stored_assets: stored assets by reference attribute
+    :type stored_assets: Dict[str, Dict[Tag, StoredAsset]]
+    :param assets_folder_path: assets folder
+    :type assets_folder_path: Path
+    :return: assets connected to updated assets by reference attribute
+    :rtype: Dict[str, Dict[Tag, Tag]]
+    """
+    updated_assets: Dict[str, Dict[Tag, Tag]] = {}
+    for reference_attribute, stored_of_type in stored_assets.items():
+        updated_assets[reference_attribute] = {}
+        for asset, stored_asset in stored_of_type.items():
             # update asset with new attribute
             asset_copy = copy(asset)
-            asset_copy.attrs[
-                reference_attribute
-            ] = f"{assets_folder}/{new_asset_file_name}"
+            asset_copy.attrs[reference_attribute] = stored_asset.get_reference(
+                assets_folder_path
+            )
             # connect old asset with new asset
             updated_assets[reference_attribute][asset] = asset_copy
-    assets_with_updated_assets = PageAssetsWithUpdatedAssets(
-        src=updated_assets["src"], href=updated_assets["href"]
+    return updated_assets
+
+
+def process_srcset_assets(
+    assets: List[Tag],
+    updated_src_assets: Dict[Tag, Tag],
+    store: AssetStore,
+    base_url: str,
+    context: DownloadContext,
+) -> Dict[Tag, Tag]:
+    """
+    Downloads srcset candidates selected by the srcset policy into the store
+    and returns srcset assets connected to updated ones
+    Updated asset keeps the src update of the same tag. With largest/smallest
+    policy srcset is reduced to the only downloaded candidate
+
+    :param assets: tags with srcset attribute
+    :type assets: List[Tag]
+    :param updated_src_assets: src assets connected to updated assets
+    :type updated_src_assets: Dict[Tag, Tag]
+    :param store: store of the page assets
+    :type store: AssetStore
+    :param base_url: page <base href> url or page url if there is no <base>
+    :type base_url: str
+    :param context: download state
+    :type context: DownloadContext
+    :return: srcset assets connected to updated assets
+    :rtype: Dict[Tag, Tag]
+    """
+    selected_candidates = {
+        asset: select_candidates(
+            parse_srcset(asset.attrs["srcset"]), context.options.srcset_policy
+        )
+        for asset in assets
+    }
+    urls = get_srcset_urls(selected_candidates.values(), base_url, context)
+    unique_urls = list(dict.fromkeys(urls.values()))
+    stored_by_url = dict(zip(unique_urls, store.download(unique_urls)))
+
+    new_urls = {}
+    for reference, url in urls.items():
+        stored_asset = stored_by_url[url]
+        if stored_asset is not None:
+            new_urls[reference] = stored_asset.get_reference(store.folder)
+
+    updated_assets = {}
+    for asset, candidates in selected_candidates.items():
+        asset_copy = copy(updated_src_assets.get(asset, asset))
+        asset_copy.attrs["srcset"] = serialize_srcset(
+            [
+                SrcsetCandidate(
+                    new_urls.get(candidate.url, candidate.url), candidate.descriptor
+                )
+                for candidate in candidates
+            ]
+        )
+        updated_assets[asset] = asset_copy
+    return updated_assets
+
+
+def get_srcset_urls(
+    candidates_of_assets: Iterable[List[SrcsetCandidate]],
+    base_url: str,
+    context: DownloadContext,
+) -> Dict[str, str]:
+    """
+    Returns urls of srcset candidates to download by candidates references,
+    data: urls and urls rejected by the asset filter are skipped
+    """
+    resolver = get_url_resolver(base_url)
+    urls = {}
+    for candidates in candidates_of_assets:
+        for candidate in candidates:
+            url = resolver.resolve(candidate.url)
+            if url.startswith("http") and context.options.asset_filter.accepts_url(url):
+                urls[candidate.url] = url
+    return urls
+
+
+def download_page_assets(
+    assets: PageAssets, page_url: str, store: AssetStore
+) -> Dict[str, Dict[Tag, StoredAsset]]:
+    """
+    Downloads page assets concurrently into the store,
+    every url is downloaded once
+
+    :param assets: page assets
+    :type assets: PageAssets
+    :param page_url: page url
+    :type page_url: str
+    :param store: store of the page assets
+    :type store: AssetStore
+    :return: stored assets by reference attribute, skipped assets are left out
+    :rtype: Dict[str, Dict[Tag, StoredAsset]]
+    """
+    assets_to_download = [
+        (reference_attribute, asset)
+        for reference_attribute, assets_of_type in assets.to_dict().items()
+        for asset in assets_of_type
+    ]
+    base_url = assets.base_url or page_url
+    assets_urls = {
+        asset: get_asset_url(asset, base_url, reference_attribute)
+        for reference_attribute, asset in assets_to_download
+    }
+    stylesheet_urls = [
+        url for asset, url in assets_urls.items() if is_stylesheet(asset, url)
+    ]
+    # references to the same url collapse into one download
+    unique_urls = prioritize_urls(assets_urls, store.context.options.asset_priority)
+    stored_by_url = dict(zip(unique_urls, store.download(unique_urls, stylesheet_urls)))
+    stored_assets: Dict[str, Dict[Tag, StoredAsset]] = {
+        reference_attribute: {} for reference_attribute in assets.to_dict()
+    }
+    for reference_attribute, asset in assets_to_download:
+        stored_asset = stored_by_url[assets_urls[asset]]
+        if stored_asset is not None:
+            stored_assets[reference_attribute][asset] = stored_asset
+    return stored_assets
+
+
+def prioritize_urls(assets_urls: Dict[Tag, str], priority: AssetPriority) -> List[str]:
+    """
+    Returns unique asset urls in the download order, e.g. stylesheets first,
+    so they aren't left behind by the images under the page deadline.
+    Url of several assets gets the highest priority of them
+
+    :param assets_urls: urls of the assets
+    :type assets_urls: Dict[Tag, str]
+    :param priority: priority function, see page_loader.priorities
+    :type priority: AssetPriority
+    :return: unique urls, urls of equal priority keep the document order
+    :rtype: List[str]
+    """
+    priorities: Dict[str, float] = {}
+    for asset, url in assets_urls.items():
+        asset_priority = priority(
+            AssetInfo(
+                url=url,
+                tag=asset.name,
+                rels=frozenset(rel.lower() for rel in get_rels(asset)),
+                size=asset_sizes.get(url),
+            )
+        )
+        priorities[url] = min(asset_priority, priorities.get(url, asset_priority))
+    return sorted(priorities, key=priorities.__getitem__)
+
+
+def process_stylesheets(store: AssetStore, context: DownloadContext) -> None:
+    """
+    Downloads assets referenced from the stylesheets of the store into
+    the assets folder, rewrites the references and hands the rewritten
+    stylesheets to the writer. Failed stylesheet assets never fail the page,
+    they keep their original urls
+
+    :param store: store of the page assets with the kept stylesheets
+    :type store: AssetStore
+    :param context: download state
+    :type context: DownloadContext
+    """
+    rewritten_stylesheets, downloaded_files = localize_stylesheets(
+        stylesheets=store.stylesheets,
+        fetch=partial(download_assets, context=context, tolerate_failures=True),
+        get_file_name=store.file_names.get_file_name,
+        known_file_names={
+            url: store.file_names.get_file_name(url) for url in store.stylesheets
+        },
+        store=partial(store_stylesheet_files, store),
     )
-    # save assets
-    save_assets(new_assets_path_content)
-    # return assets with new names back
-    return assets_with_updated_assets
+    for url, content in rewritten_stylesheets.items():
+        store.writer.write(
+            store.folder.joinpath(store.file_names.get_file_name(url)), content
+        )
+    # imported stylesheets
+    for file_name, content in downloaded_files.items():
+        store.writer.write(store.folder.joinpath(file_name), content)
+    store.stylesheets.clear()
+
+
+def store_stylesheet_files(store: AssetStore, urls: List[str]) -> List[Optional[str]]:
+    # files of the stylesheet are referenced by names, it's in the assets folder
+    return [
+        None
+        if stored_asset is None
+        else stored_asset.data_uri or stored_asset.file_name
+        for stored_asset in store.download(urls, tolerate_failures=True)
+    ]
+
+
+def is_stylesheet(asset: Tag, url: str) -> bool:
+    return "stylesheet" in get_rels(asset) or urlsplit(url).path.endswith(".css")
+
+
+def download_assets(
+    urls: List[str],
+    context: DownloadContext,
+    tolerate_failures: bool = False,
+    store: Optional[Callable[[str, bytes], Any]] = None,
+) -> List[Any]:
+    """
+    Downloads assets concurrently, see download_asset
+
+    :param urls: assets urls
+    :type urls: List[str]
+    :param context: download state
+    :type context: DownloadContext
+    :param tolerate_failures: skip failed assets even if best effort mode is off
+    :type tolerate_failures: bool
+    :param store: called with the url and the content of every downloaded asset
+        on its download thread, its result is returned instead of the content
+    :type store: Optional[Callable[[str, bytes], Any]]
+    :return: assets contents (or store results) in the urls order,
+        None for skipped assets
+    :rtype: List[Any]
+    """
+    for url in urls:
+        context.emit(AssetQueued(context.page_url, url))
+    download: Callable[[str], Any] = partial(
+        download_asset, context=context, tolerate_failures=tolerate_failures
+    )
+    if store is not None:
+        download = partial(download_and_store, download=download, store=store)
+    return map_concurrently(download, urls, context.options.asset_workers)
+
+
+def download_and_store(
+    url: str,
+    download: Callable[[str], Optional[bytes]],
+    store: Callable[[str, bytes], T],
+) -> Optional[T]:
+    content = download(url)
+    if content is None:
+        return None
+    return store(url, content)
 
 
-def get_asset_url(asset: Tag, page_url: str, reference_attribute: str) -> str:
+def download_asset(
+    url: str, context: DownloadContext, tolerate_failures: bool = False
+) -> Optional[bytes]:
     """
-    Extracts asset url
-    Covers http-like, absolute (/assets/...), relative (assets/...) references
+    Downloads asset content, returns None and records the failure
+    if the page deadline is reached or, in the best effort mode,
+    if the download failed
+    Assets rejected by mime type or size rules are skipped silently
+
+    :param url: asset url
+    :type url: str
+    :param context: download state
+    :type context: DownloadContext
+    :param tolerate_failures: skip failed asset even if best effort mode is off
+    :type tolerate_failures: bool
+    :return: asset content or None if asset was skipped
+    :rtype: Optional[bytes]
+    """
+    started_at = time.monotonic()
+    context.emit(AssetStarted(context.page_url, url))
+    try:
+        content = fetch_asset(url, context)
+    except AssetRejected as rejection:
+        logger.info(f"asset is skipped: {rejection}")
+        context.emit(AssetSkipped(context.page_url, url, str(rejection)))
+    except DeadlineExceeded:
+        logger.warning(f"page deadline is reached, asset {url} is skipped")
+        context.record_failure(url, "page deadline is reached")
+    except Exception as error:
+        if not context.options.best_effort and not tolerate_failures:
+            context.emit(AssetFailed(context.page_url, url, str(error) or repr(error)))
+            raise
+        logger.warning(f"asset {url} is skipped: {error}")
+        context.record_failure(url, str(error) or repr(error))
+    else:
+        duration = time.monotonic() - started_at
+        logger.info(
+            f"asset {url} is downloaded",
+            extra={
+                "page_url": context.page_url,
+                "asset_url": url,
+                "bytes": len(content),
+                "duration": duration,
+            },
+        )
+        context.emit(AssetDone(context.page_url, url, len(content), duration))
+        asset_sizes.record(url, len(content))
+        return content
+    return None
+
+
+def fetch_asset(url: str, context: DownloadContext) -> bytes:
+    """
+    Downloads asset content, see get_page_content
+    Asset mime type is recorded for embedding if inline_under option is set
+
+    :param url: asset url
+    :type url: str
+    :param context: download state
+    :type context: DownloadContext
+    :return: asset content
+    :rtype: bytes
+    """
+    on_progress = context.get_progress_callback(url)
+    # response headers are needed for the data: uris only
+    if context.options.inline_under is None:
+        return get_page_content(
+            url,
+            context.options,
+            context.deadline,
+            context.options.asset_filter,
+            on_progress,
+        )
+    response = get_page_response(
+        url,
+        context.options,
+        context.deadline,
+        context.options.asset_filter,
+        on_progress=on_progress,
+    )
+    check_status(url, response)
+    context.record_mime_type(
+        url, get_mime_type(response.headers.get("Content-Type"), url)
+    )
+    return response.content
+
+
+def map_concurrently(
+    function: Callable[[T], R], items: Iterable[T], workers: int
+) -> List[R]:
+    """
+    Applies function to items using up to workers threads,
+    results keep the items order
+    Threads borrow the idle sessions of the process, so their connections
+    outlive the threads, see pooled_session
+
+    :param function: function to apply
+    :type function: Callable[[T], R]
+    :param items: function arguments
+    :type items: Iterable[T]
+    :param workers: max number of threads, 1 means no threads at all
+    :type workers: int
+    :return: function results
+    :rtype: List[R]
+    """
+    if workers <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(partial(call_with_pooled_session, function), items))
+
+
+def call_with_pooled_session(function: Callable[[T], R], item: T) -> R:
+    with pooled_session():
+        return function(item)
+
+
+def get_asset_url(asset: Tag, base_url: str, reference_attribute: str) -> str:
+    """
+    Extracts asset url, see UrlResolver.resolve
 
     :param asset: asset to extract url from
     :type asset: Tag
-    :param page_url: page url
-    :type page_url: str
-    :param reference_attribute: url attribute name (scr, href)
+    :param base_url: page <base href> url or page url if there is no <base>
+    :type base_url: str
+    :param reference_attribute: url attribute name (src, href, data)
     :type reference_attribute: str
-    :return:
-    :rtype:
-    """
-    # absolute path
-    if asset.attrs[reference_attribute].startswith("/"):
-        parsed_page_url = urlsplit(page_url)
-        page_url_domain = f"{parsed_page_url.scheme}://{parsed_page_url.netloc}"
-        url = page_url_domain + asset.attrs[reference_attribute]
-    # looks like link
-    elif asset.attrs[reference_attribute].startswith("http"):
-        url = asset.attrs[reference_attribute]
-    # local path
-    else:
-        url = page_url + asset.attrs[reference_attribute]
-    return url
+    :return: normalized asset url
+    :rtype: str
+    """
+    return get_url_resolver(base_url).resolve(asset.attrs[reference_attribute])
 
 
-def update_page_assets(soup: BeautifulSoup, assets: PageAssetsWithUpdatedAssets) -> str:
+def update_page_assets(
+    soup: BeautifulSoup, assets: PageAssetsWithUpdatedAssets, in_place: bool = False
+) -> str:
     """
     Replaces old assets with new assets with updated assets
 
@@ -258,18 +1424,58 @@ def update_page_assets(soup: BeautifulSoup, assets: PageAssetsWithUpdatedAssets)
     :type soup: BeautifulSoup
     :param assets: page assets connected to updated assets
     :type assets: PageAssetsWithUpdatedAssets
+    :param in_place: update the assets of the soup itself instead of its copy,
+        for callers which don't need the soup afterwards
+    :type in_place: bool
     :return: updated page content
     :rtype: str
     """
-    soup_copy = deepcopy(soup)
-    for original_src_asset, updated_src_asset in assets.src.items():
-        original_asset_in_soup = soup_copy.find(
-            original_src_asset.name, src=original_src_asset.attrs["src"]
+    if in_place:
+        for assets_of_type in assets.to_dict().values():
+            for original_asset, updated_asset in assets_of_type.items():
+                original_asset.attrs = dict(updated_asset.attrs)
+        return soup.prettify()
+    # deepcopy recurses through every element, bs4 copy re-parses the markup
+    soup_copy = copy(soup)
+    apply_asset_updates(soup_copy, get_asset_updates(assets))
+    return soup_copy.prettify()
+
+
+def get_asset_updates(assets: PageAssetsWithUpdatedAssets) -> List[AssetUpdate]:
+    return [
+        AssetUpdate(
+            name=original_asset.name,
+            attribute=reference_attribute,
+            reference=original_asset.attrs[reference_attribute],
+            attrs=dict(updated_asset.attrs),
         )
-        original_asset_in_soup.replace_with(updated_src_asset)
-    for original_link_asset, updated_link_asset in assets.href.items():
-        original_asset_in_soup = soup_copy.find(
-            original_link_asset.name, href=original_link_asset.attrs["href"]
+        for reference_attribute, assets_of_type in assets.to_dict().items()
+        for original_asset, updated_asset in assets_of_type.items()
+    ]
+
+
+def get_indexed_asset_updates(
+    assets: PageAssetsWithUpdatedAssets, tags: List[Tag]
+) -> List[IndexedAssetUpdate]:
+    indices = {id(tag): index for index, tag in enumerate(tags)}
+    return [
+        IndexedAssetUpdate(index=indices[id(original_asset)], attrs=dict(updated.attrs))
+        for assets_of_type in assets.to_dict().values()
+        for original_asset, updated in assets_of_type.items()
+    ]
+
+
+def apply_asset_updates(soup: BeautifulSoup, updates: Iterable[AssetUpdate]) -> None:
+    """
+    Replaces attributes of the asset tags in place, nested tags are kept
+
+    :param soup: page soup
+    :type soup: BeautifulSoup
+    :param updates: asset updates in the order of get_asset_updates
+    :type updates: Iterable[AssetUpdate]
+    """
+    for update in updates:
+        asset_in_soup = soup.find(
+            update.name, attrs={update.attribute: update.reference}
         )
-        original_asset_in_soup.replace_with(updated_link_asset)
-    return soup_copy.prettify()
+        asset_in_soup.attrs = dict(update.attrs)
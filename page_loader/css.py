@@ -0,0 +1,289 @@
+import re
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from urllib.parse import urljoin
+
+from page_loader.urls import normalize_url
+
+MAX_IMPORT_DEPTH = 5
+NOT_LOCALIZABLE_PREFIXES = ("data:", "#", "about:", "javascript:")
+
+_DOUBLE_QUOTED = r'"(?P<{}>[^"\n]*)"'
+_SINGLE_QUOTED = r"'(?P<{}>[^'\n]*)'"
+_BARE = r"(?P<{}>[^'\"()\s]*)"
+
+
+def _url_function(prefix: str) -> str:
+    return r"url\(\s*(?:{}|{}|{})\s*\)".format(
+        _DOUBLE_QUOTED.format(f"{prefix}double_quoted"),
+        _SINGLE_QUOTED.format(f"{prefix}single_quoted"),
+        _BARE.format(f"{prefix}bare"),
+    )
+
+
+# One pass over the stylesheet: every alternative starts with its own character,
+# so each position is checked in constant time. Comments and strings are matched
+# only to be skipped, url(...) inside them isn't a reference.
+CSS_TOKEN_PATTERN = re.compile(
+    "|".join(
+        [
+            r"/\*.*?(?:\*/|\Z)",
+            r"@import\s+(?:{}|{}|{})".format(
+                _url_function("import_url_"),
+                _DOUBLE_QUOTED.format("import_double_quoted"),
+                _SINGLE_QUOTED.format("import_single_quoted"),
+            ),
+            _url_function(""),
+            r'"(?:[^"\\\n]|\\.)*"',
+            r"'(?:[^'\\\n]|\\.)*'",
+        ]
+    ),
+    re.IGNORECASE | re.DOTALL,
+)
+
+CssContent = Union[bytes, str]
+
+
+@dataclass(frozen=True)
+class CssReference:
+    url: str
+    # position of the url itself (without quotes) in the stylesheet
+    start: int
+    end: int
+    is_import: bool
+
+
+def find_css_references(css: str) -> List[CssReference]:
+    """
+    Finds url(...) and @import references in the stylesheet in linear time,
+    data: urls and fragment references are skipped
+
+    :param css: stylesheet
+    :type css: str
+    :return: references in the stylesheet order
+    :rtype: List[CssReference]
+    """
+    references = []
+    for match in CSS_TOKEN_PATTERN.finditer(css):
+        group = match.lastgroup
+        # comment or string
+        if group is None:
+            continue
+        url = match.group(group)
+        stripped_url = url.strip()
+        if not stripped_url or stripped_url.lower().startswith(
+            NOT_LOCALIZABLE_PREFIXES
+        ):
+            continue
+        references.append(
+            CssReference(
+                url=stripped_url,
+                start=match.start(group),
+                end=match.end(group),
+                is_import=group.startswith("import_"),
+            )
+        )
+    return references
+
+
+def rewrite_css(
+    css: str, references: Sequence[CssReference], new_urls: Mapping[str, str]
+) -> str:
+    """
+    Replaces references urls, references without new url are kept as is
+
+    :param css: stylesheet
+    :type css: str
+    :param references: stylesheet references from find_css_references
+    :type references: Sequence[CssReference]
+    :param new_urls: new url for the reference url
+    :type new_urls: Mapping[str, str]
+    :return: updated stylesheet
+    :rtype: str
+    """
+    parts = []
+    position = 0
+    for reference in references:
+        new_url = new_urls.get(reference.url)
+        if new_url is None:
+            continue
+        parts.append(css[position : reference.start])
+        parts.append(new_url)
+        position = reference.end
+    parts.append(css[position:])
+    return "".join(parts)
+
+
+def decode_css(content: CssContent) -> str:
+    # surrogateescape keeps non utf-8 bytes as they are after encode_css
+    if isinstance(content, str):
+        return content
+    return content.decode("utf-8", errors="surrogateescape")
+
+
+def encode_css(css: str, original_content: CssContent) -> CssContent:
+    if isinstance(original_content, str):
+        return css
+    return css.encode("utf-8", errors="surrogateescape")
+
+
+def localize_stylesheets(
+    stylesheets: Mapping[str, CssContent],
+    fetch: Callable[[List[str]], Sequence[Optional[CssContent]]],
+    get_file_name: Callable[[str], str],
+    known_file_names: Optional[Mapping[str, str]] = None,
+    max_import_depth: int = MAX_IMPORT_DEPTH,
+    get_data_uri: Optional[Callable[[str, CssContent], Optional[str]]] = None,
+    store: Optional[Callable[[List[str]], Sequence[Optional[str]]]] = None,
+) -> Tuple[Dict[str, CssContent], Dict[str, CssContent]]:
+    """
+    Downloads assets referenced from the stylesheets (fonts, images,
+    imported stylesheets) and rewrites references to the downloaded files
+    All files are expected to be stored in one folder, so new references
+    are just file names. Imported stylesheets are processed level by level,
+    every level is fetched with one fetch call
+
+    :param stylesheets: stylesheets content by their absolute urls
+    :type stylesheets: Mapping[str, CssContent]
+    :param fetch: downloads urls, returns None for the failed ones
+    :type fetch: Callable[[List[str]], Sequence[Optional[CssContent]]]
+    :param get_file_name: returns file name for the absolute url
+    :type get_file_name: Callable[[str], str]
+    :param known_file_names: already stored files by their urls, they aren't fetched
+    :type known_file_names: Optional[Mapping[str, str]]
+    :param max_import_depth: max depth of the followed @import chains
+    :type max_import_depth: int
+    :param get_data_uri: returns data: uri for the asset to embed into
+    the stylesheet instead of the file, or None
+    :type get_data_uri: Optional[Callable[[str, CssContent], Optional[str]]]
+    :param store: downloads and stores not stylesheet urls itself, returns their
+    new references (None for the failed ones), so their contents aren't returned
+    :type store: Optional[Callable[[List[str]], Sequence[Optional[str]]]]
+    :return: rewritten given stylesheets by url and downloaded files by file name
+    :rtype: Tuple[Dict[str, CssContent], Dict[str, CssContent]]
+    """
+    # new references by urls: file names or data: uris, None for failed urls
+    file_names: Dict[str, Optional[str]] = dict(known_file_names or {})
+    processed: Dict[str, CssContent] = {}
+    downloaded: Dict[str, CssContent] = {}
+    pending = dict(stylesheets)
+    depth = 0
+    while pending:
+        references = {
+            url: find_css_references(decode_css(content))
+            for url, content in pending.items()
+        }
+        urls_to_fetch = _collect_urls(
+            references, file_names, follow_imports=depth < max_import_depth
+        )
+        imports, files = _fetch_urls(
+            urls_to_fetch, file_names, fetch, get_file_name, get_data_uri, store
+        )
+        downloaded.update(files)
+        for url, content in pending.items():
+            processed[url] = _rewrite_stylesheet(
+                url, content, references[url], file_names
+            )
+        pending = imports
+        depth += 1
+    # files of the imported stylesheets are known after their processing
+    for url in list(processed):
+        if url not in stylesheets:
+            downloaded[file_names[url]] = processed.pop(url)  # type: ignore[index]
+    return processed, downloaded
+
+
+def _collect_urls(
+    references: Mapping[str, List[CssReference]],
+    file_names: Mapping[str, Optional[str]],
+    follow_imports: bool,
+) -> Dict[str, bool]:
+    """
+    Returns absolute urls of not yet known references,
+    connected to flag whether url is a stylesheet to process
+    """
+    urls_to_fetch: Dict[str, bool] = {}
+    for stylesheet_url, stylesheet_references in references.items():
+        for reference in stylesheet_references:
+            url = normalize_url(urljoin(stylesheet_url, reference.url))
+            if url not in file_names:
+                is_import = follow_imports and reference.is_import
+                urls_to_fetch[url] = urls_to_fetch.get(url, False) or is_import
+    return urls_to_fetch
+
+
+def _fetch_urls(
+    urls_to_fetch: Mapping[str, bool],
+    file_names: Dict[str, Optional[str]],
+    fetch: Callable[[List[str]], Sequence[Optional[CssContent]]],
+    get_file_name: Callable[[str], str],
+    get_data_uri: Optional[Callable[[str, CssContent], Optional[str]]] = None,
+    store: Optional[Callable[[List[str]], Sequence[Optional[str]]]] = None,
+) -> Tuple[Dict[str, CssContent], Dict[str, CssContent]]:
+    """
+    Fetches urls, returns stylesheets to process by url
+    and other downloaded files by file name
+    Embedded files get their data: uri instead of the file name,
+    files of the store get the references it returns
+    """
+    if store is None:
+        return _fetch_contents(
+            urls_to_fetch, file_names, fetch, get_file_name, get_data_uri
+        )
+    stored_urls = [url for url, is_import in urls_to_fetch.items() if not is_import]
+    if stored_urls:
+        file_names.update(zip(stored_urls, store(stored_urls)))
+    import_urls = {url: True for url, is_import in urls_to_fetch.items() if is_import}
+    return _fetch_contents(import_urls, file_names, fetch, get_file_name)
+
+
+def _fetch_contents(
+    urls_to_fetch: Mapping[str, bool],
+    file_names: Dict[str, Optional[str]],
+    fetch: Callable[[List[str]], Sequence[Optional[CssContent]]],
+    get_file_name: Callable[[str], str],
+    get_data_uri: Optional[Callable[[str, CssContent], Optional[str]]] = None,
+) -> Tuple[Dict[str, CssContent], Dict[str, CssContent]]:
+    imports: Dict[str, CssContent] = {}
+    files: Dict[str, CssContent] = {}
+    urls = list(urls_to_fetch)
+    for url, content in zip(urls, fetch(urls) if urls else []):
+        if content is None:
+            file_names[url] = None
+            continue
+        # imported stylesheets have references to rewrite, they stay files
+        if not urls_to_fetch[url] and get_data_uri is not None:
+            data_uri = get_data_uri(url, content)
+            if data_uri is not None:
+                file_names[url] = data_uri
+                continue
+        file_name = get_file_name(url)
+        file_names[url] = file_name
+        if urls_to_fetch[url]:
+            imports[url] = content
+        else:
+            files[file_name] = content
+    return imports, files
+
+
+def _rewrite_stylesheet(
+    url: str,
+    content: CssContent,
+    references: List[CssReference],
+    file_names: Mapping[str, Optional[str]],
+) -> CssContent:
+    new_urls = {}
+    for reference in references:
+        file_name = file_names.get(normalize_url(urljoin(url, reference.url)))
+        if file_name is not None:
+            new_urls[reference.url] = file_name
+    return encode_css(rewrite_css(decode_css(content), references, new_urls), content)
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+from page_loader.css import NOT_LOCALIZABLE_PREFIXES
+
+
+def accepts_any_reference(reference: str, domain: str) -> bool:
+    return True
+
+
+def is_localizable(reference: str, domain: str) -> bool:
+    # data: urls, fragments, etc. can't be downloaded
+    return not reference.strip().lower().startswith(NOT_LOCALIZABLE_PREFIXES)
+
+
+def is_same_domain(reference: str, domain: str) -> bool:
+    # relative references have no host, //cdn references have the other one,
+    # hostname is lowercased and has no port
+    if not is_localizable(reference, domain):
+        return False
+    return urlsplit(reference).hostname in (None, domain)
+
+
+@dataclass(frozen=True)
+class AssetRule:
+    tag: str
+    # attribute with the asset reference, assets are grouped by it
+    attribute: str
+    # called with the reference and the page domain
+    accepts: Callable[[str, str], bool] = is_localizable
+
+
+# Adding new kind of asset is a new row here, the page is walked once anyway.
+# Rules order defines assets order inside one attribute group.
+ASSET_RULES: Tuple[AssetRule, ...] = (
+    AssetRule("img", "src"),
+    AssetRule("script", "src", is_same_domain),
+    AssetRule("video", "src", is_same_domain),
+    AssetRule("audio", "src", is_same_domain),
+    AssetRule("source", "src", is_same_domain),
+    AssetRule("iframe", "src", is_same_domain),
+    AssetRule("link", "href", is_same_domain),
+    AssetRule("object", "data", is_same_domain),
+    # every candidate is checked while srcset is processed
+    AssetRule("img", "srcset", accepts_any_reference),
+    AssetRule("source", "srcset", accepts_any_reference),
+)
+
+
+@lru_cache(maxsize=None)
+def group_rules_by_tag(
+    rules: Tuple[AssetRule, ...]
+) -> Dict[str, Tuple[AssetRule, ...]]:
+    rules_by_tag: Dict[str, Tuple[AssetRule, ...]] = {}
+    for rule in rules:
+        rules_by_tag[rule.tag] = rules_by_tag.get(rule.tag, ()) + (rule,)
+    return rules_by_tag
+
+
+def find_assets(
+    soup: BeautifulSoup, page_url: str, rules: Sequence[AssetRule] = ASSET_RULES
+) -> Dict[str, List[Tag]]:
+    """
+    Finds asset tags with one walk over the page
+    Tags without the rule attribute (or with empty one) are skipped,
+    one tag could match several rules (e.g. img with src and srcset)
+
+    :param soup: page soup
+    :type soup: BeautifulSoup
+    :param page_url: page url
+    :type page_url: str
+    :param rules: tag, attribute and reference filter of every kind of asset
+    :type rules: Sequence[AssetRule]
+    :return: asset tags grouped by the reference attribute,
+    ordered by rules and then by position in the page
+    :rtype: Dict[str, List[Tag]]
+    """
+    rules_by_tag = group_rules_by_tag(tuple(rules))
+    domain = urlsplit(page_url).hostname or ""
+    found: Dict[AssetRule, List[Tag]] = {rule: [] for rule in rules}
+    # find_all with several names matches every element against the list,
+    # plain walk with dict lookup is much cheaper
+    for tag in soup.descendants:
+        if not isinstance(tag, Tag) or tag.name not in rules_by_tag:
+            continue
+        for rule in rules_by_tag[tag.name]:
+            reference = tag.attrs.get(rule.attribute)
+            if reference and rule.accepts(reference, domain):
+                found[rule].append(tag)
+    assets: Dict[str, List[Tag]] = {}
+    for rule in rules:
+        assets.setdefault(rule.attribute, []).extend(found[rule])
+    return assets
@@ -0,0 +1,104 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from page_loader.events import (
+    AssetDone,
+    AssetFailed,
+    AssetProgress,
+    AssetQueued,
+    AssetSkipped,
+    Event,
+    PageDone,
+    PageFailed,
+    PageStarted,
+)
+from progress.bar import Bar
+
+# seconds between two redraws of the progress bar
+DEFAULT_REFRESH_INTERVAL = 0.1
+SIZE_UNITS = ("B", "K", "M", "G")
+
+
+def format_size(size: int) -> str:
+    """
+    Formats bytes for humans, e.g. 1.5M
+
+    :param size: size in bytes
+    :type size: int
+    :return: formatted size
+    :rtype: str
+    """
+    value = float(size)
+    for unit in SIZE_UNITS[:-1]:
+        if value < 1024:
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+    return f"{value:.1f}{SIZE_UNITS[-1]}"
+
+
+class AssetsBar(Bar):
+    suffix = "%(index)d/%(max)d assets, %(received)s"
+    received_bytes = 0
+
+    @property
+    def received(self) -> str:
+        return format_size(self.received_bytes)
+
+
+class ProgressDisplay:
+    """
+    Event sink rendering one progress bar for all the page assets,
+    the bar is redrawn at most once per refresh interval
+    whatever the number of concurrently downloaded assets
+    """
+
+    def __init__(
+        self, refresh_interval: float = DEFAULT_REFRESH_INTERVAL, **bar_options
+    ):
+        self.refresh_interval = refresh_interval
+        self._bar = AssetsBar("Downloading", max=0, **bar_options)
+        # received bytes of the assets being downloaded
+        self._received: Dict[str, int] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def __call__(self, event: Event) -> None:
+        with self._lock:
+            self._apply(event)
+            now = time.monotonic()
+            if (
+                self._refreshed_at is None
+                or now - self._refreshed_at >= self.refresh_interval
+                or isinstance(event, (PageDone, PageFailed))
+            ):
+                self._bar.update()
+                self._refreshed_at = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._bar.update()
+            self._bar.finish()
+
+    def __enter__(self) -> "ProgressDisplay":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _apply(self, event: Event) -> None:
+        if isinstance(event, PageStarted):
+            self._bar.message = f"Downloading {event.page_url}"
+        elif isinstance(event, AssetQueued):
+            self._bar.max += 1
+        elif isinstance(event, AssetProgress):
+            previous = self._received.get(event.asset_url, 0)
+            self._bar.received_bytes += event.received - previous
+            self._received[event.asset_url] = event.received
+        elif isinstance(event, AssetDone):
+            previous = self._received.pop(event.asset_url, 0)
+            self._bar.received_bytes += event.bytes - previous
+            self._bar.index += 1
+        elif isinstance(event, (AssetFailed, AssetSkipped)):
+            self._received.pop(event.asset_url, None)
+            self._bar.index += 1
@@ -0,0 +1,135 @@
+import codecs
+import mmap
+import re
+from typing import Optional, Tuple, Union
+
+# <meta charset> is expected within the first KB of the page
+PRESCAN_SIZE = 1024
+CHARSET_PARAMETER_PATTERN = re.compile(
+    r"""charset\s*=\s*["']?\s*([^\s"';]+)""", re.IGNORECASE
+)
+# <meta charset="utf-8"> and <meta http-equiv="Content-Type"
+# content="text/html; charset=utf-8">
+META_CHARSET_PATTERN = re.compile(
+    rb"""<meta\s[^>]*?charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE
+)
+BYTE_ORDER_MARKS = (codecs.BOM_UTF8, codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+# browsers decode these labels as windows-1252 (WHATWG Encoding Standard)
+WINDOWS_1252_ALIASES = frozenset({"ascii", "iso8859-1"})
+# codecs that read the byte order mark themselves
+BYTE_ORDER_MARK_ENCODINGS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# the parser's own guesses when it has no encoding detector
+FALLBACK_ENCODINGS = ("utf-8", "cp1252")
+
+
+def normalize_charset(charset: str) -> Optional[str]:
+    """
+    Returns python codec name for the charset label
+
+    :param charset: charset label, e.g. UTF8 or windows-1251
+    :type charset: str
+    :return: codec name or None if python doesn't know the charset
+    :rtype: Optional[str]
+    """
+    try:
+        name = codecs.lookup(charset.strip()).name
+    except LookupError:
+        return None
+    if name in WINDOWS_1252_ALIASES:
+        return "cp1252"
+    return name
+
+
+def get_header_charset(content_type: Optional[str]) -> Optional[str]:
+    """
+    Returns charset of the Content-Type header value
+
+    :param content_type: Content-Type header value, e.g. text/html; charset=utf-8
+    :type content_type: Optional[str]
+    :return: codec name or None if there is no known charset
+    :rtype: Optional[str]
+    """
+    if not content_type:
+        return None
+    match = CHARSET_PARAMETER_PATTERN.search(content_type)
+    if match is None:
+        return None
+    return normalize_charset(match.group(1))
+
+
+def prescan_charset(content: bytes) -> Optional[str]:
+    """
+    Returns <meta> charset from the beginning of the page
+
+    :param content: page content
+    :type content: bytes
+    :return: codec name or None if there is no known charset
+    :rtype: Optional[str]
+    """
+    match = META_CHARSET_PATTERN.search(content, 0, PRESCAN_SIZE)
+    if match is None:
+        return None
+    charset = normalize_charset(match.group(1).decode("ascii"))
+    # the page is already decoded with ascii compatible charset to find <meta>
+    if charset is not None and charset.startswith("utf-16"):
+        return "utf-8"
+    return charset
+
+
+def detect_encoding(content: bytes, content_type: Optional[str]) -> Optional[str]:
+    """
+    Detects page encoding the way browsers do before guessing: byte order mark,
+    Content-Type header charset, then <meta> charset in the first KB
+
+    :param content: page content
+    :type content: bytes
+    :param content_type: Content-Type header value
+    :type content_type: Optional[str]
+    :return: codec name or None if the encoding should be guessed
+    :rtype: Optional[str]
+    """
+    # byte order mark is checked by the parser itself as cheap as here
+    if content.startswith(BYTE_ORDER_MARKS):
+        return None
+    return get_header_charset(content_type) or prescan_charset(content)
+
+
+def get_byte_order_mark_encoding(content: bytes) -> Optional[str]:
+    for mark, encoding in BYTE_ORDER_MARK_ENCODINGS:
+        if content.startswith(mark):
+            return encoding
+    return None
+
+
+def decode_page(
+    content: Union[bytes, mmap.mmap],
+    encoding: Optional[str],
+) -> Tuple[str, str]:
+    """
+    Decodes the page with its encoding, if it's known and right, or with
+    the parser's fallbacks. Any buffer is decoded in place, so a memory
+    mapped page isn't copied before decoding
+
+    :param content: page content
+    :type content: Union[bytes, mmap.mmap]
+    :param encoding: page encoding, see detect_encoding
+    :type encoding: Optional[str]
+    :return: decoded page and the encoding it was decoded with
+    :rtype: Tuple[str, str]
+    """
+    byte_order_mark_encoding = get_byte_order_mark_encoding(content[:3])
+    if byte_order_mark_encoding is not None:
+        encoding = byte_order_mark_encoding
+    for candidate in (encoding, *FALLBACK_ENCODINGS):
+        if candidate is None:
+            continue
+        try:
+            return str(content, candidate), candidate
+        except UnicodeDecodeError:
+            pass
+    # cp1252 leaves a few bytes undefined, the parser replaces them too
+    return str(content, "cp1252", "replace"), "cp1252"
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from typing import Callable, Optional, Union
+
+
+@dataclass(frozen=True)
+class PageStarted:
+    page_url: str
+
+
+@dataclass(frozen=True)
+class PageDone:
+    page_url: str
+    file_path: str
+    bytes: int
+    duration: float
+    # the saved page is kept, see DownloadOptions.skip_unchanged
+    unchanged: bool = False
+
+
+@dataclass(frozen=True)
+class PageFailed:
+    page_url: str
+    error: str
+
+
+@dataclass(frozen=True)
+class AssetQueued:
+    page_url: Optional[str]
+    asset_url: str
+
+
+@dataclass(frozen=True)
+class AssetStarted:
+    page_url: Optional[str]
+    asset_url: str
+
+
+@dataclass(frozen=True)
+class AssetProgress:
+    page_url: Optional[str]
+    asset_url: str
+    received: int
+    # Content-Length, if the server has sent it
+    total: Optional[int]
+
+
+@dataclass(frozen=True)
+class AssetDone:
+    page_url: Optional[str]
+    asset_url: str
+    bytes: int
+    duration: float
+
+
+@dataclass(frozen=True)
+class AssetFailed:
+    page_url: Optional[str]
+    asset_url: str
+    reason: str
+
+
+@dataclass(frozen=True)
+class AssetSkipped:
+    # rejected by the asset filter
+    page_url: Optional[str]
+    asset_url: str
+    reason: str
+
+
+Event = Union[
+    PageStarted,
+    PageDone,
+    PageFailed,
+    AssetQueued,
+    AssetStarted,
+    AssetProgress,
+    AssetDone,
+    AssetFailed,
+    AssetSkipped,
+]
+# called by the downloading threads, asset events come from asset workers
+# concurrently, so sinks should be thread safe and fast
+EventSink = Callable[[Event], None]
+# received bytes and Content-Length
+ProgressCallback = Callable[[int, Optional[int]], None]
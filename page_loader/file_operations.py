@@ -1,13 +1,33 @@
+import hashlib
+import mmap
+import os
+import queue
 import re
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager, suppress
+from functools import lru_cache
 from pathlib import Path
-from typing import Mapping, Union
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 from urllib.parse import urlsplit
 
 from page_loader.logging import get_logger
 
 logger = get_logger("page_loader.comm")
 
+NOT_WORD_PATTERN = re.compile(r"\W")
+# hex digits of url hash added to the names of colliding files
+COLLISION_HASH_LENGTH = 8
+PAGE_NAMES_CACHE_SIZE = 1024
 
+DURABILITY_NONE = "none"
+DURABILITY_PAGE = "page"
+DURABILITY_FILE = "file"
+DURABILITY_MODES = (DURABILITY_NONE, DURABILITY_PAGE, DURABILITY_FILE)
+
+
+@lru_cache(maxsize=PAGE_NAMES_CACHE_SIZE)
 def generate_file_name_from_page_url(page_url: str) -> str:
     """
     Generates file name for the main page file using page url
@@ -24,10 +44,11 @@ def generate_file_name_from_page_url(page_url: str) -> str:
     if "." in path:
         path = parsed_url.path.split(".")[0]
     url_without_schema = f"{parsed_url.netloc}{path}"
-    url_with_digits_replaced = re.sub(r"\W", "-", url_without_schema) + ".html"
+    url_with_digits_replaced = NOT_WORD_PATTERN.sub("-", url_without_schema) + ".html"
     return url_with_digits_replaced
 
 
+@lru_cache(maxsize=PAGE_NAMES_CACHE_SIZE)
 def generate_file_name_prefix_from_page_url(page_url: str) -> str:
     """
     Generates prefix for the page file names using page url
@@ -40,43 +61,84 @@ def generate_file_name_prefix_from_page_url(page_url: str) -> str:
     """
     parsed_url = urlsplit(page_url)
     domain = parsed_url.netloc
-    domain_with_digits_replaced = re.sub(r"\W", "-", domain)
+    domain_with_digits_replaced = NOT_WORD_PATTERN.sub("-", domain)
     return domain_with_digits_replaced
 
 
-def generate_file_name(file_name_prefix: str, attribute: str, page_url: str) -> str:
+def generate_assets_folder_name(page_url: str) -> str:
     """
-    Generates file name from asset tag attribute with file_name_prefix
+    Generates assets folder name using page url
 
-    :param file_name_prefix: prefix for page file names
-    :type file_name_prefix: str
-    :param attribute: asset tag src attribute
-    :type attribute: str
-    :return: file name
+    :param page_url: page url
+    :type page_url: str
+    :return: assets folder name
+    (e.g. ru-hexlet-io-courses_files for https://ru.hexlet.io/courses)
     :rtype: str
     """
-    # actual links
-    if attribute.startswith("http"):
-        parsed_url = urlsplit(attribute)
-        if "." in parsed_url.path:
-            path, extension = parsed_url.path.split(".")
-            return re.sub(r"\W", "-", parsed_url.netloc + path) + f".{extension}"
-        else:
-            return re.sub(r"\W", "-", parsed_url.netloc + parsed_url.path) + ".html"
-    elif "." not in attribute:
-        parsed_url = urlsplit(page_url)
-        return re.sub(r"\W", "-", parsed_url.netloc + attribute) + ".html"
-    path, extension = attribute.split(".")
-    path_with_digits_replaced = re.sub(r"\W", "-", path)
-    if not path.startswith("/"):
-        file_name_prefix = file_name_prefix + "-"
-    final_path = file_name_prefix + path_with_digits_replaced + "." + extension
-    return final_path
+    return generate_file_name_from_page_url(page_url).split(".")[0] + "_files"
+
+
+class FileNameIndex:
+    """
+    File names of one page assets: every asset url gets its name once,
+    the name is made of the url host and path, different urls which would
+    share the name (e.g. they differ by query string only) get the short hash
+    of the url before the extension
+    """
+
+    def __init__(self, file_name_prefix: str, page_url: str):
+        self.file_name_prefix = file_name_prefix
+        self.page_url = page_url
+        self._page_host = urlsplit(page_url).netloc
+        self._names_by_url: Dict[str, str] = {}
+        self._urls_by_name: Dict[str, str] = {}
+
+    def get_file_name(self, url: str) -> str:
+        """
+        Returns file name of the asset, the same url always gets the same name
+
+        :param url: absolute normalized asset url
+        :type url: str
+        :return: file name unique for the page
+        :rtype: str
+        """
+        file_name = self._names_by_url.get(url)
+        if file_name is not None:
+            return file_name
+        file_name = self._generate_file_name(url)
+        if file_name in self._urls_by_name:
+            file_name = add_url_hash(file_name, url)
+        self._names_by_url[url] = file_name
+        self._urls_by_name[file_name] = url
+        return file_name
+
+    def _generate_file_name(self, url: str) -> str:
+        # e.g. foo-bar-img-logo.png for https://foo.bar/img/logo.png?v=2
+        parsed_url = urlsplit(url)
+        directory, __, file_name = parsed_url.path.rpartition("/")
+        stem, extension = file_name, "html"
+        if "." in file_name:
+            stem, extension = file_name.rsplit(".", 1)
+        path = NOT_WORD_PATTERN.sub("-", f"{directory}/{stem}")
+        extension = NOT_WORD_PATTERN.sub("-", extension)
+        if parsed_url.netloc == self._page_host:
+            return f"{self.file_name_prefix}{path}.{extension}"
+        return f"{NOT_WORD_PATTERN.sub('-', parsed_url.netloc)}{path}.{extension}"
+
+
+def add_url_hash(file_name: str, url: str) -> str:
+    """
+    Adds short url hash to the file name, e.g. foo-bar-image-1a2b3c4d.png
+    """
+    url_hash = hashlib.sha1(url.encode()).hexdigest()[:COLLISION_HASH_LENGTH]
+    stem, extension = file_name.rsplit(".", 1)
+    return f"{stem}-{url_hash}.{extension}"
 
 
 def save_file(content: Union[str, bytes], file_name: str, folder: Path) -> Path:
     """
-    Saves content into provided folder under provided file name
+    Saves content into provided folder under provided file name,
+    see write_file
 
     :param content: file content
     :type content: Union[str, bytes]
@@ -89,12 +151,53 @@ def save_file(content: Union[str, bytes], file_name: str, folder: Path) -> Path:
     :raises RuntimeError: if output folder doesn't exist
     """
     folder = Path(folder)
+    check_folder(folder)
+
+    filepath = folder.joinpath(file_name)
+    write_file(filepath, content)
+
+    return filepath
+
+
+def check_folder(folder: Path) -> None:
     if not folder.is_dir():
         error_message = "folder for content saving doesn't exist!"
         logger.error(error_message)
         raise RuntimeError(error_message)
 
-    filepath = folder.joinpath(file_name)
+
+@contextmanager
+def mapped_file(filepath: Path) -> Iterator[Union[bytes, mmap.mmap]]:
+    """
+    Maps the file into memory read-only, its content is read by the OS pages
+    on access and isn't copied into the process memory as a whole
+
+    :param filepath: file path
+    :type filepath: Path
+    :return: file content, empty bytes for the empty file (it can't be mapped)
+    :rtype: Iterator[Union[bytes, mmap.mmap]]
+    """
+    with open(filepath, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            yield content
+
+
+def write_file(filepath: Path, content: Union[str, bytes], fsync: bool = False) -> None:
+    """
+    Writes content into the temporary file next to filepath and renames it,
+    so the file with the final name is always complete
+
+    :param filepath: file path
+    :type filepath: Path
+    :param content: file content
+    :type content: Union[str, bytes]
+    :param fsync: flush file content to the disk before rename
+    :type fsync: bool
+    """
+    temporary_path = filepath.with_name(f".{filepath.name}.{uuid.uuid4().hex[:8]}.tmp")
 
     if isinstance(content, str):
         mode = "w"
@@ -102,28 +205,128 @@ def save_file(content: Union[str, bytes], file_name: str, folder: Path) -> Path:
         mode = "wb"
 
     try:
-        with filepath.open(mode) as file:
+        with temporary_path.open(mode) as file:
             file.write(content)
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(temporary_path, filepath)
     except Exception:
         logger.error(
             "something went wrong on file writing, see exception message above"
         )
+        with suppress(OSError):
+            temporary_path.unlink()
         raise
 
-    return filepath
+
+def sync_path(path: Path) -> None:
+    # directories are synced to persist renames of their files
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class FileWriter:
+    """
+    Writes files on the own thread, so downloading and page processing
+    don't wait for the disk. Folders existence is checked once per folder.
+    Durability modes:
+    none - files are renamed into place without fsync,
+    page - all the files and their folders are synced on close,
+    file - every file and its folder are synced right after the write
+    """
+
+    def __init__(self, durability: str = DURABILITY_NONE):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode: {durability}")
+        self.durability = durability
+        self._queue: "queue.Queue[Optional[Tuple[Path, Union[str, bytes]]]]" = (
+            queue.Queue()
+        )
+        self._known_folders: Set[Path] = set()
+        self._written_files: List[Path] = []
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(
+            target=self._work, name="page-loader-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, filepath: Path, content: Union[str, bytes]) -> None:
+        self._queue.put((filepath, content))
+
+    def close(self) -> None:
+        """
+        Waits for the queued files and syncs them in page durability mode
+
+        :raises RuntimeError: if file folder doesn't exist
+        :raises Exception: first failed write error
+        """
+        self._stop()
+        if self._error is not None:
+            raise self._error
+        if self.durability == DURABILITY_PAGE:
+            for filepath in self._written_files:
+                sync_path(filepath)
+            for folder in self._known_folders:
+                sync_path(folder)
+
+    def __enter__(self) -> "FileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._stop()
+
+    def _stop(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            # the page is failed anyway, the rest is dropped
+            if self._error is not None:
+                continue
+            try:
+                self._write(*item)
+            except Exception as error:
+                self._error = error
+
+    def _write(self, filepath: Path, content: Union[str, bytes]) -> None:
+        folder = filepath.parent
+        if folder not in self._known_folders:
+            check_folder(folder)
+            self._known_folders.add(folder)
+        write_file(filepath, content, fsync=self.durability == DURABILITY_FILE)
+        if self.durability == DURABILITY_FILE:
+            sync_path(folder)
+        self._written_files.append(filepath)
 
 
-def save_assets(assets_path_with_content: Mapping[Path, Union[bytes, str]]) -> None:
+def remove_assets_folder(main_folder: Union[str, Path], page_url: str) -> None:
     """
-    Saves assets according to their path
+    Removes assets folder of the previously saved page, if any,
+    so the page could be saved again from scratch
 
-    :param assets_path_with_content: assets path with content
-    :type assets_path_with_content: Mapping[Path, Union[bytes, str]]
-    :raises RuntimeError: if asset path folder doesn't exist
+    :param main_folder: folder the page is saved into
+    :type main_folder: Union[str, Path]
+    :param page_url: page url
+    :type page_url: str
     """
-    for asset_path, content in assets_path_with_content.items():
-        asset_folder, asset_file_name = asset_path.parent.resolve(), asset_path.name
-        save_file(content, asset_file_name, asset_folder)
+    assets_folder_path = Path(main_folder).joinpath(
+        generate_assets_folder_name(page_url)
+    )
+    if assets_folder_path.is_dir():
+        logger.info(f"removing previously saved assets {str(assets_folder_path)}")
+        shutil.rmtree(assets_folder_path, ignore_errors=True)
 
 
 def create_assets_folder(main_folder: Union[str, Path], assets_folder: str) -> Path:
@@ -0,0 +1,121 @@
+import mimetypes
+import re
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional, Pattern, Tuple
+
+from bs4.element import Tag
+
+SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([BKMG]?)I?B?\s*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class AssetFilter:
+    """
+    Include/exclude rules for page assets, empty include rules allow everything
+    Tag, rel and url rules are checked while the page is parsed,
+    mime type and size rules - when the asset response headers are received
+    """
+
+    include_tags: FrozenSet[str] = frozenset()
+    exclude_tags: FrozenSet[str] = frozenset()
+    # rel rules are applied to the tags with rel attribute only (link)
+    include_rels: FrozenSet[str] = frozenset()
+    exclude_rels: FrozenSet[str] = frozenset()
+    # glob patterns, e.g. image/*
+    include_mime_types: Tuple[str, ...] = ()
+    exclude_mime_types: Tuple[str, ...] = ()
+    # regular expressions searched in the absolute asset url
+    include_urls: Tuple[str, ...] = ()
+    exclude_urls: Tuple[str, ...] = ()
+    # bytes
+    max_size: Optional[int] = None
+
+    def accepts_tag(self, tag: Tag) -> bool:
+        if not is_allowed([tag.name], self.include_tags, self.exclude_tags):
+            return False
+        rels = get_rels(tag)
+        return not rels or is_allowed(rels, self.include_rels, self.exclude_rels)
+
+    def accepts_url(self, url: str) -> bool:
+        include_pattern = compile_patterns(self.include_urls)
+        if include_pattern is not None and not include_pattern.search(url):
+            return False
+        exclude_pattern = compile_patterns(self.exclude_urls)
+        return exclude_pattern is None or not exclude_pattern.search(url)
+
+    def accepts_mime_type(self, mime_type: Optional[str]) -> bool:
+        # nothing to judge by
+        if mime_type is None:
+            return True
+        mime_type = mime_type.lower()
+        if self.include_mime_types and not any(
+            fnmatchcase(mime_type, pattern) for pattern in self.include_mime_types
+        ):
+            return False
+        return not any(
+            fnmatchcase(mime_type, pattern) for pattern in self.exclude_mime_types
+        )
+
+    def accepts_size(self, size: int) -> bool:
+        return self.max_size is None or size <= self.max_size
+
+
+def is_allowed(
+    values: Iterable[str], include: FrozenSet[str], exclude: FrozenSet[str]
+) -> bool:
+    values = {value.lower() for value in values}
+    if include and not values & include:
+        return False
+    return not values & exclude
+
+
+def get_rels(tag: Tag) -> List[str]:
+    # html.parser splits rel into list, manually created tags keep strings
+    rel = tag.attrs.get("rel") or []
+    if isinstance(rel, str):
+        return rel.split()
+    return list(rel)
+
+
+@lru_cache(maxsize=None)
+def compile_patterns(patterns: Tuple[str, ...]) -> Optional[Pattern]:
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+def get_mime_type(content_type: Optional[str], url: str) -> Optional[str]:
+    """
+    Returns mime type from Content-Type header value,
+    guesses it by url if header is missing
+
+    :param content_type: Content-Type header value
+    :type content_type: Optional[str]
+    :param url: response url
+    :type url: str
+    :return: mime type (e.g. image/png) or None if it's unknown
+    :rtype: Optional[str]
+    """
+    if content_type:
+        return content_type.split(";")[0].strip().lower() or None
+    return mimetypes.guess_type(url)[0]
+
+
+def parse_size(value: str) -> int:
+    """
+    Parses human readable size (e.g. 512, 100K, 1.5M, 2GB) into bytes
+
+    :param value: size
+    :type value: str
+    :return: size in bytes
+    :rtype: int
+    :raises ValueError: if size can't be parsed
+    """
+    match = SIZE_PATTERN.match(value)
+    if match is None:
+        raise ValueError(f"invalid size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
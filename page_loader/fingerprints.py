@@ -0,0 +1,146 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Mapping, Optional, Tuple, Union
+
+from page_loader.file_operations import (
+    generate_assets_folder_name,
+    generate_file_name_from_page_url,
+    write_file,
+)
+from page_loader.logging import get_logger
+
+logger = get_logger("page_loader.fingerprints")
+
+FINGERPRINT_SUFFIX = ".fingerprint.json"
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """
+    State of the saved page: raw page body hash, saved asset files
+    and validators for the conditional request of the page
+    """
+
+    content_hash: str
+    # asset file paths relative to the output folder
+    assets: Tuple[str, ...] = ()
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def get_conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def get_content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def get_fingerprint_path(folder: Union[str, Path], page_url: str) -> Path:
+    """
+    Returns fingerprint file path, it's stored next to the page file
+
+    :param folder: folder the page is saved into
+    :type folder: Union[str, Path]
+    :param page_url: page url
+    :type page_url: str
+    :return: fingerprint path
+    (e.g. ru-hexlet-io-courses.fingerprint.json for https://ru.hexlet.io/courses)
+    :rtype: Path
+    """
+    stem = generate_file_name_from_page_url(page_url).split(".")[0]
+    return Path(folder).joinpath(stem + FINGERPRINT_SUFFIX)
+
+
+def create_fingerprint(
+    content: bytes,
+    folder: Union[str, Path],
+    page_url: str,
+    headers: Mapping[str, str],
+) -> Fingerprint:
+    """
+    Creates fingerprint of the just saved page
+
+    :param content: raw page content
+    :type content: bytes
+    :param folder: folder the page is saved into
+    :type folder: Union[str, Path]
+    :param page_url: page url
+    :type page_url: str
+    :param headers: page response headers
+    :type headers: Mapping[str, str]
+    :return: fingerprint
+    :rtype: Fingerprint
+    """
+    folder = Path(folder)
+    assets_folder = folder.joinpath(generate_assets_folder_name(page_url))
+    assets: Tuple[str, ...] = ()
+    if assets_folder.is_dir():
+        assets = tuple(
+            sorted(
+                str(path.relative_to(folder))
+                for path in assets_folder.rglob("*")
+                if path.is_file()
+            )
+        )
+    return Fingerprint(
+        content_hash=get_content_hash(content),
+        assets=assets,
+        etag=headers.get("ETag"),
+        last_modified=headers.get("Last-Modified"),
+    )
+
+
+def load_fingerprint(path: Path) -> Optional[Fingerprint]:
+    """
+    Loads fingerprint, broken fingerprint is treated as missing one
+
+    :param path: fingerprint path
+    :type path: Path
+    :return: fingerprint or None if there is no valid one
+    :rtype: Optional[Fingerprint]
+    """
+    try:
+        data = json.loads(path.read_text())
+        return Fingerprint(
+            content_hash=data["content_hash"],
+            assets=tuple(data["assets"]),
+            etag=data.get("etag"),
+            last_modified=data.get("last_modified"),
+        )
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        logger.warning(f"fingerprint {path} is ignored: {error!r}")
+        return None
+
+
+def save_fingerprint(path: Path, fingerprint: Fingerprint) -> None:
+    write_file(path, json.dumps(asdict(fingerprint), indent=2))
+
+
+def is_page_saved(
+    folder: Union[str, Path], page_url: str, fingerprint: Fingerprint
+) -> bool:
+    """
+    Checks the page file and all the fingerprint assets are still in place
+
+    :param folder: folder the page is saved into
+    :type folder: Union[str, Path]
+    :param page_url: page url
+    :type page_url: str
+    :param fingerprint: saved page fingerprint
+    :type fingerprint: Fingerprint
+    :return: True if the saved page is complete
+    :rtype: bool
+    """
+    folder = Path(folder)
+    if not folder.joinpath(generate_file_name_from_page_url(page_url)).is_file():
+        return False
+    return all(folder.joinpath(asset).is_file() for asset in fingerprint.assets)
@@ -0,0 +1,140 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Mapping, Optional, Set, Tuple, Type
+from urllib.parse import urlsplit
+
+from page_loader.logging import get_logger
+from requests.models import DEFAULT_REDIRECT_LIMIT
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 is the optional http2 extra
+    httpx = None  # type: ignore[assignment]
+
+logger = get_logger("page_loader.http2")
+
+RETRIABLE_EXCEPTIONS: Tuple[Type[Exception], ...] = (
+    (httpx.TransportError,) if httpx is not None else ()
+)
+
+_lock = threading.Lock()
+_client: Optional["httpx.Client"] = None
+# set when httpx or h2 can't be imported, HTTP/1.1 is used then
+_unavailable = False
+# origins which failed with HTTP/2 protocol errors, requested with HTTP/1.1 later
+_http1_origins: Set[str] = set()
+
+
+def get_origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_client() -> Optional["httpx.Client"]:
+    """
+    Returns the HTTP/2 client shared by all the threads of the process,
+    concurrent requests to one origin are multiplexed over one connection
+
+    :return: client or None if httpx or h2 isn't installed
+    :rtype: Optional[httpx.Client]
+    """
+    global _client, _unavailable
+    with _lock:
+        if _client is None and not _unavailable:
+            _client = create_client()
+            _unavailable = _client is None
+        return _client
+
+
+def create_client(
+    transport: Optional["httpx.BaseTransport"] = None,
+) -> Optional["httpx.Client"]:
+    try:
+        if httpx is None:
+            raise ImportError("httpx isn't installed")
+        # servers which don't negotiate h2 with ALPN are requested with HTTP/1.1,
+        # redirects are followed as many times as by the requests session
+        return httpx.Client(
+            http2=True,
+            follow_redirects=True,
+            max_redirects=DEFAULT_REDIRECT_LIMIT,
+            transport=transport,
+        )
+    except ImportError as error:
+        logger.warning(
+            f"HTTP/2 isn't available: {error}, HTTP/1.1 is used instead. "
+            "Install the http2 extra to enable it"
+        )
+        return None
+
+
+def get_http2_client(page_url: str) -> Optional["httpx.Client"]:
+    """
+    Returns the HTTP/2 client for the url, HTTP/2 is negotiated over TLS only,
+    so plain http urls and origins which failed with HTTP/2 are left
+    to HTTP/1.1
+
+    :param page_url: url to request
+    :type page_url: str
+    :return: client or None if HTTP/1.1 should be used
+    :rtype: Optional[httpx.Client]
+    """
+    if urlsplit(page_url).scheme != "https":
+        return None
+    if get_origin(page_url) in _http1_origins:
+        return None
+    return get_client()
+
+
+@contextmanager
+def stream_http2(
+    client: "httpx.Client",
+    page_url: str,
+    timeout: Tuple[float, float],
+    headers: Optional[Mapping[str, str]] = None,
+) -> Iterator["httpx.Response"]:
+    """
+    Makes streamed get request with the HTTP/2 client, the origin is
+    requested with HTTP/1.1 after the protocol error, e.g. broken h2 server
+
+    :param client: client, see get_http2_client
+    :type client: httpx.Client
+    :param page_url: url to request
+    :type page_url: str
+    :param timeout: connect and read timeouts
+    :type timeout: Tuple[float, float]
+    :param headers: extra request headers
+    :type headers: Optional[Mapping[str, str]]
+    :return: streamed response
+    :rtype: Iterator[httpx.Response]
+    """
+    connect_timeout, read_timeout = timeout
+    try:
+        with client.stream(
+            "GET",
+            page_url,
+            headers=headers,
+            timeout=httpx.Timeout(
+                read_timeout, connect=connect_timeout, pool=connect_timeout
+            ),
+        ) as response:
+            yield response
+    except httpx.ProtocolError:
+        origin = get_origin(page_url)
+        logger.warning(f"HTTP/2 request to {origin} failed, falling back to HTTP/1.1")
+        with _lock:
+            _http1_origins.add(origin)
+        raise
+
+
+def close_client() -> None:
+    """
+    Closes the shared client and forgets the origins fallen back to HTTP/1.1
+    """
+    global _client, _unavailable
+    with _lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _unavailable = False
+        _http1_origins.clear()
@@ -0,0 +1,45 @@
+from base64 import b64encode
+from typing import Optional, Union
+
+from page_loader.context import DownloadContext
+
+
+def make_data_uri(content: Union[bytes, str], mime_type: str) -> str:
+    """
+    Makes base64 data: uri, e.g. data:image/png;base64,iVBORw0...
+
+    :param content: asset content
+    :type content: Union[bytes, str]
+    :param mime_type: asset mime type
+    :type mime_type: str
+    :return: data: uri
+    :rtype: str
+    """
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return f"data:{mime_type};base64,{b64encode(content).decode('ascii')}"
+
+
+def get_data_uri(
+    url: str, content: Union[bytes, str], context: DownloadContext
+) -> Optional[str]:
+    """
+    Returns data: uri to embed the asset into the page (or stylesheet) with,
+    if it's smaller than inline_under option and its mime type is known
+
+    :param url: asset url
+    :type url: str
+    :param content: asset content
+    :type content: Union[bytes, str]
+    :param context: download state with asset mime types
+    :type context: DownloadContext
+    :return: data: uri or None if the asset should be saved into the file
+    :rtype: Optional[str]
+    """
+    inline_under = context.options.inline_under
+    if inline_under is None or len(content) >= inline_under:
+        return None
+    mime_type = context.mime_types.get(url)
+    if mime_type is None:
+        return None
+    return make_data_uri(content, mime_type)
@@ -1,15 +1,116 @@
+import atexit
+import json
 import logging
+import queue
+import sys
+import threading
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional, TextIO
 
+PACKAGE_LOGGER_NAME = "page_loader"
+DEFAULT_LEVEL = "ERROR"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# passed with extra=..., e.g. logger.info("...", extra={"asset_url": url})
+STRUCTURED_FIELDS = ("page_url", "asset_url", "bytes", "duration")
 
-def get_logger(module_name: str, level=logging.ERROR) -> logging.Logger:
-    logger = logging.getLogger(module_name)
-    logger.handlers.clear()
-    logger.setLevel(level)
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+@dataclass(frozen=True)
+class LoggingSettings:
+    level: str = DEFAULT_LEVEL
+    # one JSON object per line instead of the text lines
+    json: bool = False
+
+
+class JsonFormatter(logging.Formatter):
+    # QueueHandler has already merged exception text into the message
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field_name in STRUCTURED_FIELDS:
+            value = getattr(record, field_name, None)
+            if value is not None:
+                entry[field_name] = value
+        return json.dumps(entry)
+
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+def configure_logging(
+    settings: Optional[LoggingSettings] = None, stream: Optional[TextIO] = None
+) -> QueueListener:
+    """
+    Sets up page_loader logging for the command line: records are put into
+    the queue by the logging threads and written by the background listener
+    thread, so workers never wait for stderr. Replaces the previous setup
+    Records still propagate to the root logger, so the handlers
+    of the application see them too
+
+    :param settings: level and format, defaults are used if not provided
+    :type settings: Optional[LoggingSettings]
+    :param stream: stream to write records into, stderr by default
+    :type stream: Optional[TextIO]
+    :return: started listener
+    :rtype: QueueListener
+    """
+    global _listener
+    settings = settings or LoggingSettings()
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(
+        JsonFormatter() if settings.json else logging.Formatter(TEXT_FORMAT)
     )
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = QueueListener(records, handler)
+    package_logger = logging.getLogger(PACKAGE_LOGGER_NAME)
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        package_logger.handlers.clear()
+        package_logger.addHandler(QueueHandler(records))
+        package_logger.setLevel(settings.level.upper())
+        listener.start()
+        _listener = listener
+    return listener
+
+
+def stop_logging() -> None:
+    """
+    Writes queued records, stops the listener thread and removes
+    the setup of configure_logging
+    """
+    global _listener
+    package_logger = logging.getLogger(PACKAGE_LOGGER_NAME)
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+            package_logger.handlers.clear()
+            package_logger.setLevel(logging.NOTSET)
+
 
+def get_logger(module_name: str, level: Optional[int] = None) -> logging.Logger:
+    """
+    Returns module logger, its records are handled by the page_loader logger
+    if configure_logging is called, and by the root logger handlers anyway
+
+    :param module_name: logger name, e.g. page_loader.core
+    :type module_name: str
+    :param level: logger own level, page_loader level is used if not provided
+    :type level: Optional[int]
+    :return: logger
+    :rtype: logging.Logger
+    """
+    logger = logging.getLogger(module_name)
+    if level is not None:
+        logger.setLevel(level)
     return logger
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from page_loader.file_operations import DURABILITY_NONE
+from page_loader.filters import AssetFilter
+from page_loader.priorities import AssetPriority, get_default_priority
+from page_loader.processes import DEFAULT_PROCESSES
+from page_loader.srcset import SRCSET_ALL
+
+DEFAULT_ASSET_WORKERS = 1
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 10.0
+
+
+@dataclass(frozen=True)
+class DownloadOptions:
+    # number of assets of one page downloaded concurrently,
+    # per host limits are applied by page_loader.scheduling on top of it
+    asset_workers: int = DEFAULT_ASSET_WORKERS
+    # seconds, read timeout is the max pause between two received chunks
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT
+    read_timeout: float = DEFAULT_READ_TIMEOUT
+    # extra attempts for connection errors, timeouts and 429/5xx responses
+    retries: int = DEFAULT_RETRIES
+    backoff_base: float = DEFAULT_BACKOFF_BASE
+    backoff_max: float = DEFAULT_BACKOFF_MAX
+    # seconds for the whole page with assets, assets which don't fit are skipped
+    page_deadline: Optional[float] = None
+    # failed assets keep their original urls instead of failing the whole page
+    best_effort: bool = False
+    asset_filter: AssetFilter = AssetFilter()
+    # download fonts, images and imported stylesheets referenced from stylesheets
+    process_css: bool = True
+    # which srcset candidates to download: all, largest or smallest
+    srcset_policy: str = SRCSET_ALL
+    # fsync of the saved files: none, page (once for all the page files) or file
+    durability: str = DURABILITY_NONE
+    # worker processes for page parsing, rewriting and serialization,
+    # 0 keeps it in the downloading thread
+    processes: int = DEFAULT_PROCESSES
+    # request the page with validators of the saved page fingerprint and
+    # skip parsing and assets if it's unchanged
+    skip_unchanged: bool = False
+    # bytes, smaller assets are embedded into the page as data: uris
+    inline_under: Optional[int] = None
+    # assets download order, see page_loader.priorities
+    asset_priority: AssetPriority = get_default_priority
+    # request https pages and assets with HTTP/2 (the http2 extra),
+    # assets of one origin share one connection, see page_loader.http2
+    http2: bool = False
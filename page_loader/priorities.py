@@ -0,0 +1,115 @@
+import importlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, FrozenSet, Optional
+from urllib.parse import urlsplit
+
+from page_loader.filters import get_mime_type
+
+# lower priorities are downloaded first
+PRIORITY_CRITICAL = 0
+PRIORITY_OTHER = 1
+PRIORITY_IMAGE = 2
+PRIORITY_LARGE = 3
+PRIORITY_MEDIA = 4
+# bytes, known larger assets are downloaded after the other images
+LARGE_ASSET_SIZE = 256 * 1024
+ASSET_SIZES_CACHE_SIZE = 10000
+
+CRITICAL_TAGS = frozenset({"script"})
+CRITICAL_RELS = frozenset({"stylesheet", "preload", "modulepreload"})
+IMAGE_TAGS = frozenset({"img", "input"})
+MEDIA_TAGS = frozenset({"video", "audio", "source", "track", "embed", "object"})
+
+
+@dataclass(frozen=True)
+class AssetInfo:
+    url: str
+    # tag name, e.g. img
+    tag: str
+    rels: FrozenSet[str] = frozenset()
+    # bytes, known if the asset was downloaded before
+    size: Optional[int] = None
+
+
+# returns priority of the asset, lower ones are downloaded first
+AssetPriority = Callable[[AssetInfo], float]
+
+
+class AssetSizes:
+    """
+    Sizes of the downloaded assets by their urls, shared by the pages of
+    the process, so common assets (site stylesheets, logos) are known
+    before they're requested again
+    """
+
+    def __init__(self, max_size: int = ASSET_SIZES_CACHE_SIZE):
+        self.max_size = max_size
+        self._sizes: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[int]:
+        with self._lock:
+            return self._sizes.get(url)
+
+    def record(self, url: str, size: int) -> None:
+        with self._lock:
+            self._sizes[url] = size
+            self._sizes.move_to_end(url)
+            if len(self._sizes) > self.max_size:
+                self._sizes.popitem(last=False)
+
+
+asset_sizes = AssetSizes()
+
+
+def get_default_priority(asset: AssetInfo) -> float:
+    """
+    Stylesheets and scripts first, then other links (icons, manifests),
+    then images, known large images, and audio/video last.
+    Assets of one priority are downloaded from the smallest known one
+
+    :param asset: asset description
+    :type asset: AssetInfo
+    :return: priority, lower ones are downloaded first
+    :rtype: float
+    """
+    priority = get_category_priority(asset)
+    if priority == PRIORITY_IMAGE and (asset.size or 0) >= LARGE_ASSET_SIZE:
+        priority = PRIORITY_LARGE
+    # unknown size goes after the known ones of the same priority
+    size = asset.size if asset.size is not None else LARGE_ASSET_SIZE
+    return priority + min(size, LARGE_ASSET_SIZE) / LARGE_ASSET_SIZE / 2
+
+
+def get_category_priority(asset: AssetInfo) -> int:
+    if asset.tag in CRITICAL_TAGS or asset.rels & CRITICAL_RELS:
+        return PRIORITY_CRITICAL
+    mime_type = get_mime_type(None, urlsplit(asset.url).path) or ""
+    if asset.tag in MEDIA_TAGS or mime_type.startswith(("video/", "audio/")):
+        return PRIORITY_MEDIA
+    if mime_type in ("text/css", "text/javascript", "application/javascript"):
+        return PRIORITY_CRITICAL
+    if asset.tag in IMAGE_TAGS or mime_type.startswith("image/"):
+        return PRIORITY_IMAGE
+    return PRIORITY_OTHER
+
+
+def load_priority(path: str) -> AssetPriority:
+    """
+    Imports the priority function, e.g. mypackage.priorities:get_priority
+
+    :param path: module and function name separated by colon
+    :type path: str
+    :return: priority function
+    :rtype: AssetPriority
+    :raises ValueError: if the function can't be imported
+    """
+    module_name, __, function_name = path.partition(":")
+    if not module_name or not function_name:
+        raise ValueError(f"{path!r} isn't a module:function path")
+    try:
+        return getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError) as error:
+        raise ValueError(f"{path!r} can't be imported: {error}") from error
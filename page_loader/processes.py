@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from page_loader.logging import get_logger
+from page_loader.scheduling import DeadlineExceeded
+
+logger = get_logger("page_loader.processes")
+
+DEFAULT_PROCESSES = 0
+# fork of the process with running threads (logging, writers, workers)
+# could copy held locks, spawned workers start clean
+START_METHOD = "spawn"
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_processes = 0
+_lock = threading.Lock()
+
+
+def get_process_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Returns the process wide pool for page parsing and rendering,
+    it's shared by all the downloads, so a batch of pages keeps all the
+    processes busy. Pool is recreated if the number of processes is changed
+
+    :param processes: number of worker processes
+    :type processes: int
+    :return: process pool
+    :rtype: ProcessPoolExecutor
+    """
+    global _pool, _pool_processes
+    with _lock:
+        if _pool is None or _pool_processes != processes:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context(START_METHOD),
+            )
+            _pool_processes = processes
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool, _pool_processes
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+        _pool_processes = 0
+
+
+def wait_for_task(future: Future, deadline: Optional[float] = None) -> Any:
+    """
+    Waits for the result of the pool task, the task which hasn't started
+    by the deadline is cancelled
+
+    :param future: future of the task
+    :type future: Future
+    :param deadline: time.monotonic based time to give up at
+    :type deadline: Optional[float]
+    :return: task result
+    :rtype: Any
+    :raises DeadlineExceeded: if the task isn't done before the deadline,
+        the exception of the failed task is raised as is
+    """
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    try:
+        return future.result(timeout)
+    except futures.TimeoutError:
+        future.cancel()
+        error_message = "page deadline is reached while waiting for the process pool"
+        logger.error(error_message)
+        raise DeadlineExceeded(error_message)
+
+
+@contextmanager
+def temporary_file(suffix: str = ".html") -> Iterator[str]:
+    """
+    Creates the empty temporary file to pass between the process and its
+    pool task by path. The file is removed on exit
+
+    :param suffix: file suffix
+    :type suffix: str
+    :return: temporary file path
+    :rtype: Iterator[str]
+    """
+    descriptor, path = tempfile.mkstemp(prefix="page-loader-", suffix=suffix)
+    os.close(descriptor)
+    try:
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            logger.warning(f"temporary file {path} wasn't removed")
+
+
+@contextmanager
+def stored_content(content: bytes, suffix: str = ".html") -> Iterator[str]:
+    """
+    Stores content into the temporary file, workers read it by path
+    instead of receiving pickled bytes. The file is removed on exit
+
+    :param content: content to store
+    :type content: bytes
+    :param suffix: file suffix
+    :type suffix: str
+    :return: temporary file path
+    :rtype: Iterator[str]
+    """
+    with temporary_file(suffix) as path:
+        with open(path, "wb") as file:
+            file.write(content)
+        yield path
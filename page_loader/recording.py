@@ -0,0 +1,232 @@
+import hashlib
+import json
+import mmap
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+from page_loader.logging import get_logger
+from requests.structures import CaseInsensitiveDict
+
+logger = get_logger("page_loader.recording")
+
+INDEX_FILE = "index.jsonl"
+BODIES_FILE = "bodies.bin"
+
+
+class NotRecorded(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class RecordingSettings:
+    # folder to record every response into
+    record: Optional[Path] = None
+    # folder to serve the responses from instead of the network
+    replay: Optional[Path] = None
+    # replayed response delay: recorded latency multiplied by the scale
+    # plus the synthetic latency in seconds, zero replays at full speed
+    latency_scale: float = 0.0
+    latency: float = 0.0
+
+
+@dataclass(frozen=True)
+class RecordedResponse:
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    encoding: Optional[str]
+    # seconds from the request to the whole content
+    latency: float = 0.0
+    # message of the asset filter rejection, the content isn't recorded then
+    rejected: Optional[str] = None
+
+
+def get_request_key(url: str, headers: Optional[Mapping[str, str]]) -> str:
+    # conditional requests of the same url are different responses
+    if not headers:
+        return url
+    fields = sorted((name.lower(), value) for name, value in headers.items())
+    return json.dumps([url, fields])
+
+
+def read_index(folder: Path) -> Iterator[dict]:
+    index_path = folder.joinpath(INDEX_FILE)
+    if not index_path.exists():
+        return
+    with open(index_path, encoding="utf-8") as index:
+        for line in index:
+            if line.strip():
+                yield json.loads(line)
+
+
+class Recorder:
+    """
+    Appends responses to the corpus folder: bodies are concatenated into
+    one file and identical bodies are stored once, the index has a json line
+    per response with its headers and the body offset. Recording into
+    the existing corpus adds to it, the latest response of the request wins
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # body hash: offset and size
+        self._bodies_offsets: Dict[str, Tuple[int, int]] = {
+            entry["sha256"]: (entry["offset"], entry["size"])
+            for entry in read_index(self.folder)
+        }
+        self._bodies = open(self.folder.joinpath(BODIES_FILE), "ab")
+        self._index = open(self.folder.joinpath(INDEX_FILE), "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        url: str,
+        headers: Optional[Mapping[str, str]],
+        response: RecordedResponse,
+    ) -> None:
+        """
+        Records the response of the request
+
+        :param url: requested url
+        :type url: str
+        :param headers: extra request headers, e.g. If-None-Match
+        :type headers: Optional[Mapping[str, str]]
+        :param response: response to record
+        :type response: RecordedResponse
+        """
+        with self._lock:
+            content_hash, offset = self._write_body(response.content)
+            entry = {
+                "key": get_request_key(url, headers),
+                "url": url,
+                "status_code": response.status_code,
+                "headers": dict(response.headers),
+                "encoding": response.encoding,
+                "sha256": content_hash,
+                "offset": offset,
+                "size": len(response.content),
+                "latency": round(response.latency, 6),
+                "rejected": response.rejected,
+            }
+            # the body is flushed first, so indexed bodies are always complete
+            self._index.write(f"{json.dumps(entry)}\n")
+            self._index.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._bodies.close()
+            self._index.close()
+
+    def _write_body(self, content: bytes) -> Tuple[str, int]:
+        content_hash = hashlib.sha256(content).hexdigest()
+        if content_hash not in self._bodies_offsets:
+            offset = self._bodies.tell()
+            self._bodies.write(content)
+            self._bodies.flush()
+            self._bodies_offsets[content_hash] = (offset, len(content))
+        return content_hash, self._bodies_offsets[content_hash][0]
+
+
+class Replayer:
+    """
+    Serves recorded responses of the corpus folder: the index is loaded
+    into memory, so every lookup is one dict access and one slice
+    of the memory mapped bodies file
+    """
+
+    def __init__(self, folder: Path, latency_scale: float = 0.0, latency: float = 0.0):
+        self.folder = Path(folder)
+        self.latency_scale = latency_scale
+        self.latency = latency
+        if not self.folder.joinpath(INDEX_FILE).exists():
+            error_message = f"{self.folder} isn't a recorded corpus"
+            logger.error(error_message)
+            raise RuntimeError(error_message)
+        self._entries = {entry["key"]: entry for entry in read_index(self.folder)}
+        self._bodies = open(self.folder.joinpath(BODIES_FILE), "rb")
+        self._map: Optional[mmap.mmap] = None
+        if self.folder.joinpath(BODIES_FILE).stat().st_size:
+            self._map = mmap.mmap(self._bodies.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str, headers: Optional[Mapping[str, str]]) -> RecordedResponse:
+        """
+        Returns the recorded response of the request after the replay latency
+
+        :param url: requested url
+        :type url: str
+        :param headers: extra request headers, e.g. If-None-Match
+        :type headers: Optional[Mapping[str, str]]
+        :return: recorded response
+        :rtype: RecordedResponse
+        :raises NotRecorded: if the request isn't recorded
+        """
+        entry = self._entries.get(get_request_key(url, headers))
+        if entry is None:
+            raise NotRecorded(f"{url} isn't recorded in {self.folder}")
+        delay = entry["latency"] * self.latency_scale + self.latency
+        if delay > 0:
+            time.sleep(delay)
+        return RecordedResponse(
+            status_code=entry["status_code"],
+            headers=CaseInsensitiveDict(entry["headers"]),
+            content=self._read_body(entry["offset"], entry["size"]),
+            encoding=entry["encoding"],
+            latency=entry["latency"],
+            rejected=entry["rejected"],
+        )
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._bodies.close()
+
+    def _read_body(self, offset: int, size: int) -> bytes:
+        if self._map is None:
+            return b""
+        return self._map[offset : offset + size]
+
+
+_lock = threading.Lock()
+_recorder: Optional[Recorder] = None
+_replayer: Optional[Replayer] = None
+
+
+def configure_recording(settings: RecordingSettings) -> None:
+    """
+    Replaces the process wide recorder and replayer, requests of
+    page_loader.comm are recorded or replayed until it's called again
+    with the default settings
+
+    :param settings: recording settings
+    :type settings: RecordingSettings
+    :raises ValueError: if both record and replay folders are set
+    """
+    global _recorder, _replayer
+    if settings.record is not None and settings.replay is not None:
+        raise ValueError("responses can't be recorded and replayed at once")
+    with _lock:
+        if _recorder is not None:
+            _recorder.close()
+        if _replayer is not None:
+            _replayer.close()
+        _recorder = Recorder(settings.record) if settings.record else None
+        _replayer = None
+        if settings.replay is not None:
+            _replayer = Replayer(
+                settings.replay, settings.latency_scale, settings.latency
+            )
+
+
+def get_recorder() -> Optional[Recorder]:
+    return _recorder
+
+
+def get_replayer() -> Optional[Replayer]:
+    return _replayer
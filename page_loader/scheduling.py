@@ -0,0 +1,337 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import Dict, Iterator, Mapping, Optional
+from urllib.parse import urlsplit
+
+from page_loader.logging import get_logger
+
+logger = get_logger("page_loader.scheduling")
+
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 20
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_INITIAL_CONCURRENCY = 4
+# response slower than factor * smoothed latency is treated as congestion
+DEFAULT_LATENCY_SPIKE_FACTOR = 3.0
+# Retry-After values above this are capped, a broken header shouldn't stall us
+MAX_RETRY_AFTER_SECONDS = 300.0
+THROTTLING_STATUS_CODES = frozenset(
+    {HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE}
+)
+LATENCY_SMOOTHING = 0.2
+DECREASE_FACTOR = 0.5
+# waiting for a free slot is woken up by release, the timeout is a safety net
+CONCURRENCY_WAIT_SECONDS = 1.0
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+    rate: Optional[float] = DEFAULT_RATE
+    burst: int = DEFAULT_BURST
+    min_concurrency: int = DEFAULT_MIN_CONCURRENCY
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+    initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY
+    latency_spike_factor: float = DEFAULT_LATENCY_SPIKE_FACTOR
+
+
+@dataclass(frozen=True)
+class HostStats:
+    host: str
+    requests: int
+    successes: int
+    throttled: int
+    errors: int
+    in_flight: int
+    concurrency_limit: float
+    smoothed_latency: Optional[float]
+    blocked_until: Optional[float]
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def parse_retry_after(value: Optional[str], now: float) -> Optional[float]:
+    """
+    Parses Retry-After header value (seconds or HTTP date)
+
+    :param value: header value
+    :type value: Optional[str]
+    :param now: current unix time
+    :type now: float
+    :return: delay in seconds or None if header is missing or broken
+    :rtype: Optional[float]
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        delay = float(value)
+    else:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - now
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, min(delay, MAX_RETRY_AFTER_SECONDS))
+
+
+class HostLimiter:
+    """
+    Limits requests to one host with a token bucket (requests per second)
+    and AIMD adaptive concurrency: the concurrency limit grows additively
+    on successful responses and is cut multiplicatively on throttling
+    responses (429/503), errors and latency spikes
+    """
+
+    def __init__(self, host: str, settings: SchedulerSettings):
+        self.host = host
+        self.settings = settings
+        self._condition = threading.Condition()
+        self._tokens = float(settings.burst)
+        self._refilled_at = time.monotonic()
+        self._limit = float(settings.initial_concurrency)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._latency: Optional[float] = None
+        self._requests = 0
+        self._successes = 0
+        self._throttled = 0
+        self._errors = 0
+
+    def acquire(self, deadline: Optional[float] = None) -> None:
+        """
+        Blocks until the request to the host is allowed
+
+        :param deadline: time.monotonic based time to give up at
+        :type deadline: Optional[float]
+        :raises DeadlineExceeded: if the request isn't allowed before the deadline,
+            it's raised at once when the known delay (e.g. Retry-After) ends
+            after the deadline
+        """
+        with self._condition:
+            while True:
+                delay = self._get_delay()
+                if delay <= 0:
+                    break
+                self._condition.wait(get_wait_time(self.host, delay, deadline))
+            self._in_flight += 1
+            self._requests += 1
+            if self.settings.rate is not None:
+                self._tokens -= 1
+
+    def release(
+        self,
+        status_code: Optional[int],
+        latency: float,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """
+        Releases the request slot and adapts the concurrency limit
+
+        :param status_code: response status code, None if request failed
+        :type status_code: Optional[int]
+        :param latency: request latency in seconds
+        :type latency: float
+        :param headers: response headers
+        :type headers: Optional[Mapping[str, str]]
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if status_code in THROTTLING_STATUS_CODES:
+                self._throttled += 1
+                self._decrease()
+                retry_after = parse_retry_after(
+                    (headers or {}).get("Retry-After"), time.time()
+                )
+                if retry_after:
+                    self._blocked_until = max(
+                        self._blocked_until, time.monotonic() + retry_after
+                    )
+                    logger.warning(
+                        f"{self.host} asked to retry after {retry_after:.1f}s"
+                    )
+            elif status_code is None:
+                self._errors += 1
+                self._decrease()
+            elif self._is_latency_spike(latency):
+                self._successes += 1
+                self._decrease()
+            else:
+                self._successes += 1
+                self._increase()
+            if status_code is not None:
+                self._update_latency(latency)
+            self._condition.notify_all()
+
+    def stats(self) -> HostStats:
+        with self._condition:
+            now = time.monotonic()
+            return HostStats(
+                host=self.host,
+                requests=self._requests,
+                successes=self._successes,
+                throttled=self._throttled,
+                errors=self._errors,
+                in_flight=self._in_flight,
+                concurrency_limit=round(self._limit, 2),
+                smoothed_latency=self._latency,
+                blocked_until=(
+                    time.time() + self._blocked_until - now
+                    if self._blocked_until > now
+                    else None
+                ),
+            )
+
+    def _get_delay(self) -> float:
+        now = time.monotonic()
+        if self._blocked_until > now:
+            return self._blocked_until - now
+        if self._in_flight >= int(self._limit):
+            # unknown, it ends with release of another request
+            return math.inf
+        rate = self.settings.rate
+        if rate is None:
+            return 0.0
+        self._tokens = min(
+            float(self.settings.burst), self._tokens + (now - self._refilled_at) * rate
+        )
+        self._refilled_at = now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / rate
+
+    def _increase(self) -> None:
+        # roughly +1 per "window" of limit requests
+        self._limit = min(
+            float(self.settings.max_concurrency), self._limit + 1 / self._limit
+        )
+
+    def _decrease(self) -> None:
+        self._limit = max(
+            float(self.settings.min_concurrency), self._limit * DECREASE_FACTOR
+        )
+
+    def _is_latency_spike(self, latency: float) -> bool:
+        return (
+            self._latency is not None
+            and latency > self._latency * self.settings.latency_spike_factor
+        )
+
+    def _update_latency(self, latency: float) -> None:
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += LATENCY_SMOOTHING * (latency - self._latency)
+
+
+def get_wait_time(host: str, delay: float, deadline: Optional[float]) -> float:
+    """
+    Returns how long to wait for the delay, cut by the deadline
+
+    :raises DeadlineExceeded: if the deadline is reached or the delay ends after it
+    """
+    wait_time = CONCURRENCY_WAIT_SECONDS if delay == math.inf else delay
+    if deadline is None:
+        return wait_time
+    time_left = deadline - time.monotonic()
+    if time_left <= 0 or (delay != math.inf and delay > time_left):
+        raise DeadlineExceeded(f"page deadline is reached while waiting for {host}")
+    return min(wait_time, time_left)
+
+
+class RequestSlot:
+    def __init__(self):
+        self.status_code: Optional[int] = None
+        self.headers: Optional[Mapping[str, str]] = None
+        self.started_at = time.monotonic()
+        # seconds from the acquired slot to the response headers, the body
+        # size doesn't tell anything about the host load
+        self.latency: Optional[float] = None
+
+    def record(self, status_code: int, headers: Mapping[str, str]) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.latency = time.monotonic() - self.started_at
+
+
+class HostScheduler:
+    """
+    Keeps one HostLimiter per host, it's shared by all downloads of the process
+    """
+
+    def __init__(self, settings: Optional[SchedulerSettings] = None):
+        self.settings = settings or SchedulerSettings()
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get_limiter(self, url: str) -> HostLimiter:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostLimiter(host, self.settings)
+                self._limiters[host] = limiter
+            return limiter
+
+    @contextmanager
+    def slot(self, url: str, deadline: Optional[float] = None) -> Iterator[RequestSlot]:
+        """
+        Waits for the request slot for url host, the response status
+        should be recorded into the yielded slot as soon as the headers arrive,
+        the time to the headers is the request latency of the host limiter
+
+        :param url: request url
+        :type url: str
+        :param deadline: time.monotonic based time to give up waiting at
+        :type deadline: Optional[float]
+        :raises DeadlineExceeded: if the slot isn't free before the deadline
+        """
+        limiter = self.get_limiter(url)
+        limiter.acquire(deadline)
+        slot = RequestSlot()
+        try:
+            yield slot
+        finally:
+            latency = slot.latency
+            if latency is None:
+                latency = time.monotonic() - slot.started_at
+            limiter.release(slot.status_code, latency, slot.headers)
+
+    def stats(self) -> Dict[str, HostStats]:
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.host: limiter.stats() for limiter in limiters}
+
+
+_scheduler = HostScheduler()
+
+
+def get_scheduler() -> HostScheduler:
+    return _scheduler
+
+
+def configure_scheduler(settings: SchedulerSettings) -> HostScheduler:
+    """
+    Replaces the process wide scheduler, collected host stats are dropped
+
+    :param settings: scheduler settings
+    :type settings: SchedulerSettings
+    :return: new scheduler
+    :rtype: HostScheduler
+    """
+    global _scheduler
+    _scheduler = HostScheduler(settings)
+    return _scheduler
+
+
+def get_host_stats() -> Dict[str, HostStats]:
+    return _scheduler.stats()
@@ -1,23 +1,430 @@
 import argparse
 import os
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from datetime import datetime
 from os import getcwd
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from page_loader.core import download
+from page_loader.batch import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_LEASE_SECONDS,
+    BatchQueue,
+    run_worker,
+)
+from page_loader.context import DownloadReport
+from page_loader.core import download_with_report, localize_page_file
+from page_loader.display import ProgressDisplay, format_size
+from page_loader.events import EventSink
+from page_loader.file_operations import DURABILITY_MODES, DURABILITY_NONE
+from page_loader.filters import AssetFilter, parse_size
+from page_loader.logging import (
+    DEFAULT_LEVEL,
+    LEVELS,
+    LoggingSettings,
+    configure_logging,
+)
+from page_loader.options import (
+    DEFAULT_ASSET_WORKERS,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    DownloadOptions,
+)
+from page_loader.priorities import get_default_priority, load_priority
+from page_loader.processes import DEFAULT_PROCESSES
+from page_loader.recording import RecordingSettings, configure_recording
+from page_loader.scheduling import (
+    DEFAULT_INITIAL_CONCURRENCY,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_RATE,
+    SchedulerSettings,
+    configure_scheduler,
+)
+from page_loader.server import (
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    DEFAULT_QUEUE_SIZE,
+    DEFAULT_WORKERS,
+    serve,
+)
+from page_loader.sitemaps import ingest_sitemap, parse_lastmod
+from page_loader.snapshots import SnapshotStore, save_snapshot
+from page_loader.srcset import SRCSET_ALL, SRCSET_POLICIES
+
+SERVE_COMMAND = "serve"
+BATCH_COMMAND = "batch"
+BATCH_ADD = "add"
+BATCH_WORK = "work"
+BATCH_STATUS = "status"
+BATCH_INGEST = "ingest"
+SNAPSHOT_COMMAND = "snapshot"
+SNAPSHOT_SAVE = "save"
+SNAPSHOT_LIST = "list"
+SNAPSHOT_MATERIALIZE = "materialize"
+SNAPSHOT_PRUNE = "prune"
+RECORDED_LATENCY = "recorded"
 
 
 @dataclass(frozen=True)
 class PageLoaderConfig:
     page_url: str
     output: Path
+    # already saved page, only its assets are downloaded
+    from_file: Optional[Path] = None
+    options: DownloadOptions = DownloadOptions()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    logging: LoggingSettings = LoggingSettings()
+    recording: RecordingSettings = RecordingSettings()
+
+
+@dataclass(frozen=True)
+class ServeConfig:
+    output: Path
+    host: str
+    port: int
+    workers: int
+    queue_size: int
+    options: DownloadOptions = DownloadOptions()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    logging: LoggingSettings = LoggingSettings()
+
+
+@dataclass(frozen=True)
+class BatchConfig:
+    command: str
+    queue: Path
+    urls: Tuple[str, ...] = ()
+    output: Path = Path()
+    worker: Optional[str] = None
+    lease: float = DEFAULT_LEASE_SECONDS
+    # work: leased pages downloaded at once
+    concurrency: int = DEFAULT_CONCURRENCY
+    # ingest: sitemap entries not modified since are skipped
+    since: Optional[datetime] = None
+    options: DownloadOptions = DownloadOptions()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    logging: LoggingSettings = LoggingSettings()
+
+
+@dataclass(frozen=True)
+class SnapshotConfig:
+    command: str
+    root: Path
+    urls: Tuple[str, ...] = ()
+    version: Optional[int] = None
+    output: Path = Path()
+    keep: int = 0
+    options: DownloadOptions = DownloadOptions()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    logging: LoggingSettings = LoggingSettings()
+
+
+def add_logging_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--log-level",
+        type=str.upper,
+        choices=LEVELS,
+        help=f"Log records level (default {DEFAULT_LEVEL})",
+        default=DEFAULT_LEVEL,
+    )
+    parser.add_argument(
+        "--log-json",
+        action="store_true",
+        help="Write log records as JSON lines with page/asset url, bytes and duration",
+    )
+
+
+def get_logging_settings(parsed_args: argparse.Namespace) -> LoggingSettings:
+    return LoggingSettings(level=parsed_args.log_level, json=parsed_args.log_json)
+
+
+def parse_since(value: str) -> datetime:
+    since = parse_lastmod(value)
+    if since is None:
+        raise argparse.ArgumentTypeError(
+            f"invalid date {value!r}, expected e.g. 2024-01-31 or 2024-01-31T10:00Z"
+        )
+    return since
+
+
+def parse_replay_latency(value: str) -> Tuple[float, float]:
+    # latency scale and synthetic latency of page_loader.recording.Replayer
+    if value == RECORDED_LATENCY:
+        return 1.0, 0.0
+    try:
+        latency = float(value)
+    except ValueError:
+        latency = -1.0
+    if latency < 0:
+        raise argparse.ArgumentTypeError(
+            f"invalid latency {value!r}, expected {RECORDED_LATENCY} or seconds"
+        )
+    return 0.0, latency
+
+
+def add_recording_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--record",
+        type=str,
+        metavar="CORPUS",
+        help="Record every response into the CORPUS folder for --replay",
+        default=None,
+    )
+    group.add_argument(
+        "--replay",
+        type=str,
+        metavar="CORPUS",
+        help=(
+            "Serve responses recorded into the CORPUS folder instead of "
+            "the network, requests which aren't recorded fail"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=parse_replay_latency,
+        metavar="LATENCY",
+        help=(
+            f"Delay of the replayed responses: {RECORDED_LATENCY} or seconds "
+            "(default 0, full speed)"
+        ),
+        default=(0.0, 0.0),
+    )
+
+
+def get_recording_settings(parsed_args: argparse.Namespace) -> RecordingSettings:
+    latency_scale, latency = parsed_args.replay_latency
+    return RecordingSettings(
+        record=Path(parsed_args.record) if parsed_args.record else None,
+        replay=Path(parsed_args.replay) if parsed_args.replay else None,
+        latency_scale=latency_scale,
+        latency=latency,
+    )
+
+
+def add_download_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--asset-workers",
+        type=int,
+        help="Number of assets of one page downloaded concurrently",
+        default=DEFAULT_ASSET_WORKERS,
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        help=f"Seconds to wait for connection (default {DEFAULT_CONNECT_TIMEOUT})",
+        default=DEFAULT_CONNECT_TIMEOUT,
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        help=(
+            "Seconds to wait for the next chunk of the response "
+            f"(default {DEFAULT_READ_TIMEOUT})"
+        ),
+        default=DEFAULT_READ_TIMEOUT,
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        help=(
+            "Retries of connection errors, timeouts and 429/5xx responses "
+            f"(default {DEFAULT_RETRIES})"
+        ),
+        default=DEFAULT_RETRIES,
+    )
+    parser.add_argument(
+        "--page-deadline",
+        type=float,
+        help=(
+            "Seconds for the whole page with assets, assets which don't fit "
+            "are skipped and keep their original urls"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--best-effort",
+        action="store_true",
+        help=(
+            "Save the page even if some assets failed, "
+            "failed assets keep their original urls"
+        ),
+    )
+    parser.add_argument(
+        "--no-css-assets",
+        action="store_true",
+        help="Don't download fonts and images referenced from stylesheets",
+    )
+    parser.add_argument(
+        "--srcset",
+        choices=SRCSET_POLICIES,
+        default=SRCSET_ALL,
+        help="Which srcset candidates to download: all of them, "
+        "the largest or the smallest one",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        help="Worker processes for page parsing and rewriting, "
+        "0 (default) keeps it in the downloading thread",
+        default=DEFAULT_PROCESSES,
+    )
+    parser.add_argument(
+        "--durability",
+        choices=DURABILITY_MODES,
+        default=DURABILITY_NONE,
+        help="When saved files are synced to the disk: never (default), "
+        "once for the whole page or after every file",
+    )
+    parser.add_argument(
+        "--asset-priority",
+        type=load_priority,
+        metavar="MODULE:FUNCTION",
+        help=(
+            "Function ordering asset downloads, it takes "
+            "page_loader.priorities.AssetInfo and returns lower numbers for assets "
+            "to download first (default: stylesheets and scripts, other links, "
+            "images, large images, audio and video)"
+        ),
+        default=get_default_priority,
+    )
+    parser.add_argument(
+        "--inline-under",
+        type=parse_size,
+        help=(
+            "Embed assets smaller than SIZE (e.g. 1K) into the page and "
+            "stylesheets as data: uris instead of saving them into files"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help=(
+            "Keep the previously saved page if it's unchanged, checked by "
+            "a conditional request and the page fingerprint saved next to it"
+        ),
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help=(
+            "Request https pages and assets with HTTP/2 (the http2 extra), "
+            "assets of one origin share one connection, servers without "
+            "HTTP/2 are requested with HTTP/1.1"
+        ),
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        help=(
+            "Max requests per second to one host, 0 disables the limit "
+            f"(default {DEFAULT_RATE})"
+        ),
+        default=DEFAULT_RATE,
+    )
+    parser.add_argument(
+        "--max-host-concurrency",
+        type=int,
+        help=(
+            "Upper bound for the adaptive number of concurrent requests "
+            f"to one host (default {DEFAULT_MAX_CONCURRENCY})"
+        ),
+        default=DEFAULT_MAX_CONCURRENCY,
+    )
+    add_asset_filter_arguments(parser)
+
+
+def add_asset_filter_arguments(parser: argparse.ArgumentParser) -> None:
+    rules = [
+        ("tag", "asset tag name, e.g. img"),
+        ("rel", "link rel, e.g. preconnect"),
+        ("mime", "asset mime type glob, e.g. image/*"),
+        ("url", "regular expression searched in the asset url"),
+    ]
+    for rule, description in rules:
+        for action in ("include", "exclude"):
+            parser.add_argument(
+                f"--{action}-{rule}",
+                action="append",
+                default=[],
+                help=f"{action.capitalize()} assets by {description} (repeatable)",
+            )
+    parser.add_argument(
+        "--max-asset-size",
+        type=parse_size,
+        help=(
+            "Skip assets larger than SIZE (e.g. 500K, 2M), checked by "
+            "Content-Length and while downloading"
+        ),
+        default=None,
+    )
+
+
+def get_asset_filter(parsed_args: argparse.Namespace) -> AssetFilter:
+    return AssetFilter(
+        include_tags=frozenset(tag.lower() for tag in parsed_args.include_tag),
+        exclude_tags=frozenset(tag.lower() for tag in parsed_args.exclude_tag),
+        include_rels=frozenset(rel.lower() for rel in parsed_args.include_rel),
+        exclude_rels=frozenset(rel.lower() for rel in parsed_args.exclude_rel),
+        include_mime_types=tuple(parsed_args.include_mime),
+        exclude_mime_types=tuple(parsed_args.exclude_mime),
+        include_urls=tuple(parsed_args.include_url),
+        exclude_urls=tuple(parsed_args.exclude_url),
+        max_size=parsed_args.max_asset_size,
+    )
+
+
+def get_download_options(parsed_args: argparse.Namespace) -> DownloadOptions:
+    return DownloadOptions(
+        asset_workers=parsed_args.asset_workers,
+        connect_timeout=parsed_args.connect_timeout,
+        read_timeout=parsed_args.read_timeout,
+        retries=parsed_args.retries,
+        page_deadline=parsed_args.page_deadline,
+        best_effort=parsed_args.best_effort,
+        asset_filter=get_asset_filter(parsed_args),
+        process_css=not parsed_args.no_css_assets,
+        srcset_policy=parsed_args.srcset,
+        durability=parsed_args.durability,
+        processes=parsed_args.processes,
+        skip_unchanged=parsed_args.skip_unchanged,
+        inline_under=parsed_args.inline_under,
+        asset_priority=parsed_args.asset_priority,
+        http2=parsed_args.http2,
+    )
+
+
+def get_scheduler_settings(parsed_args: argparse.Namespace) -> SchedulerSettings:
+    max_concurrency = parsed_args.max_host_concurrency
+    return SchedulerSettings(
+        rate=parsed_args.rate_limit or None,
+        max_concurrency=max_concurrency,
+        initial_concurrency=min(DEFAULT_INITIAL_CONCURRENCY, max_concurrency),
+    )
 
 
 def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Page Loader")
-    parser.add_argument("page_url", type=str)
+    parser.add_argument("page_url", type=str, nargs="?")
+    parser.add_argument(
+        "--from-file",
+        type=str,
+        help=(
+            "Already saved page to process instead of fetching it, "
+            "only its assets are downloaded (requires --base-url)"
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--base-url",
+        type=str,
+        help="Url of the page saved into --from-file",
+        default=None,
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -29,6 +436,190 @@ def create_parser() -> argparse.ArgumentParser:
         ),
         default=getcwd(),
     )
+    add_download_arguments(parser)
+    add_recording_arguments(parser)
+    add_logging_arguments(parser)
+    return parser
+
+
+def create_serve_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=f"page-loader {SERVE_COMMAND}",
+        description="Page Loader HTTP/JSON service",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help=(
+            "Relative or absolute path to folder where the pages content should be "
+            "saved (it should exists and be writeable!). The default output directory "
+            "is the current working directory"
+        ),
+        default=getcwd(),
+    )
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of pages downloaded concurrently",
+        default=DEFAULT_WORKERS,
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        help="Number of pages which could wait for a free worker",
+        default=DEFAULT_QUEUE_SIZE,
+    )
+    add_download_arguments(parser)
+    add_logging_arguments(parser)
+    return parser
+
+
+def create_batch_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=f"page-loader {BATCH_COMMAND}",
+        description=(
+            "Page Loader batch over the shared SQLite queue, "
+            "any number of workers on any hosts could share one queue"
+        ),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser(BATCH_ADD, help="Add page urls to the queue")
+    add_parser.add_argument("queue", type=str, help="Queue database path")
+    add_parser.add_argument("urls", type=str, nargs="*")
+    add_parser.add_argument(
+        "--from-file",
+        type=argparse.FileType("r"),
+        help="File with page urls, one per line",
+    )
+    add_logging_arguments(add_parser)
+
+    ingest_parser = commands.add_parser(
+        BATCH_INGEST,
+        help=(
+            "Add page urls of sitemaps, sitemap indexes (gzipped too) "
+            "or url lists while they're read"
+        ),
+    )
+    ingest_parser.add_argument("queue", type=str, help="Queue database path")
+    ingest_parser.add_argument(
+        "sitemaps", type=str, nargs="+", help="Sitemap urls or file paths"
+    )
+    ingest_parser.add_argument(
+        "--since",
+        type=parse_since,
+        help=(
+            "Skip pages with older lastmod, e.g. 2024-01-31, by default "
+            "the previous ingestion of the sitemap is used"
+        ),
+        default=None,
+    )
+    add_logging_arguments(ingest_parser)
+
+    work_parser = commands.add_parser(
+        BATCH_WORK, help="Download pages from the queue until it's drained"
+    )
+    work_parser.add_argument("queue", type=str, help="Queue database path")
+    work_parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help=(
+            "Relative or absolute path to the shared folder where the pages content "
+            "should be saved (it should exists and be writeable!). The default output "
+            "directory is the current working directory"
+        ),
+        default=getcwd(),
+    )
+    work_parser.add_argument(
+        "--worker-id",
+        type=str,
+        help="Worker id, hostname and pid based one by default",
+        default=None,
+    )
+    work_parser.add_argument(
+        "--lease",
+        type=float,
+        help=(
+            "Seconds until the page of the silent (crashed) worker "
+            "is given to another worker"
+        ),
+        default=DEFAULT_LEASE_SECONDS,
+    )
+    work_parser.add_argument(
+        "--concurrency",
+        type=int,
+        help=(
+            "Number of leased pages downloaded at once by this worker "
+            f"(default {DEFAULT_CONCURRENCY})"
+        ),
+        default=DEFAULT_CONCURRENCY,
+    )
+    add_download_arguments(work_parser)
+    add_logging_arguments(work_parser)
+
+    status_parser = commands.add_parser(BATCH_STATUS, help="Print queue counters")
+    status_parser.add_argument("queue", type=str, help="Queue database path")
+    add_logging_arguments(status_parser)
+    return parser
+
+
+def create_snapshot_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=f"page-loader {SNAPSHOT_COMMAND}",
+        description=(
+            "Page Loader snapshot store: every save is a new version, "
+            "unchanged files are shared between versions"
+        ),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    save_parser = commands.add_parser(
+        SNAPSHOT_SAVE, help="Download pages as the new version"
+    )
+    save_parser.add_argument("root", type=str, help="Snapshot store folder")
+    save_parser.add_argument("urls", type=str, nargs="*")
+    save_parser.add_argument(
+        "--from-file",
+        type=argparse.FileType("r"),
+        help="File with page urls, one per line",
+    )
+    add_download_arguments(save_parser)
+    add_logging_arguments(save_parser)
+
+    list_parser = commands.add_parser(SNAPSHOT_LIST, help="Print versions")
+    list_parser.add_argument("root", type=str, help="Snapshot store folder")
+    add_logging_arguments(list_parser)
+
+    materialize_parser = commands.add_parser(
+        SNAPSHOT_MATERIALIZE, help="Write pages of the version into the folder"
+    )
+    materialize_parser.add_argument("root", type=str, help="Snapshot store folder")
+    materialize_parser.add_argument("version", type=int)
+    materialize_parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help=(
+            "Relative or absolute path to folder where the version pages should be "
+            "written (it should exists and be writeable!). The default output "
+            "directory is the current working directory"
+        ),
+        default=getcwd(),
+    )
+    add_logging_arguments(materialize_parser)
+
+    prune_parser = commands.add_parser(
+        SNAPSHOT_PRUNE, help="Remove all the versions but the latest ones"
+    )
+    prune_parser.add_argument("root", type=str, help="Snapshot store folder")
+    prune_parser.add_argument(
+        "--keep", type=int, required=True, help="Number of the latest versions to keep"
+    )
+    add_logging_arguments(prune_parser)
     return parser
 
 
@@ -36,18 +627,228 @@ def process_arguments(arguments: Optional[List] = None) -> PageLoaderConfig:
     parser = create_parser()
 
     parsed_args = parser.parse_args(arguments)
+    if parsed_args.from_file is not None and parsed_args.base_url is None:
+        parser.error("--from-file requires --base-url")
+    page_url = parsed_args.base_url or parsed_args.page_url
+    if page_url is None:
+        parser.error("page_url or --from-file with --base-url is required")
 
     return PageLoaderConfig(
-        page_url=parsed_args.page_url,
+        page_url=page_url,
+        output=Path(parsed_args.output),
+        from_file=Path(parsed_args.from_file) if parsed_args.from_file else None,
+        options=get_download_options(parsed_args),
+        scheduler=get_scheduler_settings(parsed_args),
+        logging=get_logging_settings(parsed_args),
+        recording=get_recording_settings(parsed_args),
+    )
+
+
+def process_serve_arguments(arguments: Optional[List] = None) -> ServeConfig:
+    parser = create_serve_parser()
+
+    parsed_args = parser.parse_args(arguments)
+
+    return ServeConfig(
         output=Path(parsed_args.output),
+        host=parsed_args.host,
+        port=parsed_args.port,
+        workers=parsed_args.workers,
+        queue_size=parsed_args.queue_size,
+        options=get_download_options(parsed_args),
+        scheduler=get_scheduler_settings(parsed_args),
+        logging=get_logging_settings(parsed_args),
+    )
+
+
+def process_batch_arguments(arguments: Optional[List] = None) -> BatchConfig:
+    parser = create_batch_parser()
+
+    parsed_args = parser.parse_args(arguments)
+
+    config = BatchConfig(
+        command=parsed_args.command,
+        queue=Path(parsed_args.queue),
+        logging=get_logging_settings(parsed_args),
     )
+    if parsed_args.command == BATCH_ADD:
+        urls = list(parsed_args.urls)
+        if parsed_args.from_file is not None:
+            with parsed_args.from_file as urls_file:
+                urls.extend(line.strip() for line in urls_file if line.strip())
+        return replace(config, urls=tuple(urls))
+    if parsed_args.command == BATCH_INGEST:
+        return replace(
+            config, urls=tuple(parsed_args.sitemaps), since=parsed_args.since
+        )
+    if parsed_args.command == BATCH_WORK:
+        return replace(
+            config,
+            output=Path(parsed_args.output),
+            worker=parsed_args.worker_id,
+            lease=parsed_args.lease,
+            concurrency=parsed_args.concurrency,
+            options=get_download_options(parsed_args),
+            scheduler=get_scheduler_settings(parsed_args),
+        )
+    return config
+
+
+def process_snapshot_arguments(arguments: Optional[List] = None) -> SnapshotConfig:
+    parser = create_snapshot_parser()
+
+    parsed_args = parser.parse_args(arguments)
+
+    config = SnapshotConfig(
+        command=parsed_args.command,
+        root=Path(parsed_args.root),
+        logging=get_logging_settings(parsed_args),
+    )
+    if parsed_args.command == SNAPSHOT_SAVE:
+        urls = list(parsed_args.urls)
+        if parsed_args.from_file is not None:
+            with parsed_args.from_file as urls_file:
+                urls.extend(line.strip() for line in urls_file if line.strip())
+        return replace(
+            config,
+            urls=tuple(urls),
+            options=get_download_options(parsed_args),
+            scheduler=get_scheduler_settings(parsed_args),
+        )
+    if parsed_args.command == SNAPSHOT_MATERIALIZE:
+        return replace(
+            config, version=parsed_args.version, output=Path(parsed_args.output)
+        )
+    if parsed_args.command == SNAPSHOT_PRUNE:
+        return replace(config, keep=parsed_args.keep)
+    return config
+
+
+def run_batch_command(config: BatchConfig) -> None:
+    queue = BatchQueue(config.queue, lease_seconds=config.lease)
+    if config.command == BATCH_ADD:
+        print(f"added {queue.add(config.urls)} of {len(config.urls)} urls")
+    elif config.command == BATCH_INGEST:
+        for sitemap in config.urls:
+            print(f"added {ingest_sitemap(queue, sitemap, config.since)} urls")
+    elif config.command == BATCH_WORK:
+        configure_scheduler(config.scheduler)
+        processed = run_worker(
+            queue,
+            config.output,
+            config.options,
+            config.worker,
+            concurrency=config.concurrency,
+        )
+        print(f"processed {processed} pages")
+    print_batch_status(queue)
+
+
+def print_batch_status(queue: BatchQueue) -> None:
+    for status, count in queue.stats().items():
+        print(f"{status}: {count}")
+    for failure in queue.failures():
+        print(f"failed page {failure['url']}: {failure['error']}", file=sys.stderr)
+
+
+def run_download(config: PageLoaderConfig, on_event: EventSink) -> DownloadReport:
+    if config.from_file is not None:
+        return localize_page_file(
+            config.from_file,
+            config.page_url,
+            config.output,
+            config.options,
+            on_event=on_event,
+        )
+    return download_with_report(
+        config.page_url, config.output, config.options, on_event=on_event
+    )
+
+
+def run_snapshot_command(config: SnapshotConfig) -> None:
+    store = SnapshotStore(config.root)
+    if config.command == SNAPSHOT_SAVE:
+        configure_scheduler(config.scheduler)
+        version = save_snapshot(store, config.urls, config.options)
+        print(f"saved version {version.id}")
+        for page_url in sorted(set(config.urls) - set(version.pages)):
+            print(f"failed page {page_url}", file=sys.stderr)
+    elif config.command == SNAPSHOT_MATERIALIZE and config.version is not None:
+        for file_path in store.materialize(config.version, config.output):
+            print(file_path)
+    elif config.command == SNAPSHOT_PRUNE:
+        removed = store.prune(config.keep)
+        print(f"removed {len(removed)} versions")
+    print_versions(store)
+
+
+def print_versions(store: SnapshotStore) -> None:
+    for version in store.versions():
+        print(
+            f"{version.id}\t{version.created}\t{len(version.pages)} pages\t"
+            f"{len(version.files)} files\t{format_size(version.stored_bytes)} stored"
+        )
+
+
+def batch_main(arguments: List[str]):
+    try:
+        config = process_batch_arguments(arguments)
+        configure_logging(config.logging)
+        run_batch_command(config)
+        sys.exit(os.EX_OK)
+    except Exception:
+        sys.exit(os.EX_SOFTWARE)
+
+
+def snapshot_main(arguments: List[str]):
+    try:
+        config = process_snapshot_arguments(arguments)
+        configure_logging(config.logging)
+        run_snapshot_command(config)
+        sys.exit(os.EX_OK)
+    except Exception:
+        sys.exit(os.EX_SOFTWARE)
+
+
+def serve_main(arguments: List[str]):
+    try:
+        config = process_serve_arguments(arguments)
+        configure_logging(config.logging)
+        configure_scheduler(config.scheduler)
+        serve(
+            output=config.output,
+            host=config.host,
+            port=config.port,
+            workers=config.workers,
+            queue_size=config.queue_size,
+            options=config.options,
+        )
+        sys.exit(os.EX_OK)
+    except Exception:
+        sys.exit(os.EX_SOFTWARE)
+
+
+COMMANDS = {
+    SERVE_COMMAND: serve_main,
+    BATCH_COMMAND: batch_main,
+    SNAPSHOT_COMMAND: snapshot_main,
+}
 
 
 def main():
+    command_main = COMMANDS.get(sys.argv[1]) if len(sys.argv) > 1 else None
+    if command_main is not None:
+        command_main(sys.argv[2:])
     try:
         config = process_arguments()
-        file_path = download(config.page_url, config.output)
-        print(file_path)
+        configure_logging(config.logging)
+        configure_scheduler(config.scheduler)
+        configure_recording(config.recording)
+        with ProgressDisplay() as display:
+            report = run_download(config, display)
+        print(report.file_path)
+        for failure in report.failures:
+            print(f"failed asset {failure.url}: {failure.reason}", file=sys.stderr)
         sys.exit(os.EX_OK)
     except Exception:
         sys.exit(os.EX_SOFTWARE)
@@ -0,0 +1,361 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from page_loader.context import AssetFailure
+from page_loader.core import download_with_report
+from page_loader.logging import get_logger
+from page_loader.options import DownloadOptions
+from page_loader.scheduling import get_host_stats
+
+logger = get_logger("page_loader.server")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_KEEP_FINISHED = 10000
+# long polling can't hold the connection forever
+MAX_WAIT_SECONDS = 60.0
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    page_url: str
+    status: str = JobStatus.QUEUED
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+    failures: List[AssetFailure] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    finished: threading.Event = field(
+        default_factory=threading.Event, repr=False, compare=False
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": self.page_url,
+            "status": self.status,
+            "file_path": self.file_path,
+            "error": self.error,
+            "failures": [
+                {"url": failure.url, "reason": failure.reason}
+                for failure in self.failures
+            ],
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded queue of download jobs processed by a fixed pool of worker threads
+    Workers live as long as the queue does, so their sessions stay warm
+    """
+
+    def __init__(
+        self,
+        output: Path,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        keep_finished: int = DEFAULT_KEEP_FINISHED,
+        options: Optional[DownloadOptions] = None,
+    ):
+        self.output = Path(output)
+        self.options = options or DownloadOptions()
+        self.workers = workers
+        self.keep_finished = keep_finished
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._stopping = False
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"page-loader-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """
+        Fails the queued jobs and waits for the running ones to finish,
+        new jobs aren't accepted anymore
+        """
+        with self._lock:
+            self._stopping = True
+            for job in self._drain():
+                self._finish(job, JobStatus.FAILED, "server stopped before the job")
+            # the queue is empty, so there is room for the sentinel,
+            # every worker puts it back for the next one
+            self._queue.put_nowait(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, page_url: str) -> Job:
+        """
+        Puts new download job into the queue
+
+        :param page_url: page url to download
+        :type page_url: str
+        :return: queued job
+        :rtype: Job
+        :raises QueueFullError: if the queue has no free slots or it's stopped
+        """
+        job = Job(id=uuid.uuid4().hex, page_url=page_url)
+        with self._lock:
+            if self._stopping:
+                raise QueueFullError("server is stopping")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("job queue is full, try again later")
+            self._jobs[job.id] = job
+            self._forget_finished_jobs()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "running": self._running,
+                "known_jobs": len(self._jobs),
+            }
+
+    def _forget_finished_jobs(self) -> None:
+        # oldest jobs go first, unfinished ones are always kept
+        overflow = len(self._jobs) - self.keep_finished
+        for job_id in list(self._jobs):
+            if overflow <= 0:
+                break
+            if self._jobs[job_id].finished.is_set():
+                del self._jobs[job_id]
+                overflow -= 1
+
+    def _drain(self) -> List[Job]:
+        jobs: List[Job] = []
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return jobs
+            if job is not None:
+                jobs.append(job)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None) -> None:
+        job.error = error
+        job.status = status
+        job.finished_at = time.time()
+        job.finished.set()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.put_nowait(None)
+                return
+            self._run(job)
+
+    def _run(self, job: Job) -> None:
+        with self._lock:
+            self._running += 1
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        try:
+            report = download_with_report(job.page_url, self.output, self.options)
+            job.file_path = report.file_path
+            job.failures = report.failures
+            self._finish(job, JobStatus.DONE)
+        except Exception as error:
+            logger.error(f"job {job.id} for {job.page_url} failed: {error!r}")
+            self._finish(job, JobStatus.FAILED, repr(error))
+        finally:
+            with self._lock:
+                self._running -= 1
+
+
+class JobsRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API over the job queue:
+
+    POST /jobs {"url": "..."} - queues new download, returns the job
+    GET /jobs/<id>[?wait=seconds] - returns the job, optionally waiting for it
+    GET /health - returns queue and per host stats
+    """
+
+    server: "PageLoaderServer"
+
+    def do_POST(self) -> None:  # noqa: N802
+        if urlsplit(self.path).path.rstrip("/") != "/jobs":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        payload, error = self._read_json()
+        if error is not None:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": error})
+            return
+        page_url = payload.get("url")
+        if not isinstance(page_url, str) or not page_url.startswith("http"):
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "url is required"})
+            return
+        try:
+            job = self.server.jobs.submit(page_url)
+        except QueueFullError as queue_full_error:
+            self._send_json(
+                HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(queue_full_error)}
+            )
+            return
+        self._send_json(HTTPStatus.ACCEPTED, job.to_dict())
+
+    def do_GET(self) -> None:  # noqa: N802
+        parsed_path = urlsplit(self.path)
+        path = parsed_path.path.rstrip("/")
+        if path == "/health":
+            stats: Dict[str, Any] = dict(self.server.jobs.stats())
+            stats["hosts"] = {
+                host: host_stats.to_dict()
+                for host, host_stats in get_host_stats().items()
+            }
+            self._send_json(HTTPStatus.OK, stats)
+            return
+        if not path.startswith("/jobs/"):
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "not found"})
+            return
+        job = self.server.jobs.get(path[len("/jobs/") :])
+        if job is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "unknown job"})
+            return
+        wait = _parse_wait(parse_qs(parsed_path.query).get("wait", []))
+        if wait:
+            job.finished.wait(wait)
+        self._send_json(HTTPStatus.OK, job.to_dict())
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def _read_json(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}, "request body should be valid JSON"
+        if not isinstance(payload, dict):
+            return {}, "request body should be JSON object"
+        return payload, None
+
+    def _send_json(self, status: HTTPStatus, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PageLoaderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], jobs: JobQueue):
+        super().__init__(address, JobsRequestHandler)
+        self.jobs = jobs
+
+
+def _parse_wait(values) -> float:
+    try:
+        wait = float(values[0]) if values else 0.0
+    except ValueError:
+        return 0.0
+    return max(0.0, min(wait, MAX_WAIT_SECONDS))
+
+
+def create_server(
+    output: Path,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int = DEFAULT_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    options: Optional[DownloadOptions] = None,
+) -> PageLoaderServer:
+    """
+    Creates the server with started job queue, call serve_forever to run it
+
+    :param output: folder to save pages into
+    :type output: Path
+    :param host: host to bind to
+    :type host: str
+    :param port: port to bind to, 0 picks any free port
+    :type port: int
+    :param workers: number of concurrent downloads
+    :type workers: int
+    :param queue_size: number of jobs which could wait for a free worker
+    :type queue_size: int
+    :param options: options of every download
+    :type options: Optional[DownloadOptions]
+    :return: server
+    :rtype: PageLoaderServer
+    :raises RuntimeError: if output folder doesn't exist
+    """
+    if not Path(output).is_dir():
+        error_message = "folder for content saving doesn't exist!"
+        logger.error(error_message)
+        raise RuntimeError(error_message)
+    jobs = JobQueue(
+        output=output, workers=workers, queue_size=queue_size, options=options
+    )
+    # bound first, so the workers aren't left behind if the port is taken
+    server = PageLoaderServer((host, port), jobs)
+    jobs.start()
+    return server
+
+
+def serve(
+    output: Path,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int = DEFAULT_WORKERS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    options: Optional[DownloadOptions] = None,
+) -> None:
+    """
+    Runs the server until it's interrupted, see create_server for parameters
+    """
+    server = create_server(output, host, port, workers, queue_size, options)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.jobs.stop()
@@ -0,0 +1,245 @@
+import gzip
+import io
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import islice
+from typing import IO, Deque, Iterable, Iterator, List, Optional, Set, cast
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
+
+from page_loader.batch import BatchQueue
+from page_loader.comm import stream_page
+from page_loader.logging import get_logger
+from page_loader.options import DownloadOptions
+
+logger = get_logger("page_loader.sitemaps")
+
+GZIP_MAGIC = b"\x1f\x8b"
+# bytes checked to tell xml from the plain url list
+PEEK_SIZE = 64
+# utf-8 byte order mark and whitespace before <?xml or the first url
+LEADING_BYTES = b"\xef\xbb\xbf \t\r\n"
+# urls added to the queue in one transaction, workers claim pages between them
+INGEST_BATCH_SIZE = 1000
+URL_TAG = "url"
+SITEMAP_TAG = "sitemap"
+
+
+@dataclass(frozen=True)
+class SitemapEntry:
+    # url (page) or sitemap (sitemap of the sitemap index)
+    kind: str
+    loc: str
+    lastmod: Optional[datetime] = None
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parses W3C datetime of <lastmod>, e.g. 2024-01-31 or 2024-01-31T10:00:00Z
+
+    :param value: lastmod text
+    :type value: Optional[str]
+    :return: timezone aware datetime (UTC if zone isn't set) or None if
+        lastmod is missing or malformed
+    :rtype: Optional[datetime]
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.endswith("Z"):
+        value = f"{value[:-1]}+00:00"
+    try:
+        lastmod = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if lastmod.tzinfo is None:
+        return lastmod.replace(tzinfo=timezone.utc)
+    return lastmod
+
+
+def is_modified_since(entry: SitemapEntry, since: Optional[datetime]) -> bool:
+    # entries without lastmod can't be skipped
+    return since is None or entry.lastmod is None or entry.lastmod >= since
+
+
+def get_local_name(tag: str) -> str:
+    # sitemaps namespace is ignored, {namespace}url -> url
+    return tag.rsplit("}", 1)[-1]
+
+
+def ungzip(stream: IO[bytes]) -> io.BufferedReader:
+    """
+    Decompresses gzipped stream on the fly (sitemap.xml.gz is served as is,
+    not with Content-Encoding), other streams are only buffered
+
+    :param stream: sitemap stream
+    :type stream: IO[bytes]
+    :return: decompressed buffered stream
+    :rtype: io.BufferedReader
+    """
+    buffered: io.BufferedReader = io.BufferedReader(cast(io.RawIOBase, stream))
+    if buffered.peek(len(GZIP_MAGIC))[: len(GZIP_MAGIC)] == GZIP_MAGIC:
+        decompressed = gzip.GzipFile(fileobj=buffered)
+        return io.BufferedReader(cast(io.RawIOBase, decompressed))
+    return buffered
+
+
+@contextmanager
+def open_sitemap(
+    source: str, options: Optional[DownloadOptions] = None
+) -> Iterator[io.BufferedReader]:
+    """
+    Opens sitemap url or file for reading, gzipped ones are decompressed
+
+    :param source: sitemap url or file path
+    :type source: str
+    :param options: timeouts options
+    :type options: Optional[DownloadOptions]
+    :return: sitemap stream
+    :rtype: Iterator[io.BufferedReader]
+    """
+    if urlsplit(source).scheme in ("http", "https"):
+        with stream_page(source, options) as stream:
+            yield ungzip(stream)
+    else:
+        with open(source, "rb", buffering=0) as file:
+            yield ungzip(file)
+
+
+def parse_sitemap(stream: io.BufferedReader) -> Iterator[SitemapEntry]:
+    """
+    Parses urlset or sitemap index incrementally: every entry is yielded as
+    soon as it's parsed and dropped from the tree, so memory doesn't grow
+    with the sitemap size. Files which don't start with < are url lists,
+    one url per line
+
+    :param stream: decompressed sitemap stream, see open_sitemap
+    :type stream: io.BufferedReader
+    :return: sitemap entries
+    :rtype: Iterator[SitemapEntry]
+    """
+    head = stream.peek(PEEK_SIZE)[:PEEK_SIZE].lstrip(LEADING_BYTES)
+    if head and not head.startswith(b"<"):
+        yield from parse_url_list(stream)
+        return
+    root = None
+    for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+        if root is None:
+            root = element
+        if event == "end" and get_local_name(element.tag) in (URL_TAG, SITEMAP_TAG):
+            yield make_entry(element)
+            root.clear()
+
+
+def parse_url_list(stream: IO[bytes]) -> Iterator[SitemapEntry]:
+    for line in stream:
+        url = line.strip().decode("utf-8", errors="replace")
+        if url and not url.startswith("#"):
+            yield SitemapEntry(URL_TAG, url)
+
+
+def make_entry(element: ElementTree.Element) -> SitemapEntry:
+    fields = {get_local_name(child.tag): (child.text or "") for child in element}
+    return SitemapEntry(
+        kind=get_local_name(element.tag),
+        loc=fields.get("loc", "").strip(),
+        lastmod=parse_lastmod(fields.get("lastmod")),
+    )
+
+
+def iterate_sitemap_urls(
+    source: str,
+    since: Optional[datetime] = None,
+    options: Optional[DownloadOptions] = None,
+) -> Iterator[str]:
+    """
+    Yields page urls of the sitemap while it's read, sitemaps of sitemap
+    indexes are followed one after another. Pages and sitemaps with lastmod
+    older than since are skipped
+
+    :param source: sitemap (index) url or file path
+    :type source: str
+    :param since: skip entries not modified since this time
+    :type since: Optional[datetime]
+    :param options: timeouts options
+    :type options: Optional[DownloadOptions]
+    :return: page urls
+    :rtype: Iterator[str]
+    """
+    pending: Deque[str] = deque([source])
+    seen: Set[str] = set()
+    while pending:
+        sitemap = pending.popleft()
+        if sitemap in seen:
+            continue
+        seen.add(sitemap)
+        for entry in read_sitemap(sitemap, since, options):
+            if entry.kind == SITEMAP_TAG:
+                pending.append(entry.loc)
+            else:
+                yield entry.loc
+
+
+def read_sitemap(
+    sitemap: str, since: Optional[datetime], options: Optional[DownloadOptions]
+) -> Iterator[SitemapEntry]:
+    try:
+        with open_sitemap(sitemap, options) as stream:
+            for entry in parse_sitemap(stream):
+                if entry.loc and is_modified_since(entry, since):
+                    yield entry
+    except Exception:
+        logger.error(
+            f"something went wrong while reading sitemap {sitemap}, "
+            "see exception above"
+        )
+        raise
+
+
+def chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def ingest_sitemap(
+    queue: BatchQueue,
+    source: str,
+    since: Optional[datetime] = None,
+    options: Optional[DownloadOptions] = None,
+) -> int:
+    """
+    Adds page urls of the sitemap to the batch queue while the sitemap is
+    read, workers could download them meanwhile. Without since, only pages
+    modified since the previous ingestion of the sitemap are added, modified
+    pages which are already downloaded are queued again
+
+    :param queue: batch queue
+    :type queue: BatchQueue
+    :param source: sitemap (index) url or file path
+    :type source: str
+    :param since: skip entries not modified since this time
+    :type since: Optional[datetime]
+    :param options: timeouts options
+    :type options: Optional[DownloadOptions]
+    :return: number of added urls
+    :rtype: int
+    """
+    started_at = time.time()
+    if since is None:
+        ingested_at = queue.get_ingested_at(source)
+        if ingested_at is not None:
+            since = datetime.fromtimestamp(ingested_at, timezone.utc)
+    added = 0
+    urls = iterate_sitemap_urls(source, since, options)
+    for chunk in chunked(urls, INGEST_BATCH_SIZE):
+        added += queue.add(chunk, requeue=since is not None)
+    # the sitemap is read through, the next run skips what's seen now
+    queue.set_ingested_at(source, started_at)
+    logger.info(f"{added} urls of sitemap {source} are queued")
+    return added
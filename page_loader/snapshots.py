@@ -0,0 +1,399 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from itertools import chain
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from page_loader.core import download_with_report
+from page_loader.file_operations import (
+    check_folder,
+    generate_file_name_from_page_url,
+    write_file,
+)
+from page_loader.logging import get_logger
+from page_loader.options import DownloadOptions
+
+logger = get_logger("page_loader.snapshots")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# files stored as deltas against the file of the previous version
+DELTA_SUFFIXES = frozenset({".html", ".htm", ".css"})
+# longer chains are cut by storing the whole file, so reading a file
+# never applies more than this number of deltas
+MAX_DELTA_DEPTH = 16
+
+# delta operation: [start, end] copies base lines, str inserts its bytes
+DeltaOperation = Union[List[int], str]
+
+
+@dataclass(frozen=True)
+class Version:
+    id: int
+    created: str
+    # pages saved by this version
+    pages: Tuple[str, ...]
+    # relative file path: content hash
+    files: Dict[str, str] = field(default_factory=dict)
+    # bytes added to the store by this version
+    stored_bytes: int = 0
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_delta(base: bytes, content: bytes) -> List[DeltaOperation]:
+    """
+    Makes line delta of the content against the base, saved pages
+    are prettified, so their changes are line changes
+    Base lines are indexed once and every content line is looked up
+    in the index, so the delta takes linear time even for the pages
+    with many repeated lines: the match closest after the previous
+    copied base line is extended as far as the lines are equal
+
+    :param base: base content
+    :type base: bytes
+    :param content: new content
+    :type content: bytes
+    :return: delta operations
+    :rtype: List[DeltaOperation]
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = content.splitlines(keepends=True)
+    positions = index_lines(base_lines)
+    delta: List[DeltaOperation] = []
+    inserted: List[bytes] = []
+    base_end = index = 0
+    while index < len(lines):
+        base_start = find_line(positions, lines[index], base_end)
+        if base_start is None:
+            inserted.append(lines[index])
+            index += 1
+            continue
+        base_end = base_start
+        while (
+            index < len(lines)
+            and base_end < len(base_lines)
+            and base_lines[base_end] == lines[index]
+        ):
+            base_end += 1
+            index += 1
+        append_insert(delta, inserted)
+        delta.append([base_start, base_end])
+    append_insert(delta, inserted)
+    return delta
+
+
+def index_lines(lines: List[bytes]) -> Dict[bytes, List[int]]:
+    # line: its positions in ascending order
+    positions: Dict[bytes, List[int]] = {}
+    for position, line in enumerate(lines):
+        positions.setdefault(line, []).append(position)
+    return positions
+
+
+def find_line(
+    positions: Dict[bytes, List[int]], line: bytes, after: int
+) -> Optional[int]:
+    # the first position at or after the hint, the first one otherwise
+    line_positions = positions.get(line)
+    if not line_positions:
+        return None
+    index = bisect_left(line_positions, after)
+    return line_positions[index if index < len(line_positions) else 0]
+
+
+def append_insert(delta: List[DeltaOperation], inserted: List[bytes]) -> None:
+    if inserted:
+        # latin-1 maps every byte to one char, so any bytes fit json
+        delta.append(b"".join(inserted).decode("latin-1"))
+        inserted.clear()
+
+
+def apply_delta(base: bytes, delta: Iterable[DeltaOperation]) -> bytes:
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for operation in delta:
+        if isinstance(operation, str):
+            parts.append(operation.encode("latin-1"))
+        else:
+            parts.extend(base_lines[operation[0] : operation[1]])
+    return b"".join(parts)
+
+
+def encode_delta(delta: dict) -> bytes:
+    # latin-1 chars of the inserted bytes are written as they are
+    return json.dumps(delta, ensure_ascii=False).encode("latin-1")
+
+
+def decode_delta(encoded: bytes) -> dict:
+    return json.loads(encoded.decode("latin-1"))
+
+
+class SnapshotStore:
+    """
+    Versions of the saved pages under one root: every save is a new version,
+    files are stored once by their content hash and shared between versions,
+    changed pages are stored as line deltas against the previous version
+    when the delta is smaller. One process at a time should save or prune
+
+    root/versions/<id>.json   version manifests
+    root/objects/<hash>       whole files
+    root/deltas/<hash>.json   files stored as deltas
+    root/staging/             pages being downloaded
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.versions_folder = self.root.joinpath("versions")
+        self.objects_folder = self.root.joinpath("objects")
+        self.deltas_folder = self.root.joinpath("deltas")
+        self.staging_folder = self.root.joinpath("staging")
+        for folder in (
+            self.versions_folder,
+            self.objects_folder,
+            self.deltas_folder,
+            self.staging_folder,
+        ):
+            folder.mkdir(parents=True, exist_ok=True)
+
+    def versions(self) -> List[Version]:
+        """
+        Returns versions from the oldest one
+
+        :return: versions
+        :rtype: List[Version]
+        """
+        versions = [
+            self._load_version(path) for path in self.versions_folder.glob("*.json")
+        ]
+        return sorted(versions, key=lambda version: version.id)
+
+    def get_version(self, version_id: int) -> Version:
+        path = self.versions_folder.joinpath(f"{version_id}.json")
+        if not path.exists():
+            error_message = f"snapshot version {version_id} doesn't exist"
+            logger.error(error_message)
+            raise RuntimeError(error_message)
+        return self._load_version(path)
+
+    def save(self, folder: Path, pages: Iterable[str]) -> Version:
+        """
+        Stores the folder with saved pages as the new version
+
+        :param folder: folder with saved pages and their assets
+        :type folder: Path
+        :param pages: urls of the saved pages
+        :type pages: Iterable[str]
+        :return: new version
+        :rtype: Version
+        """
+        versions = self.versions()
+        previous = versions[-1].files if versions else {}
+        files = {}
+        stored_bytes = 0
+        for path in sorted(path for path in Path(folder).rglob("*") if path.is_file()):
+            name = path.relative_to(folder).as_posix()
+            files[name], size = self._store_file(path, previous.get(name))
+            stored_bytes += size
+        version = Version(
+            id=versions[-1].id + 1 if versions else 1,
+            created=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            pages=tuple(pages),
+            files=files,
+            stored_bytes=stored_bytes,
+        )
+        write_file(
+            self.versions_folder.joinpath(f"{version.id}.json"),
+            json.dumps(asdict(version), indent=2),
+        )
+        logger.info(
+            f"snapshot version {version.id} is saved, {stored_bytes} bytes stored",
+            extra={"bytes": stored_bytes},
+        )
+        return version
+
+    def materialize(self, version_id: int, output: Path) -> List[str]:
+        """
+        Writes files of the version into the folder as download would
+
+        :param version_id: version id
+        :type version_id: int
+        :param output: folder to write the files into
+        :type output: Path
+        :return: paths to the pages
+        :rtype: List[str]
+        :raises RuntimeError: if output folder or version doesn't exist
+        """
+        output = Path(output)
+        check_folder(output)
+        version = self.get_version(version_id)
+        for name, content_hash in version.files.items():
+            target = output.joinpath(name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            object_path = self._get_object_path(content_hash)
+            if object_path.exists():
+                shutil.copyfile(object_path, target)
+            else:
+                write_file(target, self.read(content_hash))
+        return [
+            str(output.joinpath(generate_file_name_from_page_url(page)).resolve())
+            for page in version.pages
+        ]
+
+    def prune(self, keep: int) -> List[int]:
+        """
+        Removes all the versions but the latest ones, then the files
+        which aren't used by the kept versions (or their deltas)
+
+        :param keep: number of the latest versions to keep
+        :type keep: int
+        :return: removed version ids
+        :rtype: List[int]
+        """
+        versions = self.versions()
+        removed = versions[: max(len(versions) - keep, 0)]
+        for version in removed:
+            self.versions_folder.joinpath(f"{version.id}.json").unlink()
+        self._collect_garbage()
+        return [version.id for version in removed]
+
+    def read(self, content_hash: str) -> bytes:
+        """
+        Reads the stored file, deltas are applied to their bases
+
+        :param content_hash: file content hash
+        :type content_hash: str
+        :return: file content
+        :rtype: bytes
+        """
+        object_path = self._get_object_path(content_hash)
+        if object_path.exists():
+            return object_path.read_bytes()
+        delta = self._load_delta(content_hash)
+        return apply_delta(self.read(delta["base"]), delta["delta"])
+
+    def _store_file(self, path: Path, previous_hash: Optional[str]) -> Tuple[str, int]:
+        content_hash = hash_file(path)
+        if self._has(content_hash):
+            return content_hash, 0
+        if previous_hash is not None and path.suffix.lower() in DELTA_SUFFIXES:
+            size = self._store_delta(content_hash, path.read_bytes(), previous_hash)
+            if size is not None:
+                return content_hash, size
+        object_path = self._get_object_path(content_hash)
+        temporary_path = object_path.with_name(f".{uuid.uuid4().hex[:8]}.tmp")
+        shutil.copyfile(path, temporary_path)
+        os.replace(temporary_path, object_path)
+        return content_hash, object_path.stat().st_size
+
+    def _store_delta(
+        self, content_hash: str, content: bytes, base_hash: str
+    ) -> Optional[int]:
+        depth = self._get_depth(base_hash)
+        if depth >= MAX_DELTA_DEPTH:
+            return None
+        delta = make_delta(self.read(base_hash), content)
+        encoded = encode_delta({"base": base_hash, "depth": depth + 1, "delta": delta})
+        if len(encoded) >= len(content):
+            return None
+        write_file(self._get_delta_path(content_hash), encoded)
+        return len(encoded)
+
+    def _collect_garbage(self) -> None:
+        used: Set[str] = set()
+        for version in self.versions():
+            for content_hash in version.files.values():
+                self._add_used(content_hash, used)
+        unused_objects = (
+            path for path in self.objects_folder.iterdir() if path.name not in used
+        )
+        unused_deltas = (
+            path for path in self.deltas_folder.glob("*.json") if path.stem not in used
+        )
+        for path in chain(unused_objects, unused_deltas):
+            path.unlink()
+
+    def _add_used(self, content_hash: str, used: Set[str]) -> None:
+        # bases of the deltas are kept even if no version uses them
+        while content_hash not in used:
+            used.add(content_hash)
+            if self._get_object_path(content_hash).exists():
+                return
+            content_hash = self._load_delta(content_hash)["base"]
+
+    def _get_depth(self, content_hash: str) -> int:
+        if self._get_object_path(content_hash).exists():
+            return 0
+        return self._load_delta(content_hash)["depth"]
+
+    def _has(self, content_hash: str) -> bool:
+        return (
+            self._get_object_path(content_hash).exists()
+            or self._get_delta_path(content_hash).exists()
+        )
+
+    def _load_delta(self, content_hash: str) -> dict:
+        return decode_delta(self._get_delta_path(content_hash).read_bytes())
+
+    def _load_version(self, path: Path) -> Version:
+        data = json.loads(path.read_text())
+        return Version(
+            id=data["id"],
+            created=data["created"],
+            pages=tuple(data["pages"]),
+            files=data["files"],
+            stored_bytes=data["stored_bytes"],
+        )
+
+    def _get_object_path(self, content_hash: str) -> Path:
+        return self.objects_folder.joinpath(content_hash)
+
+    def _get_delta_path(self, content_hash: str) -> Path:
+        return self.deltas_folder.joinpath(f"{content_hash}.json")
+
+
+def save_snapshot(
+    store: SnapshotStore,
+    page_urls: Iterable[str],
+    options: Optional[DownloadOptions] = None,
+) -> Version:
+    """
+    Downloads the pages into the staging folder and stores them as the new
+    version, failed pages are logged and left out of the version
+
+    :param store: snapshot store
+    :type store: SnapshotStore
+    :param page_urls: page urls to download
+    :type page_urls: Iterable[str]
+    :param options: download options
+    :type options: Optional[DownloadOptions]
+    :return: new version
+    :rtype: Version
+    :raises RuntimeError: if none of the pages is saved
+    """
+    saved_pages = []
+    with TemporaryDirectory(dir=store.staging_folder) as folder:
+        for page_url in page_urls:
+            try:
+                download_with_report(page_url, Path(folder), options)
+            except Exception as error:
+                logger.error(f"snapshot page {page_url} failed: {error!r}")
+                continue
+            saved_pages.append(page_url)
+        if not saved_pages:
+            error_message = "none of the snapshot pages is saved"
+            logger.error(error_message)
+            raise RuntimeError(error_message)
+        return store.save(Path(folder), saved_pages)
@@ -0,0 +1,79 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+SRCSET_ALL = "all"
+SRCSET_LARGEST = "largest"
+SRCSET_SMALLEST = "smallest"
+SRCSET_POLICIES = (SRCSET_ALL, SRCSET_LARGEST, SRCSET_SMALLEST)
+
+# url can't start with comma, trailing commas of the url separate candidates,
+# otherwise descriptor goes till the next comma
+SRCSET_CANDIDATE_PATTERN = re.compile(
+    r"[\s,]*(?P<url>[^\s,](?:\S*[^\s,])?)(?:,+|\s+(?P<descriptor>[^,]*),?|$)"
+)
+DESCRIPTOR_PATTERN = re.compile(r"^(?P<value>\d+(?:\.\d+)?)(?P<unit>[wx])$")
+
+
+@dataclass(frozen=True)
+class SrcsetCandidate:
+    url: str
+    # e.g. 480w or 2x, empty means 1x
+    descriptor: str = ""
+
+    @property
+    def size(self) -> float:
+        """
+        Candidate size to compare candidates of one srcset,
+        widths and densities aren't mixed in a valid srcset
+        """
+        match = DESCRIPTOR_PATTERN.match(self.descriptor.strip().lower())
+        if match is None:
+            return 1.0
+        return float(match.group("value"))
+
+
+def parse_srcset(srcset: str) -> List[SrcsetCandidate]:
+    """
+    Parses srcset attribute into image candidates
+
+    :param srcset: srcset attribute value
+    :type srcset: str
+    :return: image candidates
+    :rtype: List[SrcsetCandidate]
+    """
+    return [
+        SrcsetCandidate(
+            url=match.group("url"),
+            descriptor=(match.group("descriptor") or "").strip(),
+        )
+        for match in SRCSET_CANDIDATE_PATTERN.finditer(srcset)
+    ]
+
+
+def serialize_srcset(candidates: List[SrcsetCandidate]) -> str:
+    return ", ".join(
+        f"{candidate.url} {candidate.descriptor}".strip() for candidate in candidates
+    )
+
+
+def select_candidates(
+    candidates: List[SrcsetCandidate], policy: str
+) -> List[SrcsetCandidate]:
+    """
+    Selects candidates to download according to the policy
+
+    :param candidates: srcset candidates
+    :type candidates: List[SrcsetCandidate]
+    :param policy: one of SRCSET_POLICIES
+    :type policy: str
+    :return: all candidates or the only largest/smallest one
+    :rtype: List[SrcsetCandidate]
+    :raises ValueError: if policy is unknown
+    """
+    if policy not in SRCSET_POLICIES:
+        raise ValueError(f"unknown srcset policy: {policy}")
+    if policy == SRCSET_ALL or not candidates:
+        return list(candidates)
+    select = max if policy == SRCSET_LARGEST else min
+    return [select(candidates, key=lambda candidate: candidate.size)]
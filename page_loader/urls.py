@@ -0,0 +1,112 @@
+from functools import lru_cache
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+RESOLVERS_CACHE_SIZE = 64
+
+
+def remove_dot_segments(path: str) -> str:
+    """
+    Removes . and .. segments from the url path (RFC 3986, section 5.2.4)
+
+    :param path: url path
+    :type path: str
+    :return: path without dot segments
+    :rtype: str
+    """
+    segments: List[str] = []
+    for segment in path.split("/"):
+        if segment == "..":
+            # the leading empty segment of the absolute path is kept
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != ".":
+            segments.append(segment)
+    if path.endswith(("/.", "/..")):
+        segments.append("")
+    return "/".join(segments)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes http(s) url, so equal urls are equal strings: scheme and host
+    are lowercased, default port, dot segments and fragment are removed
+    Other urls (data:, mailto:, etc.) are returned as is
+
+    :param url: absolute url
+    :type url: str
+    :return: normalized url
+    :rtype: str
+    """
+    parsed_url = urlsplit(url)
+    scheme = parsed_url.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+    userinfo, at, host = parsed_url.netloc.rpartition("@")
+    host = host.lower()
+    default_port = f":{DEFAULT_PORTS[scheme]}"
+    if host.endswith(default_port):
+        host = host[: -len(default_port)]
+    path = remove_dot_segments(parsed_url.path) or "/"
+    return urlunsplit((scheme, f"{userinfo}{at}{host}", path, parsed_url.query, ""))
+
+
+class UrlResolver:
+    """
+    Resolves page references against the page base url,
+    every reference is resolved once
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._urls: Dict[str, str] = {}
+
+    def resolve(self, reference: str) -> str:
+        """
+        Makes normalized absolute url from the page reference
+        Covers absolute (http://..., //cdn...), root relative (/assets/...)
+        and relative (assets/..., ../assets/...) references
+
+        :param reference: reference from the page
+        :type reference: str
+        :return: normalized url
+        :rtype: str
+        """
+        url = self._urls.get(reference)
+        if url is None:
+            url = normalize_url(urljoin(self.base_url, reference.strip()))
+            self._urls[reference] = url
+        return url
+
+
+@lru_cache(maxsize=RESOLVERS_CACHE_SIZE)
+def get_url_resolver(base_url: str) -> UrlResolver:
+    """
+    Returns resolver for the base url, resolvers of recent pages are reused
+
+    :param base_url: page url or <base href> url
+    :type base_url: str
+    :return: url resolver
+    :rtype: UrlResolver
+    """
+    return UrlResolver(base_url)
+
+
+def get_base_url(soup: BeautifulSoup, page_url: str) -> Optional[str]:
+    """
+    Returns absolute url of the first <base href> of the page
+
+    :param soup: page soup
+    :type soup: BeautifulSoup
+    :param page_url: page url
+    :type page_url: str
+    :return: base url or None if page has no <base href>
+    :rtype: Optional[str]
+    """
+    base = soup.find("base", href=True)
+    if base is None:
+        return None
+    return normalize_url(urljoin(page_url, base.attrs["href"].strip()))
@@ -0,0 +1,273 @@
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+from page_loader.batch import (
+    BatchQueue,
+    Lease,
+    PageStatus,
+    process_lease,
+    run_worker,
+)
+from page_loader.context import DownloadReport
+from page_loader.events import PageStarted
+from page_loader.options import DownloadOptions
+
+
+@pytest.fixture
+def queue_path():
+    with TemporaryDirectory() as folder:
+        yield Path(folder).joinpath("queue.sqlite")
+
+
+def test_add_skips_known_and_colliding_urls(queue_path):
+    queue = BatchQueue(queue_path)
+
+    added = queue.add(
+        [
+            "https://foo.bar/page",
+            "HTTPS://FOO.BAR:443/page#top",
+            # saved to foo-bar-page.html as well
+            "https://foo.bar/page.php",
+            "https://foo.bar/other",
+        ]
+    )
+
+    assert added == 2
+    assert queue.stats()[PageStatus.PENDING] == 2
+
+
+def test_add_requeues_done_and_failed_urls(queue_path):
+    queue = BatchQueue(queue_path, max_attempts=1)
+    queue.add(["https://foo.bar/a", "https://foo.bar/b", "https://foo.bar/c"])
+    queue.complete(queue.claim("worker"), "a.html")
+    queue.fail(queue.claim("worker"), "boom")
+    queue.claim("worker")
+
+    assert queue.add(["https://foo.bar/a", "https://foo.bar/b"]) == 0
+    assert (
+        queue.add(
+            ["https://foo.bar/a", "https://foo.bar/b", "https://foo.bar/c"],
+            requeue=True,
+        )
+        == 2
+    ), "leased url is being downloaded, it isn't requeued"
+    assert queue.stats()[PageStatus.PENDING] == 2
+    assert queue.stats()[PageStatus.LEASED] == 1
+
+
+def test_claim_leases_every_url_once(queue_path):
+    queue = BatchQueue(queue_path)
+    queue.add(["https://foo.bar/a", "https://foo.bar/b"])
+
+    first = queue.claim("first")
+    second = queue.claim("second")
+
+    assert first == Lease(url="https://foo.bar/a", worker="first", attempt=1)
+    assert second == Lease(url="https://foo.bar/b", worker="second", attempt=1)
+    assert queue.claim("third") is None
+    assert queue.stats()[PageStatus.LEASED] == 2
+
+
+def test_claim_is_exclusive_across_threads(queue_path):
+    urls = [f"https://foo.bar/{index}" for index in range(30)]
+    BatchQueue(queue_path).add(urls)
+    claimed = []
+
+    def claim_all(worker):
+        # queue object per worker, as on different hosts
+        queue = BatchQueue(queue_path)
+        while (lease := queue.claim(worker)) is not None:
+            claimed.append(lease.url)
+
+    threads = [
+        threading.Thread(target=claim_all, args=(f"worker-{index}",))
+        for index in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed) == sorted(urls)
+
+
+def test_expired_lease_is_claimed_by_another_worker(queue_path):
+    queue = BatchQueue(queue_path, lease_seconds=-1)
+    queue.add(["https://foo.bar/a"])
+
+    crashed = queue.claim("crashed")
+    lease = queue.claim("alive")
+
+    assert lease == Lease(url="https://foo.bar/a", worker="alive", attempt=2)
+    assert not queue.renew(crashed), "crashed worker shouldn't keep the url"
+    assert not queue.complete(crashed, "/foo/a.html")
+
+
+def test_expired_lease_is_lost_by_thread_of_the_same_worker(queue_path):
+    queue = BatchQueue(queue_path, lease_seconds=-1)
+    queue.add(["https://foo.bar/a"])
+
+    stale = queue.claim("worker")
+    lease = queue.claim("worker")
+
+    assert not queue.renew(stale)
+    assert not queue.complete(stale, "/foo/a.html")
+    assert not queue.fail(stale, "timeout")
+    assert queue.complete(lease, "/foo/a.html")
+
+
+def test_process_lease_aborts_download_when_lease_is_lost(queue_path):
+    queue = BatchQueue(queue_path, lease_seconds=0.3)
+    queue.add(["https://foo.bar/a"])
+    lease = queue.claim("worker")
+    patch("logging.Logger.warning").start()
+
+    def fake_download(page_url, output, options, on_event=None):
+        with closing(sqlite3.connect(str(queue_path))) as connection, connection:
+            connection.execute("UPDATE pages SET worker = 'other'")
+        # the next renewal finds the lease lost
+        time.sleep(0.5)
+        on_event(PageStarted(page_url))
+
+    patch("page_loader.batch.download_with_report", side_effect=fake_download).start()
+    complete_patch = patch.object(queue, "complete").start()
+
+    process_lease(queue, lease, queue_path.parent, DownloadOptions())
+
+    complete_patch.assert_not_called()
+    assert queue.stats()[PageStatus.LEASED] == 1
+
+    patch.stopall()
+
+
+def test_stats_are_read_while_queue_is_locked(queue_path):
+    queue = BatchQueue(queue_path)
+    queue.add(["https://foo.bar/a"])
+
+    with closing(sqlite3.connect(str(queue_path), isolation_level=None)) as writer:
+        writer.execute("BEGIN IMMEDIATE")
+        started_at = time.monotonic()
+
+        assert queue.stats()[PageStatus.PENDING] == 1
+        assert queue.failures() == []
+        assert time.monotonic() - started_at < 1
+        writer.execute("ROLLBACK")
+
+
+def test_expired_lease_fails_after_max_attempts(queue_path):
+    queue = BatchQueue(queue_path, lease_seconds=-1, max_attempts=1)
+    queue.add(["https://foo.bar/a"])
+
+    queue.claim("crashed")
+
+    assert queue.claim("alive") is None
+    assert queue.failures() == [{"url": "https://foo.bar/a", "error": "lease expired"}]
+
+
+def test_fail_returns_url_until_max_attempts(queue_path):
+    queue = BatchQueue(queue_path, max_attempts=2)
+    queue.add(["https://foo.bar/a"])
+
+    assert queue.fail(queue.claim("worker"), "timeout")
+    assert queue.stats()[PageStatus.PENDING] == 1
+    assert queue.fail(queue.claim("worker"), "timeout")
+    assert queue.stats()[PageStatus.FAILED] == 1
+
+
+def test_run_worker_drains_queue(queue_path):
+    queue = BatchQueue(queue_path, max_attempts=1)
+    queue.add(["https://foo.bar/a", "https://foo.bar/b"])
+
+    def fake_download(page_url, output, options, on_event=None):
+        if page_url.endswith("b"):
+            raise ConnectionError("refused")
+        return DownloadReport(file_path=f"{output}/foo-bar-a.html", failures=[])
+
+    download_patch = patch(
+        "page_loader.batch.download_with_report", side_effect=fake_download
+    ).start()
+
+    processed = run_worker(queue, Path("/var/tmp"), worker="worker")
+
+    assert processed == 2
+    assert download_patch.call_count == 2
+    assert queue.stats() == {
+        PageStatus.PENDING: 0,
+        PageStatus.LEASED: 0,
+        PageStatus.DONE: 1,
+        PageStatus.FAILED: 1,
+    }
+
+    patch.stopall()
+
+
+def test_run_worker_processes_leases_at_once(queue_path):
+    queue = BatchQueue(queue_path)
+    queue.add(["https://foo.bar/a", "https://foo.bar/b", "https://foo.bar/c"])
+    # every page waits for another one to be in flight
+    in_flight = threading.Barrier(2, timeout=5)
+
+    def fake_download(page_url, output, options, on_event=None):
+        if not page_url.endswith("c"):
+            in_flight.wait()
+        return DownloadReport(file_path=f"{output}/page.html", failures=[])
+
+    patch("page_loader.batch.download_with_report", side_effect=fake_download).start()
+
+    processed = run_worker(
+        queue, Path("/var/tmp"), worker="worker", poll_interval=0, concurrency=2
+    )
+
+    assert processed == 3
+    assert queue.stats()[PageStatus.DONE] == 3
+
+    patch.stopall()
+
+
+def test_run_worker_removes_assets_of_crashed_attempt(queue_path):
+    queue = BatchQueue(queue_path, lease_seconds=-1)
+    queue.add(["https://foo.bar/a"])
+    queue.claim("crashed")
+    output = queue_path.parent
+    assets_folder = output.joinpath("foo-bar-a_files")
+    assets_folder.mkdir()
+
+    def fake_download(page_url, output, options, on_event=None):
+        assert not assets_folder.exists()
+        return DownloadReport(file_path=f"{output}/foo-bar-a.html", failures=[])
+
+    patch("page_loader.batch.download_with_report", side_effect=fake_download).start()
+    # the claimed url lease is renewed by the worker itself
+    queue.lease_seconds = 60
+
+    assert run_worker(queue, output, worker="alive") == 1
+    assert queue.stats()[PageStatus.DONE] == 1
+
+    patch.stopall()
+
+
+def test_run_worker_downloads_requeued_page_again(queue_path):
+    queue = BatchQueue(queue_path, max_attempts=1)
+    queue.add(["https://foo.bar/a"])
+    output = queue_path.parent
+    assets_folder = output.joinpath("foo-bar-a_files")
+
+    def fake_download(page_url, output, options, on_event=None):
+        # raises FileExistsError if the previous download is left
+        assets_folder.mkdir()
+        return DownloadReport(file_path=f"{output}/foo-bar-a.html", failures=[])
+
+    patch("page_loader.batch.download_with_report", side_effect=fake_download).start()
+    assert run_worker(queue, output, worker="worker") == 1
+    queue.add(["https://foo.bar/a"], requeue=True)
+
+    assert run_worker(queue, output, worker="worker") == 1
+    assert queue.stats()[PageStatus.DONE] == 1
+
+    patch.stopall()
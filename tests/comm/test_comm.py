@@ -1,36 +1,73 @@
+import threading
+import time
+from io import BytesIO
 from unittest.mock import patch
 
 import pytest
-from page_loader.comm import get_page_content
+import requests
+from page_loader.comm import (
+    AssetRejected,
+    DeadlineExceeded,
+    close_sessions,
+    get_backoff_delay,
+    get_page_content,
+    get_page_response,
+    get_session,
+    get_timeout,
+    pooled_session,
+    stream_page,
+)
+from page_loader.filters import AssetFilter
+from page_loader.options import DownloadOptions
+from page_loader.scheduling import (
+    SchedulerSettings,
+    configure_scheduler,
+    get_host_stats,
+)
 from requests import Response
 
 
-@pytest.fixture
-def ok_response() -> Response:
+class TrackingBytesIO(BytesIO):
+    read_bytes = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.read_bytes += len(data)
+        return data
+
+
+def make_response(status_code: int, content: bytes, **headers) -> Response:
     response = Response()
-    response.status_code = 200
-    response._content = b"""<h1>foo, bar!</h1>"""
+    response.status_code = status_code
+    response.raw = TrackingBytesIO(content)
+    response.headers.update(headers)
 
     return response
 
 
 @pytest.fixture
-def not_ok_response() -> Response:
-    response = Response()
-    response.status_code = 404
-    response._content = b"""Page not found!"""
+def ok_response() -> Response:
+    return make_response(200, b"""<h1>foo, bar!</h1>""")
 
-    return response
+
+@pytest.fixture
+def service_unavailable_response() -> Response:
+    return make_response(503, b"""Try again later""")
+
+
+@pytest.fixture
+def not_ok_response() -> Response:
+    return make_response(404, b"""Page not found!""")
 
 
 def test_get_page_content_makes_get_request_and_returns_response_content(ok_response):
     page_url = "https://foo.bar"
 
-    get_patch = patch("requests.get", return_value=ok_response).start()
+    get_patch = patch("requests.Session.get", return_value=ok_response).start()
     content = get_page_content(page_url)
 
-    get_patch.assert_called_once_with(page_url, stream=True)
-    assert content == ok_response.content, "it should return response text"
+    get_patch.assert_called_once_with(page_url, stream=True, timeout=(10.0, 30.0))
+    assert content == b"<h1>foo, bar!</h1>", "it should return response text"
 
     patch.stopall()
 
@@ -38,16 +75,16 @@ def test_get_page_content_makes_get_request_and_returns_response_content(ok_resp
 def test_get_page_content_throws_on_not_ok_status_code(not_ok_response):
     page_url = "https://foo.bar"
 
-    get_patch = patch("requests.get", return_value=not_ok_response).start()
+    get_patch = patch("requests.Session.get", return_value=not_ok_response).start()
 
     with pytest.raises(RuntimeError) as runtime_error:
         get_page_content(page_url)
 
-    get_patch.assert_called_once_with(page_url, stream=True)
+    get_patch.assert_called_once_with(page_url, stream=True, timeout=(10.0, 30.0))
     assert str(runtime_error.value) == (
         f"get request to {page_url} returned not OK status code - "
         f"{not_ok_response.status_code}. "
-        f"Response message: {not_ok_response.text}"
+        "Response message: Page not found!"
     )
 
     patch.stopall()
@@ -56,15 +93,287 @@ def test_get_page_content_throws_on_not_ok_status_code(not_ok_response):
 def test_get_page_content_makes_error_log_on_request_get_exception():
     page_url = "https://foo.bar"
 
-    get_patch = patch("requests.get", side_effect=Exception()).start()
+    get_patch = patch("requests.Session.get", side_effect=Exception()).start()
     logger_error_patch = patch("logging.Logger.error").start()
 
     with pytest.raises(Exception):
         get_page_content(page_url)
 
-    get_patch.assert_called_once_with(page_url, stream=True)
+    get_patch.assert_called_once_with(page_url, stream=True, timeout=(10.0, 30.0))
+    logger_error_patch.assert_called_once_with(
+        f"get request to {page_url} failed, see exception message above"
+    )
+
+    patch.stopall()
+
+
+def test_get_page_content_retries_retriable_status_code(
+    ok_response, service_unavailable_response
+):
+    page_url = "https://foo.bar"
+    options = DownloadOptions(retries=1, backoff_base=0)
+
+    get_patch = patch(
+        "requests.Session.get",
+        side_effect=[service_unavailable_response, ok_response],
+    ).start()
+    content = get_page_content(page_url, options)
+
+    assert get_patch.call_count == 2
+    assert content == b"<h1>foo, bar!</h1>"
+
+    patch.stopall()
+
+
+def test_get_page_content_retries_connection_errors_and_gives_up():
+    page_url = "https://foo.bar"
+    options = DownloadOptions(retries=2, backoff_base=0)
+
+    get_patch = patch(
+        "requests.Session.get", side_effect=requests.ConnectionError()
+    ).start()
+    logger_error_patch = patch("logging.Logger.error").start()
+
+    with pytest.raises(requests.ConnectionError):
+        get_page_content(page_url, options)
+
+    assert get_patch.call_count == 3, "it should make 1 attempt and 2 retries"
     logger_error_patch.assert_called_once_with(
         f"get request to {page_url} failed, see exception message above"
     )
 
     patch.stopall()
+
+
+def test_get_page_content_returns_last_retriable_response_status():
+    page_url = "https://foo.bar"
+    options = DownloadOptions(retries=1, backoff_base=0)
+
+    get_patch = patch(
+        "requests.Session.get",
+        side_effect=[make_response(503, b"busy"), make_response(503, b"busy")],
+    ).start()
+
+    with pytest.raises(RuntimeError):
+        get_page_content(page_url, options)
+
+    assert get_patch.call_count == 2
+
+    patch.stopall()
+
+
+def test_get_page_content_raises_when_deadline_is_reached():
+    get_patch = patch("requests.Session.get").start()
+
+    with pytest.raises(DeadlineExceeded):
+        get_page_content("https://foo.bar", deadline=time.monotonic() - 1)
+
+    get_patch.assert_not_called()
+
+    patch.stopall()
+
+
+def test_get_page_content_doesnt_wait_for_retry_after_past_deadline():
+    configure_scheduler(SchedulerSettings())
+    patch(
+        "requests.Session.get",
+        return_value=make_response(429, b"busy", **{"Retry-After": "8"}),
+    ).start()
+    options = DownloadOptions(retries=1, backoff_base=0)
+
+    started_at = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        get_page_content("https://foo.bar", options, deadline=time.monotonic() + 1)
+
+    assert time.monotonic() - started_at < 1
+
+    configure_scheduler(SchedulerSettings())
+    patch.stopall()
+
+
+def test_get_page_content_checks_deadline_between_chunks():
+    response = make_response(200, b"x" * 1024 * 1024)
+    patch("requests.Session.get", return_value=response).start()
+
+    with pytest.raises(DeadlineExceeded):
+        get_page_content(
+            "https://foo.bar/a.png",
+            deadline=time.monotonic() + 0.05,
+            on_progress=lambda received, total: time.sleep(0.1),
+        )
+
+    assert response.raw.read_bytes < 1024 * 1024, "it should stop reading"
+
+    patch.stopall()
+
+
+def test_get_timeout_is_cut_by_deadline():
+    options = DownloadOptions(connect_timeout=10, read_timeout=30)
+
+    connect_timeout, read_timeout = get_timeout(options, time.monotonic() + 5)
+
+    assert connect_timeout <= 5
+    assert read_timeout <= 5
+    assert get_timeout(options, None) == (10, 30)
+
+
+@pytest.mark.parametrize("attempt, max_delay", [(1, 0.5), (2, 1.0), (10, 10.0)])
+def test_get_backoff_delay(attempt, max_delay):
+    options = DownloadOptions(backoff_base=0.5, backoff_max=10.0)
+
+    for __ in range(20):
+        assert 0 <= get_backoff_delay(attempt, options) <= max_delay
+
+
+def test_get_page_content_rejects_asset_by_content_length():
+    response = make_response(200, b"foo", **{"Content-Length": "2048"})
+    patch("requests.Session.get", return_value=response).start()
+
+    with pytest.raises(AssetRejected):
+        get_page_content(
+            "https://foo.bar/a.png", asset_filter=AssetFilter(max_size=1024)
+        )
+
+    assert response.raw.read_bytes == 0, "it shouldn't read the content"
+
+    patch.stopall()
+
+
+def test_get_page_content_rejects_asset_mid_stream():
+    response = make_response(200, b"x" * 4096)
+    patch("requests.Session.get", return_value=response).start()
+
+    with pytest.raises(AssetRejected):
+        get_page_content(
+            "https://foo.bar/a.png", asset_filter=AssetFilter(max_size=1024)
+        )
+
+    assert response.raw.read_bytes < 4096, "it should stop reading the content"
+
+    patch.stopall()
+
+
+def test_get_page_content_rejects_asset_by_mime_type():
+    response = make_response(200, b"foo", **{"Content-Type": "video/mp4"})
+    patch("requests.Session.get", return_value=response).start()
+
+    with pytest.raises(AssetRejected):
+        get_page_content(
+            "https://foo.bar/a",
+            asset_filter=AssetFilter(exclude_mime_types=("video/*",)),
+        )
+
+    patch.stopall()
+
+
+def test_get_page_content_does_not_check_not_ok_response_headers():
+    response = make_response(404, b"Not found", **{"Content-Type": "text/html"})
+    patch("requests.Session.get", return_value=response).start()
+    patch("logging.Logger.error").start()
+
+    with pytest.raises(RuntimeError) as runtime_error:
+        get_page_content(
+            "https://foo.bar/a",
+            asset_filter=AssetFilter(include_mime_types=("image/*",)),
+        )
+
+    assert not isinstance(runtime_error.value, AssetRejected)
+
+    patch.stopall()
+
+
+def test_get_page_response_sends_headers_and_returns_not_modified():
+    page_url = "https://foo.bar"
+
+    get_patch = patch(
+        "requests.Session.get", return_value=make_response(304, b"")
+    ).start()
+    response = get_page_response(page_url, headers={"If-None-Match": '"v1"'})
+
+    get_patch.assert_called_once_with(
+        page_url,
+        stream=True,
+        timeout=(10.0, 30.0),
+        headers={"If-None-Match": '"v1"'},
+    )
+    assert response.status_code == 304
+
+    patch.stopall()
+
+
+def test_get_page_content_reports_progress():
+    response = make_response(200, b"x" * 100, **{"Content-Length": "100"})
+    patch("requests.Session.get", return_value=response).start()
+    progress = []
+
+    get_page_content(
+        "https://foo.bar/a.png",
+        on_progress=lambda received, total: progress.append((received, total)),
+    )
+
+    assert progress == [(100, 100)]
+
+    patch.stopall()
+
+
+def test_stream_page(ok_response):
+    get_patch = patch("requests.Session.get", return_value=ok_response).start()
+
+    with stream_page("https://foo.bar/sitemap.xml") as stream:
+        assert stream.read(4) == b"<h1>"
+        assert ok_response.raw.read_bytes == 4, "content is read on demand"
+
+    assert get_patch.call_args.kwargs["stream"]
+
+    patch.stopall()
+
+
+def test_stream_page_releases_slot_with_headers(ok_response):
+    configure_scheduler(SchedulerSettings())
+    patch("requests.Session.get", return_value=ok_response).start()
+
+    with stream_page("https://foo.bar/sitemap.xml") as stream:
+        assert get_host_stats()["foo.bar"].in_flight == 0
+        assert stream.read() == b"<h1>foo, bar!</h1>"
+
+    assert get_host_stats()["foo.bar"].requests == 1
+
+    configure_scheduler(SchedulerSettings())
+    patch.stopall()
+
+
+def test_stream_page_raises_on_not_ok_status(not_ok_response):
+    patch("requests.Session.get", return_value=not_ok_response).start()
+    patch("logging.Logger.error").start()
+
+    with pytest.raises(RuntimeError):
+        with stream_page("https://foo.bar/sitemap.xml"):
+            pass
+
+    patch.stopall()
+
+
+def test_pooled_session_outlives_thread():
+    sessions = []
+
+    def use_session():
+        with pooled_session():
+            sessions.append(get_session())
+
+    for _ in range(2):
+        thread = threading.Thread(target=use_session)
+        thread.start()
+        thread.join()
+
+    assert sessions[0] is sessions[1], "it should lend the idle session again"
+
+
+def test_close_sessions_closes_connection_pools():
+    with pooled_session() as session:
+        close_patch = patch.object(session, "close").start()
+
+    close_sessions()
+
+    close_patch.assert_called_once()
+
+    patch.stopall()
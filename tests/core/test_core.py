@@ -1,20 +1,55 @@
+import mmap
+import threading
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
+import page_loader.core
 import pytest
 from bs4 import BeautifulSoup
-from page_loader import download
+from page_loader import (
+    download,
+    download_with_report,
+    iterate_download_events,
+    localize_page_file,
+)
+from page_loader.comm import (
+    AssetRejected,
+    DeadlineExceeded,
+    PageResponse,
+    get_session,
+)
+from page_loader.context import AssetFailure, DownloadContext
 from page_loader.core import (
     PageAssets,
     PageAssetsWithUpdatedAssets,
     get_page_assets,
+    map_concurrently,
+    parse_page_in_worker,
     process_assets,
     process_page_content,
+    read_page_file,
+    render_page_template,
     update_page_assets,
 )
-from page_loader.file_operations import generate_file_name_prefix_from_page_url
-from tests.helpers import make_tag
+from page_loader.encoding import decode_page
+from page_loader.events import (
+    AssetDone,
+    AssetQueued,
+    AssetStarted,
+    PageDone,
+    PageFailed,
+    PageStarted,
+)
+from page_loader.file_operations import (
+    FileWriter,
+    generate_file_name_prefix_from_page_url,
+)
+from page_loader.filters import AssetFilter
+from page_loader.options import DownloadOptions
+from page_loader.priorities import AssetSizes
+from page_loader.processes import shutdown_process_pool
+from tests.helpers import make_page_response, make_tag
 from tests.paths import tests_resources_path
 
 
@@ -29,8 +64,10 @@ def test_download():
         ).read_bytes()
 
         patch(
-            "page_loader.core.get_page_content", side_effect=[content, asset_content]
+            "page_loader.core.get_page_response",
+            return_value=make_page_response(content),
         ).start()
+        patch("page_loader.core.get_page_content", return_value=asset_content).start()
 
         file_path = download(page_url, folder_path)
 
@@ -45,13 +82,13 @@ def test_download():
         patch.stopall()
 
 
-def test_download_makes_error_log_if_get_page_content_fails():
+def test_download_makes_error_log_if_get_page_response_fails():
     with TemporaryDirectory() as folder:
         page_url = "https://ru.hexlet.io/courses.html"
         folder_path = Path(folder)
 
-        # make get_page_content to throw
-        patch("page_loader.core.get_page_content", side_effect=Exception()).start()
+        # make get_page_response to throw
+        patch("page_loader.core.get_page_response", side_effect=Exception()).start()
         logger_error_patch = patch("logging.Logger.error").start()
 
         with pytest.raises(Exception):
@@ -71,7 +108,8 @@ def test_download_makes_error_log_if_process_page_content_fails():
         folder_path = Path(folder)
 
         patch(
-            "page_loader.core.get_page_content", return_value="<h1>foo, bar</h1>"
+            "page_loader.core.get_page_response",
+            return_value=make_page_response("<h1>foo, bar</h1>"),
         ).start()
         # make process_page_content to throw
         patch("page_loader.core.process_page_content", side_effect=Exception()).start()
@@ -198,14 +236,17 @@ def test_process_page_content_page_with_script_and_link_tags():
 
     with TemporaryDirectory() as folder:
         folder_path = Path(folder)
+        contents = {
+            "https://ru.hexlet.io/assets/professions/nodejs.png": (
+                node_js_picture_asset_content
+            ),
+            "https://ru.hexlet.io/packs/js/runtime.js": js_runtime_asset_content,
+            "https://ru.hexlet.io/assets/application.css": css_asset_content,
+            "https://ru.hexlet.io/courses": courses_asset_content,
+        }
         patch(
             "page_loader.core.get_page_content",
-            side_effect=[
-                node_js_picture_asset_content,
-                js_runtime_asset_content,
-                css_asset_content,
-                courses_asset_content,
-            ],
+            side_effect=lambda url, *args: contents[url],
         ).start()
 
         filepath = process_page_content(page_url, content, folder_path)
@@ -271,14 +312,15 @@ def test_process_page_content_page_with_broken_link_tag():
 
     with TemporaryDirectory() as folder:
         folder_path = Path(folder)
+        contents = {
+            "https://site.com/photos/me.jpg": picture_asset_content,
+            "https://site.com/assets/scripts.js": js_asset_content,
+            "https://site.com/blog/about/assets/styles.css": css_asset_content,
+            "https://site.com/blog/about": about_asset_content,
+        }
         patch(
             "page_loader.core.get_page_content",
-            side_effect=[
-                picture_asset_content,
-                js_asset_content,
-                css_asset_content,
-                about_asset_content,
-            ],
+            side_effect=lambda url, *args: contents[url],
         ).start()
 
         filepath = process_page_content(page_url, content, folder_path)
@@ -383,6 +425,34 @@ def test_get_page_assets_page_with_scripts_and_links():
     assert assets == expected_assets, "it should extract assets tags"
 
 
+def test_get_page_assets_with_asset_filter():
+    page_url = "https://ru.hexlet.io/courses.html"
+    content = tests_resources_path("page_with_script_and_link_tags.html").read_text()
+    soup = BeautifulSoup(content, features="html.parser")
+    asset_filter = AssetFilter(
+        exclude_rels=frozenset({"canonical"}), exclude_urls=(r"\.js$",)
+    )
+
+    assets = get_page_assets(soup, page_url, asset_filter)
+
+    expected_assets = PageAssets(
+        src=[
+            make_tag(
+                "img",
+                src="/assets/professions/nodejs.png",
+                alt="Node.js profession icon",
+            ),
+        ],
+        href=[
+            make_tag(
+                "link", href="/assets/application.css", media="all", rel="stylesheet"
+            ),
+        ],
+    )
+
+    assert assets == expected_assets, "it should skip filtered assets"
+
+
 def test_process_assets():
     assets = PageAssets(
         src=[
@@ -487,6 +557,517 @@ def test_process_assets_with_asset_with_local_link():
     patch.stopall()
 
 
+@pytest.mark.parametrize("workers", [1, 4])
+def test_map_concurrently_keeps_items_order(workers):
+    items = list(range(20))
+
+    assert map_concurrently(lambda item: item * 2, items, workers) == [
+        item * 2 for item in items
+    ]
+
+
+def test_map_concurrently_reuses_sessions_of_previous_calls():
+    # all the threads run at once, so every call needs four sessions
+    barrier = threading.Barrier(4)
+
+    def get_session_id(_):
+        barrier.wait()
+        return id(get_session())
+
+    first_sessions = set(map_concurrently(get_session_id, range(4), 4))
+    second_sessions = set(map_concurrently(get_session_id, range(4), 4))
+
+    assert second_sessions <= first_sessions, "threads should reuse idle sessions"
+
+
+def test_process_assets_downloads_stylesheet_assets():
+    assets = PageAssets(
+        src=[],
+        href=[make_tag("link", href="/assets/styles.css", rel="stylesheet")],
+    )
+    page_url = "https://foo.bar"
+    file_name_prefix = generate_file_name_prefix_from_page_url(page_url)
+    stylesheet = b"body { background: url(../photos/me.jpg) }"
+    picture = tests_resources_path("photos/me.jpg").read_bytes()
+    with TemporaryDirectory() as folder:
+        get_page_content_patch = patch(
+            "page_loader.core.get_page_content", side_effect=[stylesheet, picture]
+        ).start()
+
+        process_assets(
+            assets=assets,
+            page_url=page_url,
+            file_name_prefix=file_name_prefix,
+            folder=folder,
+        )
+
+        assets_folder = Path(folder).joinpath("foo-bar_files")
+        assert get_page_content_patch.call_args.args[0] == (
+            "https://foo.bar/photos/me.jpg"
+        ), "it should resolve reference against the stylesheet url"
+        assert assets_folder.joinpath("foo-bar-photos-me.jpg").read_bytes() == picture
+        assert (
+            assets_folder.joinpath("foo-bar-assets-styles.css").read_bytes()
+            == b"body { background: url(foo-bar-photos-me.jpg) }"
+        )
+
+    patch.stopall()
+
+
+def test_process_page_content_page_with_responsive_images():
+    page_url = "https://foo.bar/gallery"
+    content = (
+        b"<picture>"
+        b'<source srcset="/img/a.webp 1x, /img/a@2x.webp 2x" type="image/webp">'
+        b'<img src="/img/a.jpg" srcset="/img/a.jpg 1x, /img/a@2x.jpg 2x">'
+        b"</picture>"
+    )
+    contents = {
+        "https://foo.bar/img/a.jpg": b"a.jpg",
+        "https://foo.bar/img/a@2x.jpg": b"a@2x.jpg",
+        "https://foo.bar/img/a@2x.webp": b"a@2x.webp",
+    }
+    context = DownloadContext(options=DownloadOptions(srcset_policy="largest"))
+
+    with TemporaryDirectory() as folder:
+        get_page_content_patch = patch(
+            "page_loader.core.get_page_content",
+            side_effect=lambda url, *args: contents[url],
+        ).start()
+
+        filepath = process_page_content(page_url, content, Path(folder), context)
+
+        soup = BeautifulSoup(Path(filepath).read_text(), features="html.parser")
+        assets_folder = "foo-bar-gallery_files"
+        assert soup.source.attrs["srcset"] == (
+            f"{assets_folder}/foo-bar-img-a-2x.webp 2x"
+        ), "it should keep the largest candidate only"
+        assert soup.img.attrs["src"] == f"{assets_folder}/foo-bar-img-a.jpg"
+        assert soup.img.attrs["srcset"] == f"{assets_folder}/foo-bar-img-a-2x.jpg 2x"
+        assert get_page_content_patch.call_count == 3
+        assert (
+            Path(folder, assets_folder, "foo-bar-img-a-2x.webp").read_bytes()
+            == b"a@2x.webp"
+        )
+
+    patch.stopall()
+
+
+def test_download_in_processes_matches_download_in_thread():
+    page_url = "https://foo.bar/gallery"
+    page_content = (
+        b'<html><head><link href="/style.css" rel="stylesheet"></head><body>'
+        b'<video src="/movie.mp4"><source src="/movie.webm"></video>'
+        b'<img src="/a.png" srcset="/a.png 1x, /a@2x.png 2x">'
+        b"</body></html>"
+    )
+
+    patch(
+        "page_loader.core.get_page_response",
+        return_value=make_page_response(page_content),
+    ).start()
+    patch(
+        "page_loader.core.get_page_content", side_effect=lambda url, *args: url.encode()
+    ).start()
+    with TemporaryDirectory() as thread_folder, TemporaryDirectory() as folder:
+        thread_filepath = download(page_url, Path(thread_folder))
+
+        filepath = download(page_url, Path(folder), DownloadOptions(processes=1))
+
+        assert Path(filepath).read_text() == Path(thread_filepath).read_text()
+        assert sorted(Path(folder, "foo-bar-gallery_files").iterdir()) == sorted(
+            Path(folder, "foo-bar-gallery_files").joinpath(path.name)
+            for path in Path(thread_folder, "foo-bar-gallery_files").iterdir()
+        )
+
+    shutdown_process_pool()
+    patch.stopall()
+
+
+def test_download_in_processes_writes_assets_with_writer():
+    page_url = "https://foo.bar/gallery"
+    patch(
+        "page_loader.core.get_page_response",
+        return_value=make_page_response(b'<img src="/a.png">'),
+    ).start()
+    patch("page_loader.core.get_page_content", return_value=b"png").start()
+    write_patch = patch.object(
+        FileWriter, "write", autospec=True, side_effect=FileWriter.write
+    ).start()
+
+    with TemporaryDirectory() as folder:
+        download(page_url, Path(folder), DownloadOptions(processes=1))
+
+        asset_path = Path(folder, "foo-bar-gallery_files", "foo-bar-a.png")
+        assert asset_path.read_bytes() == b"png"
+        page_path = Path(folder, "foo-bar-gallery.html")
+    assert [call.args[1] for call in write_patch.call_args_list] == [
+        asset_path,
+        page_path,
+    ]
+
+    shutdown_process_pool()
+    patch.stopall()
+
+
+def test_process_assets_hands_assets_to_writer_as_downloaded():
+    assets = PageAssets(
+        src=[make_tag("img", src="/fast.png"), make_tag("img", src="/slow.png")],
+        href=[],
+    )
+    page_url = "https://foo.bar"
+    fast_written = threading.Event()
+    writer = MagicMock()
+    writer.write.side_effect = lambda path, content: fast_written.set()
+
+    def get_page_content(url, *args):
+        if url.endswith("slow.png"):
+            # finishes only after the other asset is handed to the writer
+            assert fast_written.wait(5), "fast asset should be written first"
+        return url.encode()
+
+    patch("page_loader.core.get_page_content", side_effect=get_page_content).start()
+    context = DownloadContext(options=DownloadOptions(asset_workers=2))
+
+    with TemporaryDirectory() as folder:
+        process_assets(
+            assets=assets,
+            page_url=page_url,
+            file_name_prefix=generate_file_name_prefix_from_page_url(page_url),
+            folder=folder,
+            context=context,
+            writer=writer,
+        )
+
+        assets_folder = Path(folder).joinpath("foo-bar_files")
+        assert [call.args for call in writer.write.call_args_list] == [
+            (assets_folder.joinpath("foo-bar-fast.png"), b"https://foo.bar/fast.png"),
+            (assets_folder.joinpath("foo-bar-slow.png"), b"https://foo.bar/slow.png"),
+        ]
+
+    patch.stopall()
+
+
+def test_parse_page_in_worker_parses_page_once():
+    parse_patch = patch(
+        "page_loader.core.parse_page", wraps=page_loader.core.parse_page
+    ).start()
+
+    with TemporaryDirectory() as folder:
+        page_path = Path(folder, "page.html")
+        page_path.write_text('<img src="/a.png"><img alt="b" src="/b.png">')
+        template_path = Path(folder, "template.html")
+        template_path.touch()
+
+        template = parse_page_in_worker(
+            str(page_path), "https://foo.bar", str(template_path), None, None
+        )
+        page = template_path.read_text()
+
+    assert [tag.attrs["src"] for tag in template.tags] == ["/a.png", "/b.png"]
+    assert template.assets.src == template.tags
+    assert "/a.png" not in page, "asset attributes should be replaced by markers"
+    updated_b = make_tag("img", alt="b", src="files/b.png")
+    content = render_page_template(
+        page,
+        template,
+        PageAssetsWithUpdatedAssets(src={template.tags[1]: updated_b}, href={}),
+    )
+    soup = BeautifulSoup(content, "html.parser")
+    assert [img.attrs for img in soup.find_all("img")] == [
+        {"src": "/a.png"},
+        {"alt": "b", "src": "files/b.png"},
+    ]
+    parse_patch.assert_called_once()
+
+    patch.stopall()
+
+
+def test_download_in_processes_frees_worker_while_assets_download():
+    pages = {
+        "https://foo.bar/slow": b'<img src="/slow.png">',
+        "https://foo.bar/fast": b'<img src="/fast.png">',
+    }
+    slow_asset_requested = threading.Event()
+    slow_asset_released = threading.Event()
+
+    def get_content(url, *args):
+        if url == "https://foo.bar/slow.png":
+            slow_asset_requested.set()
+            slow_asset_released.wait(10)
+        return b"png"
+
+    patch(
+        "page_loader.core.get_page_response",
+        side_effect=lambda url, *args: make_page_response(pages[url]),
+    ).start()
+    patch("page_loader.core.get_page_content", side_effect=get_content).start()
+    options = DownloadOptions(processes=1)
+
+    with TemporaryDirectory() as folder:
+        slow_download = threading.Thread(
+            target=download, args=("https://foo.bar/slow", Path(folder), options)
+        )
+        slow_download.start()
+        slow_asset_requested.wait(10)
+
+        # the only pool worker isn't held by the page downloading its assets
+        assert Path(download("https://foo.bar/fast", Path(folder), options)).exists()
+
+        slow_asset_released.set()
+        slow_download.join()
+        assert Path(folder, "foo-bar-slow.html").exists()
+
+    shutdown_process_pool()
+    patch.stopall()
+
+
+def test_download_in_processes_releases_task_when_assets_fail():
+    page_url = "https://foo.bar/gallery"
+    patch(
+        "page_loader.core.get_page_response",
+        return_value=make_page_response(b'<img src="/a.png">'),
+    ).start()
+    patch(
+        "page_loader.core.get_page_content", side_effect=ConnectionError("refused")
+    ).start()
+    options = DownloadOptions(processes=1)
+
+    with TemporaryDirectory() as folder, TemporaryDirectory() as next_folder:
+        with pytest.raises(ConnectionError):
+            download(page_url, Path(folder), options)
+
+        assert not Path(folder, "foo-bar-gallery.html").exists()
+
+        patch(
+            "page_loader.core.get_page_content", side_effect=lambda url, *args: b"a"
+        ).start()
+        # the only pool worker isn't left waiting for the failed page
+        assert Path(download(page_url, Path(next_folder), options)).exists()
+
+    shutdown_process_pool()
+    patch.stopall()
+
+
+def test_process_page_content_page_with_media_assets():
+    page_url = "https://foo.bar/media"
+    content = (
+        b'<link rel="preconnect">'
+        b'<video src="/movie.mp4"></video>'
+        b'<object data="/doc.pdf"></object>'
+    )
+    contents = {
+        "https://foo.bar/movie.mp4": b"movie",
+        "https://foo.bar/doc.pdf": b"doc",
+    }
+
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.core.get_page_content",
+            side_effect=lambda url, *args: contents[url],
+        ).start()
+
+        filepath = process_page_content(page_url, content, Path(folder))
+
+        soup = BeautifulSoup(Path(filepath).read_text(), features="html.parser")
+        assets_folder = "foo-bar-media_files"
+        assert soup.video.attrs["src"] == f"{assets_folder}/foo-bar-movie.mp4"
+        assert soup.object.attrs["data"] == f"{assets_folder}/foo-bar-doc.pdf"
+        assert Path(folder, assets_folder, "foo-bar-doc.pdf").read_bytes() == b"doc"
+
+    patch.stopall()
+
+
+def test_process_page_content_assets_differing_by_query_string():
+    page_url = "https://foo.bar/page"
+    content = b'<img src="/image.png?size=1"><img src="/image.png?size=2">'
+
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.core.get_page_content",
+            side_effect=lambda url, *args: url.encode(),
+        ).start()
+
+        filepath = process_page_content(page_url, content, Path(folder))
+
+        soup = BeautifulSoup(Path(filepath).read_text(), features="html.parser")
+        first_src, second_src = [image.attrs["src"] for image in soup.find_all("img")]
+        assert first_src != second_src, "it shouldn't overwrite the first image"
+        assert (
+            Path(folder, first_src).read_bytes() == b"https://foo.bar/image.png?size=1"
+        )
+        assert (
+            Path(folder, second_src).read_bytes() == b"https://foo.bar/image.png?size=2"
+        )
+
+    patch.stopall()
+
+
+def test_process_page_content_resolves_references_against_base():
+    page_url = "https://foo.bar/blog/post"
+    content = (
+        b'<base href="/static/">'
+        b'<img src="img/a.png">'
+        b'<img src="../static/img/./a.png">'
+        b'<script src="HTTPS://FOO.BAR:443/static/app.js"></script>'
+    )
+
+    with TemporaryDirectory() as folder:
+        get_page_content_patch = patch(
+            "page_loader.core.get_page_content", return_value=b"content"
+        ).start()
+
+        filepath = process_page_content(page_url, content, Path(folder))
+
+        requested_urls = [call.args[0] for call in get_page_content_patch.mock_calls]
+        assert requested_urls == [
+            "https://foo.bar/static/app.js",
+            "https://foo.bar/static/img/a.png",
+        ], "it should request every normalized url once, the script first"
+        soup = BeautifulSoup(Path(filepath).read_text(), features="html.parser")
+        first_src, second_src = [image.attrs["src"] for image in soup.find_all("img")]
+        assert first_src == second_src
+
+    patch.stopall()
+
+
+def test_process_assets_skips_assets_after_deadline():
+    assets = PageAssets(
+        src=[
+            make_tag("img", src="/assets/foo.png"),
+            make_tag("img", src="/assets/bar.png"),
+        ],
+        href=[],
+    )
+    page_url = "https://foo.bar"
+    file_name_prefix = generate_file_name_prefix_from_page_url(page_url)
+    context = DownloadContext()
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.core.get_page_content",
+            side_effect=[b"foo", DeadlineExceeded()],
+        ).start()
+
+        processed_assets = process_assets(
+            assets=assets,
+            page_url=page_url,
+            file_name_prefix=file_name_prefix,
+            folder=folder,
+            context=context,
+        )
+
+        assert list(processed_assets.src) == [assets.src[0]]
+        assert context.failures == [
+            AssetFailure(
+                url="https://foo.bar/assets/bar.png", reason="page deadline is reached"
+            )
+        ]
+
+    patch.stopall()
+
+
+def test_process_assets_best_effort_keeps_failed_assets():
+    assets = PageAssets(
+        src=[
+            make_tag("img", src="/assets/foo.png"),
+            make_tag("img", src="/assets/bar.png"),
+        ],
+        href=[],
+    )
+    page_url = "https://foo.bar"
+    file_name_prefix = generate_file_name_prefix_from_page_url(page_url)
+    context = DownloadContext(options=DownloadOptions(best_effort=True))
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.core.get_page_content",
+            side_effect=[RuntimeError("not found"), b"bar"],
+        ).start()
+
+        processed_assets = process_assets(
+            assets=assets,
+            page_url=page_url,
+            file_name_prefix=file_name_prefix,
+            folder=folder,
+            context=context,
+        )
+
+        assert list(processed_assets.src) == [assets.src[1]]
+        assert context.failures == [
+            AssetFailure(url="https://foo.bar/assets/foo.png", reason="not found")
+        ]
+
+    patch.stopall()
+
+
+def test_process_assets_keeps_rejected_assets_without_failure():
+    assets = PageAssets(src=[make_tag("img", src="/assets/foo.png")], href=[])
+    page_url = "https://foo.bar"
+    context = DownloadContext()
+    with TemporaryDirectory() as folder:
+        patch("page_loader.core.get_page_content", side_effect=AssetRejected()).start()
+
+        processed_assets = process_assets(
+            assets=assets,
+            page_url=page_url,
+            file_name_prefix=generate_file_name_prefix_from_page_url(page_url),
+            folder=folder,
+            context=context,
+        )
+
+        assert processed_assets.src == {}
+        assert context.failures == []
+
+    patch.stopall()
+
+
+def test_process_assets_raises_on_failed_asset_by_default():
+    assets = PageAssets(src=[make_tag("img", src="/assets/foo.png")], href=[])
+    page_url = "https://foo.bar"
+    with TemporaryDirectory() as folder:
+        patch("page_loader.core.get_page_content", side_effect=RuntimeError()).start()
+
+        with pytest.raises(RuntimeError):
+            process_assets(
+                assets=assets,
+                page_url=page_url,
+                file_name_prefix=generate_file_name_prefix_from_page_url(page_url),
+                folder=folder,
+            )
+
+    patch.stopall()
+
+
+def test_download_with_report_returns_failed_assets():
+    with TemporaryDirectory() as folder:
+        page_url = "https://ru.hexlet.io/courses.html"
+        content = tests_resources_path("page_content_with_assets.html").read_text()
+
+        patch(
+            "page_loader.core.get_page_response",
+            return_value=make_page_response(content),
+        ).start()
+        patch(
+            "page_loader.core.get_page_content", side_effect=RuntimeError("not found")
+        ).start()
+
+        report = download_with_report(
+            page_url, Path(folder), DownloadOptions(best_effort=True)
+        )
+
+        assert (
+            Path(report.file_path).read_text()
+            == BeautifulSoup(content, features="html.parser").prettify()
+        ), "failed asset should keep its original url"
+        assert report.failures == [
+            AssetFailure(
+                url="https://ru.hexlet.io/assets/professions/nodejs.png",
+                reason="not found",
+            )
+        ]
+
+    patch.stopall()
+
+
 def test_update_page_assets_without_assets():
     content = "<h1>\n foo, bar!\n</h1>"
     soup = BeautifulSoup(content, features="html.parser")
@@ -500,6 +1081,24 @@ def test_update_page_assets_without_assets():
     assert updated_page_content == content
 
 
+def test_update_page_assets_in_place_updates_soup_tags():
+    soup = BeautifulSoup(
+        "<div><p>foo</p></div>" * 1000 + '<img src="/a.png">', features="html.parser"
+    )
+    image = soup.find("img")
+    assets = PageAssetsWithUpdatedAssets(
+        src={image: make_tag("img", src="page_files/a.png")}, href={}
+    )
+
+    copied_page_content = update_page_assets(soup, assets)
+    assert image.attrs["src"] == "/a.png", "the soup should be left untouched"
+
+    updated_page_content = update_page_assets(soup, assets, in_place=True)
+
+    assert image.attrs["src"] == "page_files/a.png"
+    assert updated_page_content == copied_page_content
+
+
 def test_update_page_assets_with_assets():
     content = tests_resources_path("page_content_with_assets.html").read_text()
     soup = BeautifulSoup(content, features="html.parser")
@@ -580,3 +1179,355 @@ def test_update_page_assets_with_scripts_and_links():
     ).read_text()
 
     assert updated_page_content == expected_page_content
+
+
+def test_download_with_skip_unchanged():
+    with TemporaryDirectory() as folder:
+        page_url = "https://ru.hexlet.io/courses.html"
+        folder_path = Path(folder)
+        options = DownloadOptions(skip_unchanged=True)
+        content = tests_resources_path("page_content_with_assets.html").read_bytes()
+        asset_content = tests_resources_path(
+            "assets/professions/nodejs.png"
+        ).read_bytes()
+        headers = {"ETag": '"v1"'}
+
+        get_page_response_patch = patch(
+            "page_loader.core.get_page_response",
+            side_effect=[
+                PageResponse(200, headers, content, "utf-8"),
+                PageResponse(304, headers, b"", None),
+                PageResponse(200, {}, content, "utf-8"),
+                PageResponse(200, {}, content + b"<p>new</p>", "utf-8"),
+            ],
+        ).start()
+        patch("page_loader.core.get_page_content", return_value=asset_content).start()
+        process_page_patch = patch(
+            "page_loader.core.process_page_content", wraps=process_page_content
+        ).start()
+
+        file_path = download(page_url, folder_path, options)
+        fingerprint_path = folder_path.joinpath("ru-hexlet-io-courses.fingerprint.json")
+        assert fingerprint_path.exists()
+        assert download(page_url, folder_path, options) == file_path
+        assert get_page_response_patch.call_args.kwargs["headers"] == {
+            "If-None-Match": '"v1"'
+        }
+        assert download(page_url, folder_path, options) == file_path
+        assert process_page_patch.call_count == 1, "unchanged page shouldn't be parsed"
+
+        download(page_url, folder_path, options)
+
+        assert process_page_patch.call_count == 2
+        assert "new" in Path(file_path).read_text()
+
+        patch.stopall()
+
+
+def test_download_with_skip_unchanged_redownloads_incomplete_page():
+    with TemporaryDirectory() as folder:
+        page_url = "https://ru.hexlet.io/courses.html"
+        folder_path = Path(folder)
+        options = DownloadOptions(skip_unchanged=True)
+        content = tests_resources_path("page_content_with_assets.html").read_bytes()
+
+        get_page_response_patch = patch(
+            "page_loader.core.get_page_response",
+            return_value=PageResponse(200, {"ETag": '"v1"'}, content, "utf-8"),
+        ).start()
+        patch("page_loader.core.get_page_content", return_value=b"png").start()
+
+        download(page_url, folder_path, options)
+        asset_path = next(folder_path.joinpath("ru-hexlet-io-courses_files").iterdir())
+        asset_path.unlink()
+        download(page_url, folder_path, options)
+
+        assert asset_path.exists()
+        assert get_page_response_patch.call_args.kwargs["headers"] is None
+
+        patch.stopall()
+
+
+def test_process_assets_inlines_small_assets():
+    assets = PageAssets(
+        src=[make_tag("img", src="/img/icon.svg"), make_tag("img", src="/img/a.jpg")],
+        href=[make_tag("link", href="/assets/styles.css", rel="stylesheet")],
+        srcset=[make_tag("img", srcset="/img/dot.png 1x")],
+    )
+    page_url = "https://foo.bar"
+    responses = {
+        "https://foo.bar/img/icon.svg": PageResponse(
+            200, {"Content-Type": "image/svg+xml; charset=utf-8"}, b"<svg/>", None
+        ),
+        "https://foo.bar/img/a.jpg": PageResponse(
+            200, {"Content-Type": "image/jpeg"}, b"x" * 100, None
+        ),
+        "https://foo.bar/assets/styles.css": PageResponse(
+            200, {"Content-Type": "text/css"}, b"p { background: url(dot.png) }", None
+        ),
+        "https://foo.bar/assets/dot.png": PageResponse(200, {}, b"png", None),
+        "https://foo.bar/img/dot.png": PageResponse(200, {}, b"png", None),
+    }
+    context = DownloadContext(options=DownloadOptions(inline_under=64))
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.core.get_page_response",
+            side_effect=lambda url, *args, **kwargs: responses[url],
+        ).start()
+
+        updated_assets = process_assets(
+            assets=assets,
+            page_url=page_url,
+            file_name_prefix=generate_file_name_prefix_from_page_url(page_url),
+            folder=folder,
+            context=context,
+        )
+
+        assets_folder = Path(folder).joinpath("foo-bar_files")
+        icon, picture = assets.src
+        assert (
+            updated_assets.src[icon].attrs["src"]
+            == "data:image/svg+xml;base64,PHN2Zy8+"
+        ), "mime type should be taken from the response headers"
+        assert updated_assets.src[picture].attrs["src"] == (
+            "foo-bar_files/foo-bar-img-a.jpg"
+        )
+        assert (
+            updated_assets.srcset[assets.srcset[0]].attrs["srcset"]
+            == "data:image/png;base64,cG5n 1x"
+        ), "mime type should be guessed by url without Content-Type"
+        assert sorted(path.name for path in assets_folder.iterdir()) == [
+            "foo-bar-assets-styles.css",
+            "foo-bar-img-a.jpg",
+        ], "stylesheets should be saved into files even if they are small"
+        assert (
+            assets_folder.joinpath("foo-bar-assets-styles.css").read_bytes()
+            == b"p { background: url(data:image/png;base64,cG5n) }"
+        )
+
+    patch.stopall()
+
+
+def test_download_with_report_emits_events():
+    with TemporaryDirectory() as folder:
+        page_url = "https://ru.hexlet.io/courses.html"
+        content = tests_resources_path("page_content_with_assets.html").read_bytes()
+        patch(
+            "page_loader.core.get_page_response",
+            return_value=make_page_response(content),
+        ).start()
+        patch("page_loader.core.get_page_content", return_value=b"png").start()
+        events = []
+
+        report = download_with_report(page_url, Path(folder), on_event=events.append)
+
+        asset_url = "https://ru.hexlet.io/assets/professions/nodejs.png"
+        assert [type(event) for event in events] == [
+            PageStarted,
+            AssetQueued,
+            AssetStarted,
+            AssetDone,
+            PageDone,
+        ]
+        assert events[1] == AssetQueued(page_url, asset_url)
+        assert events[3].bytes == 3
+        assert events[-1].file_path == report.file_path
+        assert events[-1].bytes == len(content)
+
+        patch.stopall()
+
+
+def test_iterate_download_events_ends_with_page_failed():
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.core.get_page_response", side_effect=RuntimeError("boom")
+        ).start()
+        patch("logging.Logger.error").start()
+
+        events = list(iterate_download_events("https://foo.bar", Path(folder)))
+
+        assert events == [
+            PageStarted("https://foo.bar"),
+            PageFailed("https://foo.bar", "boom"),
+        ]
+
+        patch.stopall()
+
+
+@pytest.mark.parametrize(
+    "content_type, page_head",
+    [
+        ("text/html; charset=windows-1251", ""),
+        ("text/html", '<meta charset="windows-1251">'),
+    ],
+)
+def test_download_decodes_page_with_declared_charset(content_type, page_head):
+    with TemporaryDirectory() as folder:
+        page = f"<html><head>{page_head}</head><body><p>Привет</p></body></html>"
+        patch(
+            "page_loader.core.get_page_response",
+            return_value=make_page_response(page.encode("cp1251"), content_type),
+        ).start()
+        bs4_patch = patch("page_loader.core.BeautifulSoup", wraps=BeautifulSoup).start()
+
+        file_path = download("https://foo.bar", Path(folder))
+
+        assert "Привет" in Path(file_path).read_text()
+        assert bs4_patch.call_args.kwargs["from_encoding"] == "cp1251"
+
+        patch.stopall()
+
+
+def test_localize_page_file():
+    with TemporaryDirectory() as folder:
+        page_url = "https://ru.hexlet.io/courses.html"
+        page_path = Path(folder).joinpath("saved.html")
+        page_path.write_bytes(
+            tests_resources_path("page_content_with_assets.html").read_bytes()
+        )
+        page_response_patch = patch("page_loader.core.get_page_response").start()
+        patch(
+            "page_loader.core.get_page_content",
+            return_value=tests_resources_path(
+                "assets/professions/nodejs.png"
+            ).read_bytes(),
+        ).start()
+        events = []
+
+        report = localize_page_file(
+            page_path, page_url, Path(folder), on_event=events.append
+        )
+
+        expected_file_path = Path(folder).joinpath("ru-hexlet-io-courses.html")
+        assert report.file_path == str(expected_file_path.resolve())
+        assert (
+            expected_file_path.read_text()
+            == tests_resources_path("updated_page_content_with_assets.html").read_text()
+        )
+        assert Path(folder, "ru-hexlet-io-courses_files").is_dir()
+        assert events[0] == PageStarted(page_url)
+        assert events[-1].bytes == page_path.stat().st_size
+        page_response_patch.assert_not_called()
+
+        patch.stopall()
+
+
+@pytest.mark.parametrize("processes", [0, 1])
+def test_localize_page_file_decodes_page_with_declared_charset(processes):
+    with TemporaryDirectory() as folder:
+        page_path = Path(folder).joinpath("saved.html")
+        page_path.write_bytes(
+            '<html><head><meta charset="windows-1251"></head>'
+            '<body><p>Привет</p><img src="/a.png"></body></html>'.encode("cp1251")
+        )
+        patch("page_loader.core.get_page_content", return_value=b"png").start()
+
+        report = localize_page_file(
+            str(page_path),
+            "https://foo.bar/page",
+            Path(folder),
+            DownloadOptions(processes=processes),
+        )
+
+        content = Path(report.file_path).read_text()
+        assert "Привет" in content
+        assert "foo-bar-page_files/foo-bar-a.png" in content
+
+        shutdown_process_pool()
+        patch.stopall()
+
+
+@pytest.mark.parametrize("processes", [0, 1])
+def test_localize_page_file_decodes_page_without_charset(processes):
+    with TemporaryDirectory() as folder:
+        page_path = Path(folder).joinpath("saved.html")
+        page_path.write_bytes("<html><body><p>café</p></body></html>".encode("cp1252"))
+
+        report = localize_page_file(
+            str(page_path),
+            "https://foo.bar/page",
+            Path(folder),
+            DownloadOptions(processes=processes),
+        )
+
+        assert "café" in Path(report.file_path).read_text()
+
+        shutdown_process_pool()
+
+
+def test_read_page_file_decodes_mapped_page():
+    with TemporaryDirectory() as folder:
+        page_path = Path(folder).joinpath("saved.html")
+        page_path.write_bytes("<p>Привет</p>".encode("utf-8"))
+        decode_patch = patch("page_loader.core.decode_page", wraps=decode_page).start()
+
+        assert read_page_file(page_path) == ("<p>Привет</p>", "utf-8")
+        assert isinstance(
+            decode_patch.call_args.args[0], mmap.mmap
+        ), "page should be decoded from the memory map without copying"
+
+        patch.stopall()
+
+
+def test_localize_page_file_makes_error_log_if_file_is_missing():
+    with TemporaryDirectory() as folder:
+        error_log_patch = patch("logging.Logger.error").start()
+        events = []
+
+        with pytest.raises(FileNotFoundError):
+            localize_page_file(
+                Path(folder).joinpath("missing.html"),
+                "https://foo.bar",
+                Path(folder),
+                on_event=events.append,
+            )
+
+        assert error_log_patch.called
+        assert isinstance(events[-1], PageFailed)
+
+        patch.stopall()
+
+
+def test_process_page_content_downloads_assets_by_priority():
+    content = (
+        b'<video src="/movie.mp4"></video><img src="/a.png">'
+        b'<link href="/app.webmanifest" rel="manifest">'
+        b'<link href="/style.css" rel="stylesheet"><script src="/app.js"></script>'
+    )
+
+    with TemporaryDirectory() as folder, TemporaryDirectory() as other_folder:
+        # sizes of the assets downloaded by the other tests
+        patch("page_loader.core.asset_sizes", AssetSizes()).start()
+        get_page_content_patch = patch(
+            "page_loader.core.get_page_content", return_value=b"content"
+        ).start()
+
+        process_page_content("https://foo.bar/page", content, Path(folder))
+        process_page_content(
+            "https://foo.bar/page",
+            content,
+            Path(other_folder),
+            DownloadContext.create(
+                DownloadOptions(
+                    asset_priority=lambda asset: 0 if asset.tag == "img" else 1
+                )
+            ),
+        )
+
+        requested_urls = [call.args[0] for call in get_page_content_patch.mock_calls]
+        assert requested_urls[:5] == [
+            "https://foo.bar/app.js",
+            "https://foo.bar/style.css",
+            "https://foo.bar/app.webmanifest",
+            "https://foo.bar/a.png",
+            "https://foo.bar/movie.mp4",
+        ]
+        assert requested_urls[5] == "https://foo.bar/a.png", "custom priority"
+        assert sorted(requested_urls[6:]) == [
+            "https://foo.bar/app.js",
+            "https://foo.bar/app.webmanifest",
+            "https://foo.bar/movie.mp4",
+            "https://foo.bar/style.css",
+        ]
+
+    patch.stopall()
@@ -0,0 +1,190 @@
+import time
+
+import pytest
+from page_loader.css import (
+    CssReference,
+    find_css_references,
+    localize_stylesheets,
+    rewrite_css,
+)
+
+
+@pytest.mark.parametrize(
+    "css, expected_urls",
+    [
+        pytest.param("a { background: url(bg.png) }", ["bg.png"], id="bare url"),
+        pytest.param('a { background: url( "bg.png" ) }', ["bg.png"], id="quoted"),
+        pytest.param("a { background: URL('bg.png') }", ["bg.png"], id="upper case"),
+        pytest.param('@import "base.css";', ["base.css"], id="import string"),
+        pytest.param("@import url(base.css) print;", ["base.css"], id="import url"),
+        pytest.param("/* url(old.png) */ a {}", [], id="comment"),
+        pytest.param('a { content: "url(x.png)" }', [], id="string"),
+        pytest.param("a { background: url(data:image/png;base64,AAA) }", [], id="data"),
+        pytest.param("a { filter: url(#blur) }", [], id="fragment"),
+        pytest.param("a { background: url() }", [], id="empty"),
+        pytest.param("/* unterminated url(x.png)", [], id="unterminated comment"),
+    ],
+)
+def test_find_css_references(css, expected_urls):
+    assert [reference.url for reference in find_css_references(css)] == expected_urls
+
+
+def test_find_css_references_marks_imports():
+    css = '@import "a.css"; @import url(b.css); p { background: url(c.png) }'
+
+    assert [reference.is_import for reference in find_css_references(css)] == [
+        True,
+        True,
+        False,
+    ]
+
+
+def test_find_css_references_positions():
+    css = "a{background:url('bg.png')}"
+
+    assert find_css_references(css) == [
+        CssReference(url="bg.png", start=18, end=24, is_import=False)
+    ]
+
+
+def test_find_css_references_is_linear():
+    rule = "a{background:url(/img/a.png)}/* c */b{content:'x'}"
+    small_css = rule * 500
+    large_css = rule * 50000
+
+    started_at = time.perf_counter()
+    find_css_references(small_css)
+    small_duration = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    references = find_css_references(large_css)
+    large_duration = time.perf_counter() - started_at
+
+    assert len(references) == 50000
+    # 100x input, generous bound to keep the test stable
+    assert large_duration < max(small_duration, 0.001) * 400
+
+
+def test_rewrite_css():
+    css = "@import 'a.css'; p { background: url(c.png) } q { background: url(d.png) }"
+    references = find_css_references(css)
+
+    rewritten_css = rewrite_css(
+        css, references, {"a.css": "x-a.css", "c.png": "x-c.png"}
+    )
+
+    assert rewritten_css == (
+        "@import 'x-a.css'; p { background: url(x-c.png) } "
+        "q { background: url(d.png) }"
+    )
+
+
+def test_localize_stylesheets():
+    stylesheets = {
+        "https://foo.bar/css/main.css": (
+            b"@import 'base.css'; p { background: url(../img/bg.png) }"
+            b" q { background: url(missing.png) }"
+        ),
+    }
+    remote_files = {
+        "https://foo.bar/css/base.css": b"body { font: url(/fonts/a.woff2) }",
+        "https://foo.bar/img/bg.png": b"png",
+        "https://foo.bar/fonts/a.woff2": b"woff2",
+    }
+    fetched_urls = []
+
+    def fetch(urls):
+        fetched_urls.append(urls)
+        return [remote_files.get(url) for url in urls]
+
+    def get_file_name(url):
+        return url.rsplit("/", 1)[-1]
+
+    rewritten, downloaded = localize_stylesheets(
+        stylesheets,
+        fetch,
+        get_file_name,
+        known_file_names={"https://foo.bar/css/main.css": "main.css"},
+    )
+
+    assert rewritten == {
+        "https://foo.bar/css/main.css": (
+            b"@import 'base.css'; p { background: url(bg.png) }"
+            b" q { background: url(missing.png) }"
+        )
+    }
+    assert downloaded == {
+        "base.css": b"body { font: url(a.woff2) }",
+        "bg.png": b"png",
+        "a.woff2": b"woff2",
+    }
+    assert len(fetched_urls) == 2, "every import level is fetched at once"
+
+
+def test_localize_stylesheets_stops_on_import_cycle():
+    stylesheets = {"https://foo.bar/a.css": "@import 'b.css';"}
+
+    def fetch(urls):
+        return ["@import 'a.css';" for __ in urls]
+
+    rewritten, downloaded = localize_stylesheets(
+        stylesheets,
+        fetch,
+        lambda url: "local-" + url.rsplit("/", 1)[-1],
+        known_file_names={"https://foo.bar/a.css": "local-a.css"},
+    )
+
+    assert rewritten == {"https://foo.bar/a.css": "@import 'local-b.css';"}
+    assert downloaded == {"local-b.css": "@import 'local-a.css';"}
+
+
+def test_localize_stylesheets_embeds_data_uris():
+    stylesheets = {
+        "https://foo.bar/main.css": "@import 'base.css'; p { background: url(a.png) }"
+    }
+    remote_files = {"https://foo.bar/base.css": "", "https://foo.bar/a.png": "png"}
+
+    rewritten, downloaded = localize_stylesheets(
+        stylesheets,
+        lambda urls: [remote_files[url] for url in urls],
+        lambda url: url.rsplit("/", 1)[-1],
+        get_data_uri=lambda url, content: f"data:,{content}",
+    )
+
+    assert rewritten == {
+        "https://foo.bar/main.css": (
+            "@import 'base.css'; p { background: url(data:,png) }"
+        )
+    }
+    assert downloaded == {"base.css": ""}, "imports should stay files"
+
+
+def test_localize_stylesheets_stores_files_with_store():
+    stylesheets = {
+        "https://foo.bar/main.css": (
+            "@import 'base.css'; p { background: url(a.png) } i { src: url(f.ttf) }"
+        )
+    }
+    remote_files = {"https://foo.bar/base.css": "b { background: url(a.png) }"}
+    stored_urls = []
+
+    def store(urls):
+        stored_urls.extend(urls)
+        return ["stored-a.png" if url.endswith("a.png") else None for url in urls]
+
+    rewritten, downloaded = localize_stylesheets(
+        stylesheets,
+        lambda urls: [remote_files[url] for url in urls],
+        lambda url: url.rsplit("/", 1)[-1],
+        store=store,
+    )
+
+    assert stored_urls == ["https://foo.bar/a.png", "https://foo.bar/f.ttf"]
+    assert rewritten == {
+        "https://foo.bar/main.css": (
+            "@import 'base.css'; p { background: url(stored-a.png) } "
+            "i { src: url(f.ttf) }"
+        )
+    }
+    assert downloaded == {
+        "base.css": "b { background: url(stored-a.png) }"
+    }, "only imports should be returned, stored files aren't"
@@ -0,0 +1,86 @@
+from bs4 import BeautifulSoup
+from page_loader.discovery import AssetRule, find_assets, is_same_domain
+from tests.helpers import make_tag
+
+PAGE_URL = "https://foo.bar/page"
+
+
+def make_soup(content: str) -> BeautifulSoup:
+    return BeautifulSoup(content, features="html.parser")
+
+
+def test_find_assets_groups_assets_by_attribute():
+    soup = make_soup(
+        '<script src="/app.js"></script>'
+        '<img src="/a.png" srcset="/a.png 1x, /a@2x.png 2x">'
+        '<link href="/style.css" rel="stylesheet">'
+        '<object data="/movie.swf"></object>'
+    )
+
+    assets = find_assets(soup, PAGE_URL)
+
+    assert assets == {
+        "src": [
+            make_tag("img", src="/a.png", srcset="/a.png 1x, /a@2x.png 2x"),
+            make_tag("script", src="/app.js"),
+        ],
+        "href": [make_tag("link", href="/style.css", rel="stylesheet")],
+        "data": [make_tag("object", data="/movie.swf")],
+        "srcset": [make_tag("img", src="/a.png", srcset="/a.png 1x, /a@2x.png 2x")],
+    }, "it should keep rules order first and page order second"
+
+
+def test_find_assets_finds_media_and_frames():
+    soup = make_soup(
+        '<video src="/movie.mp4"><source src="/movie.webm"></video>'
+        '<audio src="https://foo.bar/song.mp3"></audio>'
+        '<iframe src="/embed.html"></iframe>'
+        '<iframe src="https://video.host/embed"></iframe>'
+    )
+
+    assets = find_assets(soup, PAGE_URL)
+
+    assert [tag.attrs["src"] for tag in assets["src"]] == [
+        "/movie.mp4",
+        "https://foo.bar/song.mp3",
+        "/movie.webm",
+        "/embed.html",
+    ], "it should skip media and frames of other domains"
+
+
+def test_find_assets_skips_tags_without_references():
+    soup = make_soup(
+        '<link rel="preconnect"><link href="" rel="icon">'
+        '<img alt="no source"><script>alert(1)</script>'
+    )
+
+    assets = find_assets(soup, PAGE_URL)
+
+    assert not any(assets.values()), "it shouldn't fail on tags without references"
+
+
+def test_find_assets_checks_references():
+    soup = make_soup(
+        '<img src="data:image/png;base64,AA"><img src="#">'
+        '<script src="js/app.js"></script>'
+        '<script src="//cdn.other.com/lib.js"></script>'
+        '<script src="HTTPS://FOO.BAR/main.js"></script>'
+    )
+
+    assets = find_assets(soup, PAGE_URL)
+
+    assert [tag.attrs["src"] for tag in assets["src"]] == [
+        "js/app.js",
+        "HTTPS://FOO.BAR/main.js",
+    ]
+
+
+def test_find_assets_with_custom_rules():
+    soup = make_soup('<video poster="/poster.png" src="/movie.mp4"></video>')
+    rules = (AssetRule("video", "poster", is_same_domain),)
+
+    assets = find_assets(soup, PAGE_URL, rules)
+
+    assert assets == {
+        "poster": [make_tag("video", poster="/poster.png", src="/movie.mp4")]
+    }
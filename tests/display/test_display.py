@@ -0,0 +1,50 @@
+from io import StringIO
+
+import pytest
+from page_loader.display import ProgressDisplay, format_size
+from page_loader.events import (
+    AssetDone,
+    AssetFailed,
+    AssetProgress,
+    AssetQueued,
+    PageDone,
+    PageStarted,
+)
+
+PAGE_URL = "https://foo.bar"
+
+
+@pytest.mark.parametrize(
+    "size, expected",
+    [(0, "0B"), (1000, "1000B"), (1536, "1.5K"), (3 * 1024**2, "3.0M")],
+)
+def test_format_size(size, expected):
+    assert format_size(size) == expected
+
+
+def test_progress_display_aggregates_assets():
+    stream = StringIO()
+    display = ProgressDisplay(refresh_interval=0, file=stream, check_tty=False)
+
+    display(PageStarted(PAGE_URL))
+    display(AssetQueued(PAGE_URL, "https://foo.bar/a.png"))
+    display(AssetQueued(PAGE_URL, "https://foo.bar/b.png"))
+    display(AssetProgress(PAGE_URL, "https://foo.bar/a.png", 1024, 2048))
+    display(AssetDone(PAGE_URL, "https://foo.bar/a.png", 2048, 0.1))
+    display(AssetFailed(PAGE_URL, "https://foo.bar/b.png", "boom"))
+    display(PageDone(PAGE_URL, "/var/tmp/foo-bar.html", 100, 0.2))
+    display.close()
+
+    last_line = stream.getvalue().split("\r")[-1]
+    assert last_line.startswith(f"Downloading {PAGE_URL}")
+    assert "2/2 assets, 2.0K" in last_line
+
+
+def test_progress_display_is_rate_limited():
+    stream = StringIO()
+    display = ProgressDisplay(refresh_interval=60, file=stream, check_tty=False)
+
+    for index in range(100):
+        display(AssetQueued(PAGE_URL, f"https://foo.bar/{index}.png"))
+
+    assert stream.getvalue().count("\r") <= 2, "it should redraw once per interval"
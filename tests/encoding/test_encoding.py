@@ -0,0 +1,82 @@
+import codecs
+
+import pytest
+from page_loader.encoding import (
+    decode_page,
+    detect_encoding,
+    get_header_charset,
+    normalize_charset,
+    prescan_charset,
+)
+
+
+@pytest.mark.parametrize(
+    "charset, expected",
+    [
+        ("UTF8", "utf-8"),
+        (" windows-1251 ", "cp1251"),
+        ("ISO-8859-1", "cp1252"),
+        ("us-ascii", "cp1252"),
+        ("no-such-charset", None),
+    ],
+)
+def test_normalize_charset(charset, expected):
+    assert normalize_charset(charset) == expected
+
+
+@pytest.mark.parametrize(
+    "content_type, expected",
+    [
+        ("text/html; charset=utf-8", "utf-8"),
+        ('text/html; Charset="KOI8-R"', "koi8-r"),
+        ("text/html", None),
+        (None, None),
+    ],
+)
+def test_get_header_charset(content_type, expected):
+    assert get_header_charset(content_type) == expected
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        (b'<html><head><meta charset="windows-1251">', "cp1251"),
+        (
+            b'<meta http-equiv="Content-Type" content="text/html; charset=Shift_JIS">',
+            "shift_jis",
+        ),
+        (b"<meta charset=utf-16>", "utf-8"),
+        (b"<html><head><title>foo</title>", None),
+        (b" " * 1024 + b"<meta charset=cp1251>", None),
+    ],
+)
+def test_prescan_charset(content, expected):
+    assert prescan_charset(content) == expected
+
+
+def test_detect_encoding():
+    content = b"<meta charset=cp1251>"
+
+    assert detect_encoding(content, "text/html; charset=koi8-r") == "koi8-r"
+    assert (
+        detect_encoding(content, "text/html") == "cp1251"
+    ), "<meta> charset should be used without header charset"
+    assert (
+        detect_encoding(codecs.BOM_UTF8 + content, "text/html; charset=cp1251") is None
+    ), "byte order mark should be left to the parser"
+
+
+@pytest.mark.parametrize(
+    "content, encoding, expected",
+    [
+        ("Привет".encode("cp1251"), "cp1251", ("Привет", "cp1251")),
+        ("Привет".encode("utf-8"), None, ("Привет", "utf-8")),
+        ("café".encode("cp1252"), None, ("café", "cp1252")),
+        ("café".encode("cp1252"), "utf-8", ("café", "cp1252")),
+        (codecs.BOM_UTF8 + "café".encode("utf-8"), None, ("café", "utf-8-sig")),
+        ("café".encode("utf-16"), "cp1251", ("café", "utf-16")),
+        (b"caf\x81", None, ("caf\ufffd", "cp1252")),
+    ],
+)
+def test_decode_page(content, encoding, expected):
+    assert decode_page(content, encoding) == expected
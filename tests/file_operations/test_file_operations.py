@@ -1,17 +1,18 @@
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from unittest.mock import mock_open, patch
+from urllib.parse import urljoin
 
 import pytest
 from page_loader.file_operations import (
+    FileNameIndex,
+    FileWriter,
     create_assets_folder,
-    generate_file_name,
     generate_file_name_from_page_url,
     generate_file_name_prefix_from_page_url,
-    save_assets,
+    mapped_file,
     save_file,
 )
-from tests.paths import tests_resources_path
 
 
 @pytest.mark.parametrize(
@@ -76,64 +77,51 @@ def test_generate_file_name_prefix_from_page_url(page_url, expected_file_name):
     ), "wrong file name prefix was generated"
 
 
-def test_generate_file_name():
-    page_url = "https://ru.hexlet.io/courses"
-    file_name_prefix = "foo-bar"
-    src = "/assets/professions/nodejs.png"
+def test_file_name_index_keeps_name_of_url():
+    file_names = FileNameIndex("foo-bar", "https://foo.bar/page")
 
-    file_name = generate_file_name(file_name_prefix, src, page_url)
-
-    expected_file_name = "foo-bar-assets-professions-nodejs.png"
-
-    assert file_name == expected_file_name
-
-
-def test_generate_file_name_href_with_full_link():
-    page_url = "https://ru.hexlet.io/courses"
-    file_name_prefix = "foo-bar"
-    src = "https://ru.hexlet.io/packs/js/runtime.js"
-
-    file_name = generate_file_name(file_name_prefix, src, page_url)
-
-    expected_file_name = "ru-hexlet-io-packs-js-runtime.js"
-
-    assert file_name == expected_file_name
-
-
-def test_generate_file_name_link():
-    page_url = "https://ru.hexlet.io/courses"
-    file_name_prefix = "ru-hexlet-io-courses"
-    src = "/courses"
-
-    file_name = generate_file_name(file_name_prefix, src, page_url)
-
-    expected_file_name = "ru-hexlet-io-courses.html"
-
-    assert file_name == expected_file_name
+    file_name = file_names.get_file_name("https://foo.bar/assets/image.png")
 
+    assert file_name == "foo-bar-assets-image.png"
+    assert (
+        file_names.get_file_name("https://foo.bar/assets/image.png") == file_name
+    ), "it should return the same name for the same url"
 
-def test_generate_file_name_full_link():
-    page_url = "https://ru.hexlet.io/courses"
-    file_name_prefix = "ru-hexlet-io-courses"
-    src = "https://ru.hexlet.io/courses"
 
-    file_name = generate_file_name(file_name_prefix, src, page_url)
+@pytest.mark.parametrize(
+    "reference, expected_file_name",
+    [
+        pytest.param("/img/logo.png?v=2", "foo-bar-img-logo.png", id="query"),
+        pytest.param("img/logo.png", "foo-bar-docs-img-logo.png", id="relative"),
+        pytest.param("/a/b.c/d", "foo-bar-a-b-c-d.html", id="dotted directory"),
+        pytest.param("/a/b.c/d.css", "foo-bar-a-b-c-d.css", id="dotted directory file"),
+        pytest.param(
+            "https://cdn.foo.bar/app.js#main", "cdn-foo-bar-app.js", id="other host"
+        ),
+    ],
+)
+def test_file_name_index_names_files_by_url_path(reference, expected_file_name):
+    page_url = "https://foo.bar/docs/page"
+    file_names = FileNameIndex("foo-bar", page_url)
 
-    expected_file_name = "ru-hexlet-io-courses.html"
+    file_name = file_names.get_file_name(urljoin(page_url, reference))
 
     assert file_name == expected_file_name
 
 
-def test_generate_file_name_link_with_extension():
-    page_url = "https://ru.hexlet.io/courses"
-    file_name_prefix = "ru-hexlet-io-courses"
-    src = "https://ru.hexlet.io/lessons.rss"
+def test_file_name_index_disambiguates_colliding_names():
+    file_names = FileNameIndex("foo-bar", "https://foo.bar/page")
 
-    file_name = generate_file_name(file_name_prefix, src, page_url)
+    first_file_name = file_names.get_file_name("https://foo.bar/image.png?size=1")
+    second_file_name = file_names.get_file_name("https://foo.bar/image.png?size=2")
 
-    expected_file_name = "ru-hexlet-io-lessons.rss"
-
-    assert file_name == expected_file_name
+    assert first_file_name == "foo-bar-image.png"
+    assert second_file_name.startswith("foo-bar-image-")
+    assert second_file_name.endswith(".png")
+    assert len(second_file_name) == len("foo-bar-image-.png") + 8
+    assert (
+        file_names.get_file_name("https://foo.bar/image.png?size=2") == second_file_name
+    ), "it should remember disambiguated names"
 
 
 def test_save_file_str():
@@ -193,20 +181,86 @@ def test_save_file_makes_error_log_on_write_fail():
     patch.stopall()
 
 
-def test_save_assets():
-    asset_content = tests_resources_path("assets/professions/nodejs.png").read_bytes()
+def test_save_file_leaves_no_temporary_file_on_write_fail():
+    with TemporaryDirectory() as folder:
+        patch("logging.Logger.error").start()
+        patch("os.replace", side_effect=OSError("disk is full")).start()
+
+        with pytest.raises(OSError):
+            save_file("foo", "foo.html", Path(folder))
+
+        assert list(Path(folder).iterdir()) == []
+
+    patch.stopall()
+
 
+def test_file_writer_writes_files():
     with TemporaryDirectory() as folder:
-        assets_folder = Path(folder).resolve().joinpath("foo-bar_files")
-        assets_folder.mkdir(parents=True, exist_ok=True)
+        files = {Path(folder, f"{index}.txt"): f"file {index}" for index in range(10)}
 
-        asset_path = assets_folder.joinpath("foo-bar-assets-professions-nodejs.png")
-        assets_path_with_content = {asset_path: asset_content}
+        with FileWriter() as writer:
+            for filepath, content in files.items():
+                writer.write(filepath, content)
+            writer.write(Path(folder, "bytes.bin"), b"bytes")
 
-        save_assets(assets_path_with_content)
+        for filepath, content in files.items():
+            assert filepath.read_text() == content
+        assert Path(folder, "bytes.bin").read_bytes() == b"bytes"
+        assert len(list(Path(folder).iterdir())) == 11, "it should leave no temp files"
 
-        assert asset_path.exists()
-        assert asset_path.read_bytes() == asset_content
+
+def test_file_writer_checks_folder_once():
+    with TemporaryDirectory() as folder:
+        is_dir_patch = patch("pathlib.Path.is_dir", return_value=True).start()
+
+        with FileWriter() as writer:
+            writer.write(Path(folder, "foo.txt"), "foo")
+            writer.write(Path(folder, "bar.txt"), "bar")
+
+        assert is_dir_patch.call_count == 1
+
+    patch.stopall()
+
+
+def test_file_writer_raises_first_error_on_close():
+    patch("logging.Logger.error").start()
+    writer = FileWriter()
+    writer.write(Path("/folder/that/does/not/exists/foo.txt"), "foo")
+
+    with pytest.raises(RuntimeError) as runtime_error:
+        writer.close()
+
+    assert str(runtime_error.value) == "folder for content saving doesn't exist!"
+
+    patch.stopall()
+
+
+@pytest.mark.parametrize(
+    "durability, expected_fsync_calls",
+    [
+        ("none", 0),
+        # two files and the folder on close
+        ("page", 3),
+        # every file with its folder
+        ("file", 4),
+    ],
+)
+def test_file_writer_durability(durability, expected_fsync_calls):
+    with TemporaryDirectory() as folder:
+        fsync_patch = patch("os.fsync").start()
+
+        with FileWriter(durability) as writer:
+            writer.write(Path(folder, "foo.txt"), "foo")
+            writer.write(Path(folder, "bar.txt"), "bar")
+
+        assert fsync_patch.call_count == expected_fsync_calls
+
+    patch.stopall()
+
+
+def test_file_writer_raises_on_unknown_durability():
+    with pytest.raises(ValueError):
+        FileWriter("always")
 
 
 def test_create_assets_folder():
@@ -232,3 +286,17 @@ def test_create_assets_folder_makes_error_log_on_exception():
     )
 
     patch.stopall()
+
+
+def test_mapped_file():
+    with TemporaryDirectory() as folder:
+        filepath = Path(folder).joinpath("page.html")
+        filepath.write_bytes(b"<html></html>")
+        empty_filepath = Path(folder).joinpath("empty.html")
+        empty_filepath.touch()
+
+        with mapped_file(filepath) as content:
+            assert content[:6] == b"<html>"
+            assert len(content) == 13
+        with mapped_file(empty_filepath) as content:
+            assert content == b""
@@ -0,0 +1,98 @@
+import pytest
+from page_loader.filters import AssetFilter, get_mime_type, parse_size
+from tests.helpers import make_tag
+
+
+@pytest.mark.parametrize(
+    "asset_filter, tag, expected",
+    [
+        pytest.param(AssetFilter(), make_tag("img", src="/a.png"), True, id="no rules"),
+        pytest.param(
+            AssetFilter(exclude_tags=frozenset({"img"})),
+            make_tag("img", src="/a.png"),
+            False,
+            id="excluded tag",
+        ),
+        pytest.param(
+            AssetFilter(include_tags=frozenset({"link"})),
+            make_tag("script", src="/a.js"),
+            False,
+            id="not included tag",
+        ),
+        pytest.param(
+            AssetFilter(exclude_rels=frozenset({"canonical", "preconnect"})),
+            make_tag("link", href="/courses", rel="canonical"),
+            False,
+            id="excluded rel",
+        ),
+        pytest.param(
+            AssetFilter(include_rels=frozenset({"stylesheet"})),
+            make_tag("link", href="/a.css", rel="stylesheet"),
+            True,
+            id="included rel",
+        ),
+        pytest.param(
+            AssetFilter(include_rels=frozenset({"stylesheet"})),
+            make_tag("img", src="/a.png"),
+            True,
+            id="rel rules are ignored for tags without rel",
+        ),
+    ],
+)
+def test_asset_filter_accepts_tag(asset_filter, tag, expected):
+    assert asset_filter.accepts_tag(tag) == expected
+
+
+def test_asset_filter_accepts_url():
+    asset_filter = AssetFilter(
+        include_urls=(r"^https://foo\.bar/",), exclude_urls=(r"\.mp4$", r"/ads/")
+    )
+
+    assert asset_filter.accepts_url("https://foo.bar/a.png")
+    assert not asset_filter.accepts_url("https://baz.bar/a.png")
+    assert not asset_filter.accepts_url("https://foo.bar/movie.mp4")
+    assert not asset_filter.accepts_url("https://foo.bar/ads/banner.png")
+
+
+def test_asset_filter_accepts_mime_type():
+    asset_filter = AssetFilter(
+        include_mime_types=("image/*", "text/css"), exclude_mime_types=("image/gif",)
+    )
+
+    assert asset_filter.accepts_mime_type("image/png")
+    assert asset_filter.accepts_mime_type("text/css")
+    assert not asset_filter.accepts_mime_type("image/gif")
+    assert not asset_filter.accepts_mime_type("video/mp4")
+    assert asset_filter.accepts_mime_type(None), "unknown mime type is accepted"
+
+
+def test_asset_filter_accepts_size():
+    assert AssetFilter().accepts_size(10**9)
+    assert AssetFilter(max_size=1024).accepts_size(1024)
+    assert not AssetFilter(max_size=1024).accepts_size(1025)
+
+
+@pytest.mark.parametrize(
+    "content_type, url, expected_mime_type",
+    [
+        ("text/css; charset=utf-8", "https://foo.bar/a", "text/css"),
+        ("IMAGE/PNG", "https://foo.bar/a", "image/png"),
+        (None, "https://foo.bar/a.png", "image/png"),
+        (None, "https://foo.bar/a", None),
+    ],
+)
+def test_get_mime_type(content_type, url, expected_mime_type):
+    assert get_mime_type(content_type, url) == expected_mime_type
+
+
+@pytest.mark.parametrize(
+    "value, expected_size",
+    [("512", 512), ("100K", 102400), ("1.5M", 1572864), ("2GB", 2 * 1024**3)],
+)
+def test_parse_size(value, expected_size):
+    assert parse_size(value) == expected_size
+
+
+def test_parse_size_raises_on_invalid_size():
+    with pytest.raises(ValueError):
+        parse_size("foo")
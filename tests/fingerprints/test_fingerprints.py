@@ -0,0 +1,74 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from page_loader.fingerprints import (
+    Fingerprint,
+    create_fingerprint,
+    get_content_hash,
+    get_fingerprint_path,
+    is_page_saved,
+    load_fingerprint,
+    save_fingerprint,
+)
+
+PAGE_URL = "https://foo.bar/page"
+
+
+def test_get_fingerprint_path():
+    assert get_fingerprint_path("/var/tmp", PAGE_URL) == Path(
+        "/var/tmp/foo-bar-page.fingerprint.json"
+    )
+
+
+def test_get_conditional_headers():
+    assert Fingerprint("hash").get_conditional_headers() == {}
+    assert Fingerprint(
+        "hash", etag='"v1"', last_modified="Wed, 21 Oct 2015 07:28:00 GMT"
+    ).get_conditional_headers() == {
+        "If-None-Match": '"v1"',
+        "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+    }
+
+
+def test_create_save_and_load_fingerprint():
+    with TemporaryDirectory() as folder:
+        folder_path = Path(folder)
+        assets_folder = folder_path.joinpath("foo-bar-page_files")
+        assets_folder.mkdir()
+        assets_folder.joinpath("foo-bar-b.css").write_text("b")
+        assets_folder.joinpath("foo-bar-a.png").write_bytes(b"a")
+        folder_path.joinpath("foo-bar-page.html").write_text("<html></html>")
+
+        fingerprint = create_fingerprint(
+            b"<html></html>", folder_path, PAGE_URL, {"ETag": '"v1"'}
+        )
+        path = get_fingerprint_path(folder_path, PAGE_URL)
+        save_fingerprint(path, fingerprint)
+
+        assert fingerprint == Fingerprint(
+            content_hash=get_content_hash(b"<html></html>"),
+            assets=(
+                "foo-bar-page_files/foo-bar-a.png",
+                "foo-bar-page_files/foo-bar-b.css",
+            ),
+            etag='"v1"',
+        )
+        assert load_fingerprint(path) == fingerprint
+        assert is_page_saved(folder_path, PAGE_URL, fingerprint)
+
+        assets_folder.joinpath("foo-bar-a.png").unlink()
+
+        assert not is_page_saved(
+            folder_path, PAGE_URL, fingerprint
+        ), "page with missing assets should be downloaded again"
+
+
+def test_load_fingerprint_ignores_missing_and_broken_files():
+    with TemporaryDirectory() as folder:
+        path = Path(folder).joinpath("foo-bar-page.fingerprint.json")
+
+        assert load_fingerprint(path) is None
+
+        path.write_text("{not json")
+
+        assert load_fingerprint(path) is None
@@ -1,6 +1,20 @@
+from typing import Optional, Union
+
 from bs4 import BeautifulSoup
 from bs4.element import Tag
+from page_loader.comm import PageResponse
 
 
 def make_tag(name: str, **kwargs) -> Tag:
     return BeautifulSoup().new_tag(name, **kwargs)
+
+
+def make_page_response(
+    content: Union[bytes, str], content_type: Optional[str] = "text/html"
+) -> PageResponse:
+    if isinstance(content, str):
+        content = content.encode()
+    headers = {"Content-Type": content_type} if content_type else {}
+    return PageResponse(
+        status_code=200, headers=headers, content=content, encoding=None
+    )
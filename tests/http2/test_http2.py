@@ -0,0 +1,131 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from page_loader import http2
+from page_loader.comm import AssetRejected, get_page_content, get_page_response
+from page_loader.filters import AssetFilter
+from page_loader.options import DownloadOptions
+from requests import Response
+
+httpx = pytest.importorskip("httpx")
+
+HTTP2_OPTIONS = DownloadOptions(http2=True, backoff_base=0)
+
+
+def make_client(handler) -> "httpx.Client":
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def make_requests_response(content: bytes) -> Response:
+    response = Response()
+    response.status_code = 200
+    response.raw = BytesIO(content)
+    return response
+
+
+@pytest.fixture(autouse=True)
+def reset_client():
+    http2.close_client()
+    yield
+    http2.close_client()
+    patch.stopall()
+
+
+def test_get_page_content_uses_http2_client():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=b"body {}")
+
+    patch("page_loader.http2.get_client", return_value=make_client(handler)).start()
+    get_patch = patch("requests.Session.get").start()
+
+    content = get_page_content("https://foo.bar/style.css", HTTP2_OPTIONS)
+
+    assert content == b"body {}"
+    assert str(requests[0].url) == "https://foo.bar/style.css"
+    get_patch.assert_not_called()
+
+
+def test_get_page_response_sends_headers_with_http2():
+    def handler(request):
+        assert request.headers["If-None-Match"] == '"v1"'
+        return httpx.Response(304)
+
+    patch("page_loader.http2.get_client", return_value=make_client(handler)).start()
+
+    response = get_page_response(
+        "https://foo.bar", HTTP2_OPTIONS, headers={"If-None-Match": '"v1"'}
+    )
+
+    assert response.status_code == 304
+
+
+def test_http2_rejects_asset_mid_stream():
+    def handler(request):
+        return httpx.Response(200, content=b"x" * 4096)
+
+    patch("page_loader.http2.get_client", return_value=make_client(handler)).start()
+
+    with pytest.raises(AssetRejected):
+        get_page_content(
+            "https://foo.bar/a.png",
+            HTTP2_OPTIONS,
+            asset_filter=AssetFilter(max_size=1024),
+        )
+
+
+def test_plain_http_urls_are_requested_with_http1():
+    client_patch = patch("page_loader.http2.get_client").start()
+    patch("requests.Session.get", return_value=make_requests_response(b"foo")).start()
+
+    assert get_page_content("http://foo.bar", HTTP2_OPTIONS) == b"foo"
+    client_patch.assert_not_called()
+
+
+def test_http1_is_used_if_http2_is_not_installed():
+    patch("page_loader.http2.httpx", None).start()
+    warning_patch = patch("logging.Logger.warning").start()
+    get_patch = patch(
+        "requests.Session.get",
+        side_effect=lambda *args, **kwargs: make_requests_response(b"foo"),
+    ).start()
+
+    assert get_page_content("https://foo.bar", HTTP2_OPTIONS) == b"foo"
+    assert get_page_content("https://foo.bar/a", HTTP2_OPTIONS) == b"foo"
+
+    assert get_patch.call_count == 2
+    warning_patch.assert_called_once()
+
+
+def test_origin_falls_back_to_http1_after_protocol_error():
+    def handler(request):
+        raise httpx.RemoteProtocolError("broken h2 stream", request=request)
+
+    patch("page_loader.http2.get_client", return_value=make_client(handler)).start()
+    patch("logging.Logger.warning").start()
+    get_patch = patch(
+        "requests.Session.get",
+        side_effect=lambda *args, **kwargs: make_requests_response(b"foo"),
+    ).start()
+
+    assert get_page_content("https://foo.bar/a", HTTP2_OPTIONS) == b"foo"
+    assert get_page_content("https://foo.bar/b", HTTP2_OPTIONS) == b"foo"
+
+    assert get_patch.call_count == 2
+    assert http2.get_http2_client("https://foo.bar/c") is None
+
+
+def test_http2_client_follows_redirects():
+    def handler(request):
+        if request.url.path == "/old":
+            return httpx.Response(301, headers={"Location": "https://foo.bar/new"})
+        return httpx.Response(200, content=b"moved")
+
+    client = http2.create_client(httpx.MockTransport(handler))
+    patch("page_loader.http2.get_client", return_value=client).start()
+
+    assert get_page_content("https://foo.bar/old", HTTP2_OPTIONS) == b"moved"
+    assert client.max_redirects == 30
@@ -0,0 +1,33 @@
+from page_loader.context import DownloadContext
+from page_loader.inlining import get_data_uri, make_data_uri
+from page_loader.options import DownloadOptions
+
+
+def test_make_data_uri():
+    assert make_data_uri(b"png", "image/png") == "data:image/png;base64,cG5n"
+    assert make_data_uri("<svg/>", "image/svg+xml") == (
+        "data:image/svg+xml;base64,PHN2Zy8+"
+    )
+
+
+def test_get_data_uri():
+    context = DownloadContext(options=DownloadOptions(inline_under=4))
+    context.record_mime_type("https://foo.bar/a.png", "image/png")
+    context.record_mime_type("https://foo.bar/b", None)
+
+    assert get_data_uri("https://foo.bar/a.png", b"png", context) == (
+        "data:image/png;base64,cG5n"
+    )
+    assert (
+        get_data_uri("https://foo.bar/a.png", b"png!", context) is None
+    ), "assets of inline_under size and larger should be saved into files"
+    assert (
+        get_data_uri("https://foo.bar/b", b"b", context) is None
+    ), "assets of unknown mime type should be saved into files"
+
+
+def test_get_data_uri_without_inline_under():
+    context = DownloadContext()
+    context.record_mime_type("https://foo.bar/a.png", "image/png")
+
+    assert get_data_uri("https://foo.bar/a.png", b"png", context) is None
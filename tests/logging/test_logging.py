@@ -0,0 +1,87 @@
+import json
+import logging
+from io import StringIO
+from logging.handlers import QueueHandler
+
+from page_loader.logging import (
+    LoggingSettings,
+    configure_logging,
+    get_logger,
+    stop_logging,
+)
+
+
+def test_get_logger_does_not_add_handlers():
+    # command line tests may have configured logging
+    stop_logging()
+    logger = get_logger("page_loader.foo")
+    get_logger("page_loader.foo")
+
+    assert logger.handlers == []
+    assert (
+        logging.getLogger("page_loader").handlers == []
+    ), "logging should be configured by the command line only"
+
+
+def test_configure_logging_adds_one_queue_handler():
+    configure_logging(LoggingSettings(), StringIO())
+    configure_logging(LoggingSettings(), StringIO())
+
+    handlers = logging.getLogger("page_loader").handlers
+    assert len(handlers) == 1
+    assert isinstance(handlers[0], QueueHandler)
+
+    stop_logging()
+    assert logging.getLogger("page_loader").handlers == []
+
+
+def test_configured_records_propagate_to_root_handlers(caplog):
+    configure_logging(LoggingSettings(level="INFO"), StringIO())
+
+    with caplog.at_level(logging.INFO):
+        get_logger("page_loader.foo").info("info record")
+    stop_logging()
+
+    assert [record.getMessage() for record in caplog.records] == ["info record"]
+
+
+def test_configure_logging_text_records():
+    stream = StringIO()
+    configure_logging(LoggingSettings(level="warning"), stream)
+    logger = get_logger("page_loader.foo")
+
+    logger.info("info record")
+    logger.warning("warning record")
+    stop_logging()
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1, "it should skip records below the level"
+    assert lines[0].endswith("page_loader.foo - WARNING - warning record")
+
+
+def test_configure_logging_json_records():
+    stream = StringIO()
+    configure_logging(LoggingSettings(level="INFO", json=True), stream)
+    logger = get_logger("page_loader.foo")
+
+    logger.info(
+        "asset is downloaded",
+        extra={
+            "page_url": "https://foo.bar",
+            "asset_url": "https://foo.bar/a.png",
+            "bytes": 10,
+            "duration": 0.5,
+        },
+    )
+    logger.error("plain record")
+    stop_logging()
+
+    first_entry, second_entry = map(json.loads, stream.getvalue().splitlines())
+    assert first_entry["logger"] == "page_loader.foo"
+    assert first_entry["level"] == "INFO"
+    assert first_entry["message"] == "asset is downloaded"
+    assert first_entry["page_url"] == "https://foo.bar"
+    assert first_entry["asset_url"] == "https://foo.bar/a.png"
+    assert first_entry["bytes"] == 10
+    assert first_entry["duration"] == 0.5
+    assert "asset_url" not in second_entry
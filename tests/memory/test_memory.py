@@ -0,0 +1,62 @@
+import pytest
+from benchmarks.memory import (
+    MB,
+    MEMORY_BUDGETS,
+    PageMemory,
+    StageMemory,
+    check_budgets,
+    generate_page,
+    get_asset_urls,
+    profile_page,
+)
+
+pytestmark = pytest.mark.memory
+
+
+def test_generate_page():
+    page = generate_page(MB // 4)
+
+    assert MB // 4 <= len(page) < MB // 4 + 1024
+    assert get_asset_urls(page)[:2] == [
+        "https://foo.bar/images/0.png",
+        "https://foo.bar/images/40.png",
+    ]
+
+
+def test_check_budgets():
+    page_memory = PageMemory(
+        page_size=MB,
+        stages=[
+            StageMemory("parse", current=MB, peak=int(MEMORY_BUDGETS["parse"] * MB)),
+            StageMemory("rewrite", current=MB, peak=100 * MB),
+        ],
+        peak_rss=None,
+    )
+
+    violations = check_budgets(page_memory)
+
+    assert len(violations) == 1
+    assert violations[0].startswith("rewrite of 1.0M page uses 100.0M per page MB")
+
+
+@pytest.mark.parametrize("size", [0.25, 0.5])
+def test_pipeline_stages_fit_memory_budgets(size):
+    page_memory = profile_page(int(size * MB), rss=False)
+
+    assert [stage.name for stage in page_memory.stages] == [
+        "parse",
+        "find assets",
+        "download assets",
+        "rewrite",
+        "write",
+    ]
+    assert check_budgets(page_memory) == []
+
+
+def test_pipeline_peak_rss_fits_memory_budget():
+    page_memory = profile_page(MB // 2)
+
+    if page_memory.peak_rss is None:
+        pytest.skip("peak RSS isn't measured on this platform")
+    assert page_memory.peak_rss > 0
+    assert check_budgets(page_memory) == []
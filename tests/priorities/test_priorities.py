@@ -0,0 +1,60 @@
+import pytest
+from page_loader.priorities import (
+    AssetInfo,
+    AssetSizes,
+    get_default_priority,
+    load_priority,
+)
+
+
+def test_get_default_priority_orders_assets():
+    assets = [
+        AssetInfo("https://foo.bar/movie.mp4", "source"),
+        AssetInfo("https://foo.bar/huge.png", "img", size=10 * 1024 * 1024),
+        AssetInfo("https://foo.bar/big.png", "img"),
+        AssetInfo("https://foo.bar/small.png", "img", size=1024),
+        AssetInfo("https://foo.bar/app.webmanifest", "link", frozenset({"manifest"})),
+        AssetInfo("https://foo.bar/app.js?v=1", "script"),
+        AssetInfo("https://foo.bar/theme", "link", frozenset({"stylesheet"})),
+    ]
+
+    ordered = sorted(assets, key=get_default_priority)
+
+    assert [asset.url.rsplit("/", 1)[-1] for asset in ordered] == [
+        "app.js?v=1",
+        "theme",
+        "app.webmanifest",
+        "small.png",
+        "big.png",
+        "huge.png",
+        "movie.mp4",
+    ]
+
+
+def test_get_default_priority_guesses_category_by_url():
+    assert get_default_priority(
+        AssetInfo("https://foo.bar/main.css", "link")
+    ) < get_default_priority(AssetInfo("https://foo.bar/logo.svg", "link"))
+    assert get_default_priority(
+        AssetInfo("https://foo.bar/logo.svg", "link")
+    ) < get_default_priority(AssetInfo("https://foo.bar/intro.webm", "embed"))
+
+
+def test_asset_sizes_forgets_oldest_urls():
+    sizes = AssetSizes(max_size=2)
+    sizes.record("a", 1)
+    sizes.record("b", 2)
+    sizes.record("a", 3)
+    sizes.record("c", 4)
+
+    assert (sizes.get("a"), sizes.get("b"), sizes.get("c")) == (3, None, 4)
+
+
+def test_load_priority():
+    assert (
+        load_priority("page_loader.priorities:get_default_priority")
+        is get_default_priority
+    )
+    for path in ("get_default_priority", "page_loader.foo:bar", "os:missing"):
+        with pytest.raises(ValueError):
+            load_priority(path)
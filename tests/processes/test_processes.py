@@ -0,0 +1,76 @@
+import time
+from pathlib import Path
+
+import pytest
+from page_loader.processes import (
+    get_process_pool,
+    shutdown_process_pool,
+    stored_content,
+    temporary_file,
+    wait_for_task,
+)
+from page_loader.scheduling import DeadlineExceeded
+
+
+def sleeping_task(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def failing_task() -> None:
+    raise ValueError("broken page")
+
+
+def test_stored_content():
+    with stored_content(b"<h1>foo</h1>") as path:
+        assert Path(path).read_bytes() == b"<h1>foo</h1>"
+
+    assert not Path(path).exists(), "it should remove the file"
+
+
+def test_get_process_pool_reuses_pool():
+    pool = get_process_pool(2)
+
+    assert get_process_pool(2) is pool
+    assert get_process_pool(1) is not pool, "it should recreate pool of other size"
+
+    shutdown_process_pool()
+
+
+def test_temporary_file():
+    with temporary_file() as path:
+        assert Path(path).read_bytes() == b""
+
+    assert not Path(path).exists(), "it should remove the file"
+
+
+def test_wait_for_task_returns_task_result():
+    pool = get_process_pool(1)
+
+    assert wait_for_task(pool.submit(sleeping_task, 0), time.monotonic() + 30) == 0
+
+    shutdown_process_pool()
+
+
+def test_wait_for_task_raises_exception_of_task():
+    pool = get_process_pool(1)
+
+    with pytest.raises(ValueError, match="broken page"):
+        wait_for_task(pool.submit(failing_task))
+
+    shutdown_process_pool()
+
+
+def test_wait_for_task_stops_at_deadline():
+    pool = get_process_pool(1)
+    # the pool hands the worker one task more than it runs
+    busy_futures = [pool.submit(sleeping_task, 0.5) for _ in range(2)]
+    future = pool.submit(sleeping_task, 0)
+
+    with pytest.raises(DeadlineExceeded):
+        wait_for_task(future, time.monotonic() + 0.1)
+
+    assert future.cancelled(), "task waiting for the busy worker should be cancelled"
+    for busy_future in busy_futures:
+        busy_future.result()
+    shutdown_process_pool()
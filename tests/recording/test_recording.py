@@ -0,0 +1,186 @@
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+from page_loader import download
+from page_loader.comm import AssetRejected, get_page_content, get_page_response
+from page_loader.filters import AssetFilter
+from page_loader.options import DownloadOptions
+from page_loader.recording import (
+    BODIES_FILE,
+    NotRecorded,
+    RecordedResponse,
+    Recorder,
+    RecordingSettings,
+    Replayer,
+    configure_recording,
+)
+from requests import Response
+
+PAGE = b'<html><body><img src="/a.png"><img src="/b.png"></body></html>'
+IMAGE = b"\x89PNG image"
+CONTENTS = {
+    "https://foo.bar/": PAGE,
+    "https://foo.bar/a.png": IMAGE,
+    "https://foo.bar/b.png": IMAGE,
+}
+
+
+def make_response(content: bytes, **headers) -> Response:
+    response = Response()
+    response.status_code = 200
+    response.raw = BytesIO(content)
+    response.headers.update(headers)
+    return response
+
+
+def serve(url, *args, **kwargs) -> Response:
+    return make_response(CONTENTS[url], **{"Content-Type": "text/html"})
+
+
+@pytest.fixture(autouse=True)
+def reset_recording():
+    yield
+    configure_recording(RecordingSettings())
+    patch.stopall()
+
+
+def test_recorder_stores_identical_bodies_once():
+    with TemporaryDirectory() as corpus:
+        recorder = Recorder(Path(corpus))
+        for url in ("https://foo.bar/a.png", "https://foo.bar/b.png"):
+            recorder.record(url, None, RecordedResponse(200, {}, IMAGE, None))
+        recorder.close()
+
+        assert Path(corpus, BODIES_FILE).read_bytes() == IMAGE
+        replayer = Replayer(Path(corpus))
+        assert len(replayer) == 2
+        assert replayer.get("https://foo.bar/b.png", None).content == IMAGE
+        replayer.close()
+
+
+def test_replayer_keys_conditional_requests_by_headers():
+    with TemporaryDirectory() as corpus:
+        recorder = Recorder(Path(corpus))
+        recorder.record("https://foo.bar", None, RecordedResponse(200, {}, PAGE, None))
+        recorder.record(
+            "https://foo.bar",
+            {"If-None-Match": '"v1"'},
+            RecordedResponse(304, {"ETag": '"v1"'}, b"", None),
+        )
+        recorder.close()
+        replayer = Replayer(Path(corpus))
+
+        response = replayer.get("https://foo.bar", {"If-None-Match": '"v1"'})
+
+        assert response.status_code == 304
+        assert response.headers["etag"] == '"v1"', "headers are case insensitive"
+        assert replayer.get("https://foo.bar", None).content == PAGE
+        with pytest.raises(NotRecorded):
+            replayer.get("https://foo.bar", {"If-None-Match": '"v2"'})
+        replayer.close()
+
+
+def test_replayer_sleeps_recorded_and_synthetic_latency():
+    with TemporaryDirectory() as corpus:
+        recorder = Recorder(Path(corpus))
+        recorder.record(
+            "https://foo.bar", None, RecordedResponse(200, {}, PAGE, None, latency=0.2)
+        )
+        recorder.close()
+        sleep_patch = patch("page_loader.recording.time.sleep").start()
+
+        replayer = Replayer(Path(corpus), latency_scale=0.5, latency=0.01)
+        replayer.get("https://foo.bar", None)
+        Replayer(Path(corpus)).get("https://foo.bar", None)
+
+        sleep_patch.assert_called_once_with(pytest.approx(0.11))
+
+
+def test_replayer_raises_if_corpus_does_not_exist():
+    patch("logging.Logger.error").start()
+
+    with TemporaryDirectory() as folder:
+        with pytest.raises(RuntimeError):
+            Replayer(Path(folder))
+
+
+def test_configure_recording_rejects_record_with_replay():
+    with pytest.raises(ValueError):
+        configure_recording(RecordingSettings(record=Path("a"), replay=Path("b")))
+
+
+def test_get_page_response_is_recorded_and_replayed():
+    with TemporaryDirectory() as corpus:
+        configure_recording(RecordingSettings(record=Path(corpus)))
+        patch("requests.Session.get", side_effect=serve).start()
+        recorded = get_page_response("https://foo.bar/")
+        patch.stopall()
+
+        configure_recording(RecordingSettings(replay=Path(corpus)))
+        get_patch = patch("requests.Session.get").start()
+        replayed = get_page_response("https://foo.bar/")
+
+        get_patch.assert_not_called()
+        assert replayed.content == recorded.content == PAGE
+        assert replayed.headers["Content-Type"] == "text/html"
+        assert replayed.elapsed == pytest.approx(recorded.elapsed, abs=1e-6)
+
+
+def test_asset_rejection_is_recorded_and_replayed():
+    asset_filter = AssetFilter(max_size=4)
+    with TemporaryDirectory() as corpus:
+        configure_recording(RecordingSettings(record=Path(corpus)))
+        patch("requests.Session.get", side_effect=serve).start()
+        with pytest.raises(AssetRejected):
+            get_page_content("https://foo.bar/a.png", asset_filter=asset_filter)
+        patch.stopall()
+
+        configure_recording(RecordingSettings(replay=Path(corpus)))
+        with pytest.raises(AssetRejected):
+            get_page_content("https://foo.bar/a.png")
+
+
+def test_replay_checks_asset_filter():
+    with TemporaryDirectory() as corpus:
+        configure_recording(RecordingSettings(record=Path(corpus)))
+        patch("requests.Session.get", side_effect=serve).start()
+        get_page_content("https://foo.bar/a.png")
+        patch.stopall()
+
+        configure_recording(RecordingSettings(replay=Path(corpus)))
+        with pytest.raises(AssetRejected):
+            get_page_content(
+                "https://foo.bar/a.png", asset_filter=AssetFilter(max_size=4)
+            )
+
+
+def test_replay_of_not_recorded_request_fails():
+    patch("logging.Logger.error").start()
+    with TemporaryDirectory() as corpus:
+        Recorder(Path(corpus)).close()
+        configure_recording(RecordingSettings(replay=Path(corpus)))
+
+        with pytest.raises(NotRecorded):
+            get_page_content("https://foo.bar/", DownloadOptions(retries=0))
+
+
+def test_replayed_download_matches_recorded_one():
+    with TemporaryDirectory() as corpus:
+        with TemporaryDirectory() as recorded_folder:
+            configure_recording(RecordingSettings(record=Path(corpus)))
+            patch("requests.Session.get", side_effect=serve).start()
+            recorded_path = download("https://foo.bar/", Path(recorded_folder))
+            patch.stopall()
+            recorded_page = Path(recorded_path).read_bytes()
+
+        with TemporaryDirectory() as replayed_folder:
+            configure_recording(RecordingSettings(replay=Path(corpus)))
+            get_patch = patch("requests.Session.get").start()
+            replayed_path = download("https://foo.bar/", Path(replayed_folder))
+
+            get_patch.assert_not_called()
+            assert Path(replayed_path).read_bytes() == recorded_page
+            assert len(list(Path(replayed_folder).rglob("*.png"))) == 2
@@ -0,0 +1,161 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from page_loader.scheduling import (
+    DeadlineExceeded,
+    HostLimiter,
+    HostScheduler,
+    SchedulerSettings,
+    parse_retry_after,
+)
+
+
+@pytest.mark.parametrize(
+    "value, expected_delay",
+    [
+        pytest.param(None, None, id="missing header"),
+        pytest.param("120", 120.0, id="seconds"),
+        pytest.param("100000", 300.0, id="seconds are capped"),
+        pytest.param("Thu, 01 Jan 1970 00:01:40 GMT", 40.0, id="http date"),
+        pytest.param("foo", None, id="broken header"),
+    ],
+)
+def test_parse_retry_after(value, expected_delay):
+    assert parse_retry_after(value, now=60.0) == expected_delay
+
+
+def test_host_limiter_grows_concurrency_on_success():
+    limiter = HostLimiter("foo.bar", SchedulerSettings(initial_concurrency=2))
+
+    for __ in range(4):
+        limiter.acquire()
+        limiter.release(200, latency=0.1)
+
+    stats = limiter.stats()
+    assert stats.concurrency_limit > 2
+    assert stats.successes == 4
+    assert stats.in_flight == 0
+
+
+def test_host_limiter_backs_off_on_throttling():
+    limiter = HostLimiter("foo.bar", SchedulerSettings(initial_concurrency=8))
+
+    limiter.acquire()
+    limiter.release(429, latency=0.1, headers={"Retry-After": "5"})
+
+    stats = limiter.stats()
+    assert stats.concurrency_limit == 4
+    assert stats.throttled == 1
+    assert stats.blocked_until is not None
+
+
+def test_host_limiter_backs_off_on_latency_spike():
+    limiter = HostLimiter("foo.bar", SchedulerSettings(initial_concurrency=8))
+
+    limiter.acquire()
+    limiter.release(200, latency=0.1)
+    limit_before_spike = limiter.stats().concurrency_limit
+    limiter.acquire()
+    limiter.release(200, latency=1.0)
+
+    assert limiter.stats().concurrency_limit == limit_before_spike / 2
+
+
+def test_host_limiter_never_goes_below_min_concurrency():
+    limiter = HostLimiter(
+        "foo.bar", SchedulerSettings(initial_concurrency=2, min_concurrency=1)
+    )
+
+    for __ in range(3):
+        limiter.acquire()
+        limiter.release(None, latency=0.1)
+
+    assert limiter.stats().concurrency_limit == 1
+    assert limiter.stats().errors == 3
+
+
+def test_host_limiter_waits_for_tokens():
+    limiter = HostLimiter("foo.bar", SchedulerSettings(rate=100.0, burst=1))
+    wait_patch = patch.object(
+        limiter._condition, "wait", wraps=limiter._condition.wait
+    ).start()
+
+    started_at = time.monotonic()
+    limiter.acquire()
+    limiter.release(200, latency=0.0)
+    limiter.acquire()
+    limiter.release(200, latency=0.0)
+
+    assert wait_patch.called, "second request should wait for a token"
+    assert time.monotonic() - started_at >= 0.005
+
+    patch.stopall()
+
+
+def test_host_scheduler_keeps_limiter_per_host():
+    scheduler = HostScheduler()
+
+    with scheduler.slot("https://foo.bar/a.png") as slot:
+        slot.record(200, {})
+    with scheduler.slot("https://FOO.bar/b.png") as slot:
+        slot.record(503, {})
+    with scheduler.slot("https://baz.bar/c.png") as slot:
+        slot.record(200, {})
+
+    stats = scheduler.stats()
+    assert set(stats) == {"foo.bar", "baz.bar"}
+    assert stats["foo.bar"].requests == 2
+    assert stats["foo.bar"].throttled == 1
+
+
+def test_host_scheduler_measures_latency_to_headers():
+    scheduler = HostScheduler()
+    release_patch = patch.object(HostLimiter, "release", autospec=True).start()
+
+    with scheduler.slot("https://foo.bar/movie.mp4") as slot:
+        slot.record(200, {})
+        # the body is read after the headers
+        time.sleep(0.2)
+
+    __, status_code, latency, headers = release_patch.call_args.args
+    assert status_code == 200
+    assert latency < 0.1, "reading the body shouldn't count as the host latency"
+
+    patch.stopall()
+
+
+def test_host_scheduler_records_failed_request():
+    scheduler = HostScheduler()
+
+    with pytest.raises(RuntimeError):
+        with scheduler.slot("https://foo.bar/a.png"):
+            raise RuntimeError()
+
+    assert scheduler.stats()["foo.bar"].errors == 1
+
+
+def test_host_limiter_gives_up_at_once_when_retry_after_ends_after_deadline():
+    limiter = HostLimiter("foo.bar", SchedulerSettings())
+    limiter.acquire()
+    limiter.release(429, latency=0.1, headers={"Retry-After": "8"})
+
+    started_at = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(deadline=time.monotonic() + 1)
+
+    assert time.monotonic() - started_at < 0.5
+
+
+def test_host_limiter_waits_for_free_slot_until_deadline():
+    limiter = HostLimiter(
+        "foo.bar", SchedulerSettings(initial_concurrency=1, min_concurrency=1)
+    )
+    limiter.acquire()
+
+    started_at = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(deadline=time.monotonic() + 0.1)
+
+    assert 0.1 <= time.monotonic() - started_at < 0.5
+    assert limiter.stats().in_flight == 1
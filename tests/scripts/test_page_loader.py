@@ -1,14 +1,29 @@
 import os
+from datetime import datetime, timezone
 from os import getcwd
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest.mock import patch
 
 import pytest
+from page_loader.batch import BatchQueue
+from page_loader.context import AssetFailure, DownloadReport
+from page_loader.filters import AssetFilter
+from page_loader.logging import LoggingSettings
+from page_loader.priorities import get_category_priority, get_default_priority
+from page_loader.recording import RecordingSettings
 from page_loader.scripts.page_loader import (
+    BatchConfig,
     PageLoaderConfig,
+    ServeConfig,
+    SnapshotConfig,
     main,
     process_arguments,
+    process_batch_arguments,
+    process_serve_arguments,
+    process_snapshot_arguments,
 )
+from page_loader.snapshots import SnapshotStore
 
 
 def test_process_arguments_without_output():
@@ -38,6 +53,178 @@ def test_process_arguments_with_output():
     ), "it should convert -o value into Path"
 
 
+def test_process_arguments_with_download_options():
+    config = process_arguments(
+        ["https://foo.bar", "--retries=5", "--read-timeout=3", "--page-deadline=60"]
+    )
+
+    assert config.options.retries == 5
+    assert config.options.read_timeout == 3
+    assert config.options.page_deadline == 60
+    assert config.options.process_css
+
+
+def test_process_arguments_without_css_assets():
+    config = process_arguments(["https://foo.bar", "--no-css-assets"])
+
+    assert not config.options.process_css
+
+
+def test_process_arguments_with_logging_settings():
+    assert process_arguments(["https://foo.bar"]).logging == LoggingSettings()
+
+    config = process_arguments(["https://foo.bar", "--log-level=info", "--log-json"])
+
+    assert config.logging == LoggingSettings(level="INFO", json=True)
+
+
+def test_process_arguments_with_durability():
+    assert process_arguments(["https://foo.bar"]).options.durability == "none"
+
+    config = process_arguments(["https://foo.bar", "--durability", "page"])
+
+    assert config.options.durability == "page"
+
+
+def test_process_arguments_with_processes():
+    assert process_arguments(["https://foo.bar"]).options.processes == 0
+
+    config = process_arguments(["https://foo.bar", "--processes=4"])
+
+    assert config.options.processes == 4
+
+
+def test_process_arguments_with_srcset_policy():
+    assert process_arguments(["https://foo.bar"]).options.srcset_policy == "all"
+
+    config = process_arguments(["https://foo.bar", "--srcset", "largest"])
+
+    assert config.options.srcset_policy == "largest"
+
+
+def test_process_arguments_with_asset_priority():
+    config = process_arguments(
+        [
+            "https://foo.bar",
+            "--asset-priority=page_loader.priorities:get_category_priority",
+        ]
+    )
+
+    assert config.options.asset_priority is get_category_priority
+    assert process_arguments(["https://foo.bar"]).options.asset_priority is (
+        get_default_priority
+    )
+
+
+def test_process_arguments_with_http2():
+    assert not process_arguments(["https://foo.bar"]).options.http2
+    assert process_arguments(["https://foo.bar", "--http2"]).options.http2
+
+
+def test_process_arguments_with_recording():
+    assert process_arguments(["https://foo.bar"]).recording == RecordingSettings()
+
+    config = process_arguments(["https://foo.bar", "--record", "corpus"])
+    assert config.recording == RecordingSettings(record=Path("corpus"))
+
+    config = process_arguments(
+        ["https://foo.bar", "--replay", "corpus", "--replay-latency", "recorded"]
+    )
+    assert config.recording == RecordingSettings(
+        replay=Path("corpus"), latency_scale=1.0
+    )
+
+    config = process_arguments(
+        ["https://foo.bar", "--replay", "corpus", "--replay-latency", "0.05"]
+    )
+    assert config.recording.latency == 0.05
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        ["--record", "a", "--replay", "b"],
+        ["--replay", "corpus", "--replay-latency", "slow"],
+        ["--replay", "corpus", "--replay-latency", "-1"],
+    ],
+)
+def test_process_arguments_with_invalid_recording(arguments):
+    patch("sys.stderr").start()
+
+    with pytest.raises(SystemExit):
+        process_arguments(["https://foo.bar", *arguments])
+
+    patch.stopall()
+
+
+def test_process_arguments_with_asset_filter():
+    config = process_arguments(
+        [
+            "https://foo.bar",
+            "--exclude-rel=canonical",
+            "--exclude-rel=preconnect",
+            "--include-mime=image/*",
+            "--max-asset-size=2M",
+        ]
+    )
+
+    assert config.options.asset_filter == AssetFilter(
+        exclude_rels=frozenset({"canonical", "preconnect"}),
+        include_mime_types=("image/*",),
+        max_size=2 * 1024**2,
+    )
+
+
+def test_process_arguments_with_page_file():
+    config = process_arguments(
+        ["--from-file", "saved.html", "--base-url", "https://foo.bar/page"]
+    )
+
+    assert config.page_url == "https://foo.bar/page"
+    assert config.from_file == Path("saved.html")
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        pytest.param(["--from-file", "saved.html"], id="page file without base url"),
+        pytest.param([], id="no page url"),
+    ],
+)
+def test_process_arguments_without_page_url(arguments):
+    patch("sys.stderr").start()
+
+    with pytest.raises(SystemExit):
+        process_arguments(arguments)
+
+    patch.stopall()
+
+
+def test_process_serve_arguments():
+    config = process_serve_arguments(["-o=/var/tmp", "--port=9000", "--workers=8"])
+
+    assert config == ServeConfig(
+        output=Path("/var/tmp"),
+        host="127.0.0.1",
+        port=9000,
+        workers=8,
+        queue_size=1000,
+    )
+
+
+def test_main_serve():
+    patch("sys.argv", ["page-loader", "serve", "--port=9000"]).start()
+    serve_patch = patch("page_loader.scripts.page_loader.serve").start()
+
+    with pytest.raises(SystemExit) as exit_err:
+        main()
+
+    assert exit_err.value.code == os.EX_OK
+    assert serve_patch.call_args.kwargs["port"] == 9000
+
+    patch.stopall()
+
+
 def test_main():
     page_url = "https://foo.bar"
     output = "/var/tmp"
@@ -49,7 +236,10 @@ def test_main():
         return_value=PageLoaderConfig(page_url=page_url, output=Path(output)),
     ).start()
     # fix download behavior
-    patch("page_loader.scripts.page_loader.download", return_value=file_path).start()
+    patch(
+        "page_loader.scripts.page_loader.download_with_report",
+        return_value=DownloadReport(file_path=file_path, failures=[]),
+    ).start()
     print_patch = patch("builtins.print").start()
 
     with pytest.raises(SystemExit) as exit_err:
@@ -61,6 +251,69 @@ def test_main():
     print_patch.assert_called_once_with(file_path)
 
 
+def test_main_prints_failed_assets():
+    page_url = "https://foo.bar"
+    file_path = "foo.html"
+
+    patch(
+        "page_loader.scripts.page_loader.process_arguments",
+        return_value=PageLoaderConfig(page_url=page_url, output=Path("/var/tmp")),
+    ).start()
+    patch(
+        "page_loader.scripts.page_loader.download_with_report",
+        return_value=DownloadReport(
+            file_path=file_path,
+            failures=[AssetFailure(url=f"{page_url}/a.png", reason="boom")],
+        ),
+    ).start()
+    print_patch = patch("builtins.print").start()
+
+    with pytest.raises(SystemExit) as exit_err:
+        main()
+
+    assert exit_err.value.code == os.EX_OK
+    assert print_patch.call_args_list[0].args == (file_path,)
+    assert print_patch.call_args_list[1].args == (
+        f"failed asset {page_url}/a.png: boom",
+    )
+
+    patch.stopall()
+
+
+def test_main_with_page_file():
+    page_url = "https://foo.bar"
+    file_path = "foo.html"
+
+    patch(
+        "page_loader.scripts.page_loader.process_arguments",
+        return_value=PageLoaderConfig(
+            page_url=page_url, output=Path("/var/tmp"), from_file=Path("saved.html")
+        ),
+    ).start()
+    download_patch = patch(
+        "page_loader.scripts.page_loader.download_with_report"
+    ).start()
+    localize_patch = patch(
+        "page_loader.scripts.page_loader.localize_page_file",
+        return_value=DownloadReport(file_path=file_path, failures=[]),
+    ).start()
+    print_patch = patch("builtins.print").start()
+
+    with pytest.raises(SystemExit) as exit_err:
+        main()
+
+    assert exit_err.value.code == os.EX_OK
+    assert localize_patch.call_args.args[:3] == (
+        Path("saved.html"),
+        page_url,
+        Path("/var/tmp"),
+    )
+    download_patch.assert_not_called()
+    print_patch.assert_called_once_with(file_path)
+
+    patch.stopall()
+
+
 def test_main_with_exception():
     # make process_arguments raise
     patch(
@@ -72,3 +325,97 @@ def test_main_with_exception():
 
     # it should exit with EX_SOFTWARE code as execution wasn't successful
     assert exit_err.value.code == os.EX_SOFTWARE
+
+
+def test_process_batch_arguments():
+    with TemporaryDirectory() as folder:
+        urls_path = Path(folder).joinpath("urls.txt")
+        urls_path.write_text("https://foo.bar/b\n\nhttps://foo.bar/c\n")
+
+        add_config = process_batch_arguments(
+            ["add", "queue.sqlite", "https://foo.bar/a", f"--from-file={urls_path}"]
+        )
+    work_config = process_batch_arguments(
+        [
+            "work",
+            "queue.sqlite",
+            "-o=/var/tmp",
+            "--lease=30",
+            "--retries=5",
+            "--concurrency=8",
+        ]
+    )
+
+    assert add_config == BatchConfig(
+        command="add",
+        queue=Path("queue.sqlite"),
+        urls=("https://foo.bar/a", "https://foo.bar/b", "https://foo.bar/c"),
+    )
+    assert work_config.output == Path("/var/tmp")
+    assert work_config.lease == 30
+    assert work_config.concurrency == 8
+    assert work_config.options.retries == 5
+
+
+def test_process_batch_ingest_arguments():
+    config = process_batch_arguments(
+        ["ingest", "queue.sqlite", "sitemap.xml.gz", "--since=2024-01-31"]
+    )
+
+    assert config.urls == ("sitemap.xml.gz",)
+    assert config.since == datetime(2024, 1, 31, tzinfo=timezone.utc)
+    assert process_batch_arguments(["ingest", "queue.sqlite", "a.xml"]).since is None
+
+
+def test_main_batch():
+    with TemporaryDirectory() as folder:
+        queue_path = f"{folder}/queue.sqlite"
+        patch(
+            "sys.argv", ["page-loader", "batch", "add", queue_path, "https://foo.bar"]
+        ).start()
+
+        with pytest.raises(SystemExit) as exit_err:
+            main()
+
+        assert exit_err.value.code == os.EX_OK
+        assert BatchQueue(Path(queue_path)).stats()["pending"] == 1
+
+    patch.stopall()
+
+
+def test_process_snapshot_arguments():
+    save_config = process_snapshot_arguments(
+        ["save", "store", "https://foo.bar/a", "--retries=5"]
+    )
+    materialize_config = process_snapshot_arguments(
+        ["materialize", "store", "3", "-o=/var/tmp"]
+    )
+    prune_config = process_snapshot_arguments(["prune", "store", "--keep=7"])
+
+    assert save_config.urls == ("https://foo.bar/a",)
+    assert save_config.options.retries == 5
+    assert materialize_config == SnapshotConfig(
+        command="materialize", root=Path("store"), version=3, output=Path("/var/tmp")
+    )
+    assert prune_config.keep == 7
+
+
+def test_main_snapshot():
+    with TemporaryDirectory() as folder:
+        page_folder = Path(folder).joinpath("pages")
+        page_folder.mkdir()
+        page_folder.joinpath("foo-bar.html").write_text("<html></html>")
+        SnapshotStore(Path(folder, "store")).save(page_folder, ["https://foo.bar"])
+        patch(
+            "sys.argv", ["page-loader", "snapshot", "list", f"{folder}/store"]
+        ).start()
+        print_patch = patch("builtins.print").start()
+
+        with pytest.raises(SystemExit) as exit_err:
+            main()
+
+        assert exit_err.value.code == os.EX_OK
+        assert print_patch.call_args.args[0].startswith("1\t")
+        assert print_patch.call_args.args[0].endswith("1 pages\t1 files\t13B stored")
+
+    patch.stopall()
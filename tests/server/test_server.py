@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+from page_loader.context import AssetFailure, DownloadReport
+from page_loader.server import (
+    JobQueue,
+    JobStatus,
+    QueueFullError,
+    create_server,
+)
+
+
+def make_request(url: str, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = Request(url, data=data, method="POST" if data else "GET")
+    try:
+        with urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as http_error:
+        return http_error.code, json.loads(http_error.read())
+
+
+@pytest.fixture
+def server():
+    with TemporaryDirectory() as folder:
+        server = create_server(folder, port=0, workers=2)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+        server.jobs.stop()
+
+
+def test_job_queue_runs_download():
+    with TemporaryDirectory() as folder:
+        download_patch = patch(
+            "page_loader.server.download_with_report",
+            return_value=DownloadReport(
+                file_path="/foo/bar.html",
+                failures=[AssetFailure(url="https://foo.bar/a.png", reason="404")],
+            ),
+        ).start()
+        jobs = JobQueue(output=folder, workers=1)
+        jobs.start()
+
+        job = jobs.submit("https://foo.bar")
+        assert job.finished.wait(5)
+        jobs.stop()
+
+        download_patch.assert_called_once_with(
+            "https://foo.bar", jobs.output, jobs.options
+        )
+        assert job.status == JobStatus.DONE
+        assert job.file_path == "/foo/bar.html"
+        assert job.to_dict()["failures"] == [
+            {"url": "https://foo.bar/a.png", "reason": "404"}
+        ]
+
+    patch.stopall()
+
+
+def test_job_queue_marks_failed_job():
+    with TemporaryDirectory() as folder:
+        patch(
+            "page_loader.server.download_with_report",
+            side_effect=RuntimeError("boom"),
+        ).start()
+        patch("logging.Logger.error").start()
+        jobs = JobQueue(output=folder, workers=1)
+        jobs.start()
+
+        job = jobs.submit("https://foo.bar")
+        assert job.finished.wait(5)
+        jobs.stop()
+
+        assert job.status == JobStatus.FAILED
+        assert job.error == "RuntimeError('boom')"
+
+    patch.stopall()
+
+
+def test_job_queue_raises_when_full():
+    # workers aren't started, so nothing leaves the queue
+    jobs = JobQueue(output="/tmp", workers=1, queue_size=1)
+    jobs.submit("https://foo.bar")
+
+    with pytest.raises(QueueFullError):
+        jobs.submit("https://foo.bar/baz")
+
+
+def test_server_submits_and_waits_for_job(server):
+    patch(
+        "page_loader.server.download_with_report",
+        return_value=DownloadReport(file_path="/foo/bar.html", failures=[]),
+    ).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    status, job = make_request(f"{base_url}/jobs", {"url": "https://foo.bar"})
+    assert status == 202
+    assert job["status"] in (JobStatus.QUEUED, JobStatus.RUNNING, JobStatus.DONE)
+
+    status, job = make_request(f"{base_url}/jobs/{job['id']}?wait=5")
+    assert status == 200
+    assert job["status"] == JobStatus.DONE
+    assert job["file_path"] == "/foo/bar.html"
+
+    patch.stopall()
+
+
+def test_server_rejects_bad_requests(server):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    status, __ = make_request(f"{base_url}/jobs", {"foo": "bar"})
+    assert status == 400
+    status, __ = make_request(f"{base_url}/jobs/unknown")
+    assert status == 404
+
+
+def test_create_server_raises_if_output_does_not_exist():
+    patch("logging.Logger.error").start()
+
+    with pytest.raises(RuntimeError):
+        create_server("/folder/that/does/not/exists", port=0)
+
+    patch.stopall()
+
+
+def test_job_queue_stop_fails_queued_jobs_without_waiting_for_them():
+    with TemporaryDirectory() as folder:
+        release = threading.Event()
+
+        def download_with_report(*args):
+            release.wait(5)
+            return DownloadReport(file_path="/foo/bar.html", failures=[])
+
+        patch(
+            "page_loader.server.download_with_report", side_effect=download_with_report
+        ).start()
+        jobs = JobQueue(output=folder, workers=2, queue_size=2)
+        jobs.start()
+        running = [jobs.submit("https://foo.bar/1"), jobs.submit("https://foo.bar/2")]
+        while jobs.stats()["running"] < 2:
+            time.sleep(0.01)
+        queued = [jobs.submit("https://foo.bar/3"), jobs.submit("https://foo.bar/4")]
+
+        stopper = threading.Thread(target=jobs.stop)
+        stopper.start()
+        for job in queued:
+            assert job.finished.wait(5), "queued jobs shouldn't wait for the workers"
+            assert job.status == JobStatus.FAILED
+        with pytest.raises(QueueFullError):
+            jobs.submit("https://foo.bar/5")
+        release.set()
+        stopper.join(5)
+
+        assert not stopper.is_alive()
+        assert [job.status for job in running] == [JobStatus.DONE, JobStatus.DONE]
+
+    patch.stopall()
+
+
+def test_create_server_starts_no_workers_if_port_is_taken(server):
+    threads_count = threading.active_count()
+
+    with TemporaryDirectory() as folder:
+        with pytest.raises(OSError):
+            create_server(folder, port=server.server_address[1], workers=2)
+
+    assert threading.active_count() == threads_count
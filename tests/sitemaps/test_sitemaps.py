@@ -0,0 +1,154 @@
+import gzip
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+from page_loader.batch import BatchQueue, PageStatus
+from page_loader.sitemaps import (
+    SitemapEntry,
+    ingest_sitemap,
+    iterate_sitemap_urls,
+    parse_lastmod,
+    parse_sitemap,
+    ungzip,
+)
+
+NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def make_urlset(*entries) -> bytes:
+    urls = "".join(
+        f"<url><loc>{loc}</loc>"
+        + (f"<lastmod>{lastmod}</lastmod>" if lastmod else "")
+        + "</url>"
+        for loc, lastmod in entries
+    )
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<urlset xmlns="{NAMESPACE}">{urls}</urlset>'
+    ).encode()
+
+
+def make_sitemap_index(*entries) -> bytes:
+    sitemaps = "".join(
+        f"<sitemap><loc>{loc}</loc><lastmod>{lastmod}</lastmod></sitemap>"
+        for loc, lastmod in entries
+    )
+    return f'<sitemapindex xmlns="{NAMESPACE}">{sitemaps}</sitemapindex>'.encode()
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-01-31", datetime(2024, 1, 31, tzinfo=timezone.utc)),
+        ("2024-01-31T10:00:00Z", datetime(2024, 1, 31, 10, tzinfo=timezone.utc)),
+        (
+            " 2024-01-31T10:00:00+03:00 ",
+            datetime(2024, 1, 31, 10, tzinfo=timezone(timedelta(hours=3))),
+        ),
+        ("yesterday", None),
+        (None, None),
+    ],
+)
+def test_parse_lastmod(value, expected):
+    assert parse_lastmod(value) == expected
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_parse_sitemap(compress):
+    content = make_urlset(
+        ("https://foo.bar/a", "2024-01-31"), ("https://foo.bar/b", None)
+    )
+    if compress:
+        content = gzip.compress(content)
+
+    entries = list(parse_sitemap(ungzip(BytesIO(content))))
+
+    assert entries == [
+        SitemapEntry("url", "https://foo.bar/a", parse_lastmod("2024-01-31")),
+        SitemapEntry("url", "https://foo.bar/b"),
+    ]
+
+
+def test_parse_sitemap_url_list():
+    content = b"https://foo.bar/a\n\n# comment\r\nhttps://foo.bar/b\r\n"
+
+    entries = list(parse_sitemap(ungzip(BytesIO(content))))
+
+    assert [entry.loc for entry in entries] == [
+        "https://foo.bar/a",
+        "https://foo.bar/b",
+    ]
+
+
+def test_parse_sitemap_yields_entries_while_reading():
+    content = make_urlset(("https://foo.bar/a", None)).replace(
+        b"</urlset>", b"<url><loc>broken" + b" " * 100000
+    )
+    entries = parse_sitemap(ungzip(BytesIO(content)))
+
+    assert next(entries).loc == "https://foo.bar/a"
+    with pytest.raises(SyntaxError):
+        next(entries)
+
+
+def test_iterate_sitemap_urls_follows_index_and_skips_old_entries():
+    with TemporaryDirectory() as folder:
+        new_sitemap = Path(folder).joinpath("new.xml.gz")
+        new_sitemap.write_bytes(
+            gzip.compress(
+                make_urlset(
+                    ("https://foo.bar/new", "2024-02-01"),
+                    ("https://foo.bar/old", "2023-12-01"),
+                    ("https://foo.bar/unknown", None),
+                )
+            )
+        )
+        old_sitemap = Path(folder).joinpath("old.xml")
+        old_sitemap.write_bytes(make_urlset(("https://foo.bar/older", None)))
+        index = Path(folder).joinpath("index.xml")
+        index.write_bytes(
+            make_sitemap_index(
+                (new_sitemap, "2024-02-01"),
+                (old_sitemap, "2023-12-01"),
+                (index, "2024-02-01"),
+            )
+        )
+
+        urls = iterate_sitemap_urls(str(index), since=parse_lastmod("2024-01-01"))
+
+        assert list(urls) == ["https://foo.bar/new", "https://foo.bar/unknown"]
+
+
+def test_ingest_sitemap_adds_pages_modified_since_previous_ingestion():
+    sitemaps = [
+        make_urlset(("https://foo.bar/a", "2024-01-01"), ("https://foo.bar/b", None)),
+        make_urlset(
+            ("https://foo.bar/a", "2024-01-01"),
+            ("https://foo.bar/b", "2999-01-01"),
+            ("https://foo.bar/c", "2999-01-01"),
+        ),
+    ]
+
+    @contextmanager
+    def stream_page(page_url, options):
+        yield BytesIO(gzip.compress(sitemaps.pop(0)))
+
+    with TemporaryDirectory() as folder:
+        patch("page_loader.sitemaps.stream_page", side_effect=stream_page).start()
+        queue = BatchQueue(Path(folder).joinpath("queue.sqlite"))
+
+        assert ingest_sitemap(queue, "https://foo.bar/sitemap.xml.gz") == 2
+
+        queue.complete(queue.claim("worker"), "a.html")
+        queue.complete(queue.claim("worker"), "b.html")
+
+        assert ingest_sitemap(queue, "https://foo.bar/sitemap.xml.gz") == 2
+        assert queue.stats()[PageStatus.PENDING] == 2
+        assert queue.stats()[PageStatus.DONE] == 1
+
+        patch.stopall()
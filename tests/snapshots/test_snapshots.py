@@ -0,0 +1,168 @@
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import pytest
+from page_loader.context import DownloadReport
+from page_loader.snapshots import (
+    SnapshotStore,
+    apply_delta,
+    make_delta,
+    save_snapshot,
+)
+
+PAGE_URL = "https://foo.bar/page"
+PAGE_NAME = "foo-bar-page.html"
+ASSET_NAME = "foo-bar-page_files/foo-bar-a.png"
+
+
+def make_page(paragraphs: int, changed: int = -1) -> bytes:
+    lines = [
+        f"  <p>\n   paragraph {index}{' changed' if index == changed else ''}\n  </p>\n"
+        for index in range(paragraphs)
+    ]
+    return f"<html>\n <body>\n{''.join(lines)} </body>\n</html>".encode()
+
+
+def write_pages(folder: Path, page: bytes, asset: bytes = b"\x89PNG" * 1000) -> None:
+    folder.joinpath(PAGE_NAME).write_bytes(page)
+    folder.joinpath(ASSET_NAME).parent.mkdir(exist_ok=True)
+    folder.joinpath(ASSET_NAME).write_bytes(asset)
+
+
+def test_apply_delta_restores_content():
+    base = "<p>\nпривет\n</p>\n".encode("cp1251") + b"\xff\n"
+    content = b"<div>\n" + base + b"\xfe tail"
+
+    assert apply_delta(base, make_delta(base, content)) == content
+    assert apply_delta(base, make_delta(base, b"")) == b""
+
+
+def test_make_delta_is_linear():
+    small_base, small_page = make_page(500), make_page(500, changed=250)
+    large_base, large_page = make_page(50000), make_page(50000, changed=25000)
+
+    started_at = time.perf_counter()
+    make_delta(small_base, small_page)
+    small_duration = time.perf_counter() - started_at
+    started_at = time.perf_counter()
+    delta = make_delta(large_base, large_page)
+    large_duration = time.perf_counter() - started_at
+
+    assert len(delta) == 3, "unchanged lines should be copied in two ranges"
+    assert apply_delta(large_base, delta) == large_page
+    # 100x input, generous bound to keep the test stable
+    assert large_duration < max(small_duration, 0.001) * 400
+
+
+def test_save_stores_delta_of_not_ascii_page():
+    with TemporaryDirectory() as root, TemporaryDirectory() as folder:
+        store = SnapshotStore(Path(root))
+        page = make_page(200).decode().replace("paragraph", "абзац").encode()
+        write_pages(Path(folder), page)
+        store.save(Path(folder), [PAGE_URL])
+        changed_page = page.replace("абзац 100\n".encode(), "абзац сто\n".encode())
+        write_pages(Path(folder), changed_page)
+
+        version = store.save(Path(folder), [PAGE_URL])
+
+        assert 0 < version.stored_bytes < 200, "inserted bytes shouldn't be escaped"
+        assert store.read(version.files[PAGE_NAME]) == changed_page
+
+
+def test_save_shares_unchanged_files_and_stores_page_delta():
+    with TemporaryDirectory() as root, TemporaryDirectory() as first_folder:
+        store = SnapshotStore(Path(root))
+        with TemporaryDirectory() as second_folder:
+            first_page = make_page(200)
+            second_page = make_page(200, changed=100)
+            write_pages(Path(first_folder), first_page)
+            write_pages(Path(second_folder), second_page)
+
+            first = store.save(Path(first_folder), [PAGE_URL])
+            second = store.save(Path(second_folder), [PAGE_URL])
+
+        assert (first.id, second.id) == (1, 2)
+        assert first.files[ASSET_NAME] == second.files[ASSET_NAME]
+        assert first.stored_bytes == len(first_page) + 4000
+        assert 0 < second.stored_bytes < 200, "only the changed line is stored"
+        assert store.versions() == [first, second]
+        assert store.read(second.files[PAGE_NAME]) == second_page
+
+        with TemporaryDirectory() as output:
+            file_paths = store.materialize(2, Path(output))
+
+            assert file_paths == [str(Path(output, PAGE_NAME).resolve())]
+            assert Path(output, PAGE_NAME).read_bytes() == second_page
+            assert Path(output, ASSET_NAME).read_bytes() == b"\x89PNG" * 1000
+
+
+def test_save_stores_whole_page_if_delta_is_larger():
+    with TemporaryDirectory() as root, TemporaryDirectory() as folder:
+        store = SnapshotStore(Path(root))
+        write_pages(Path(folder), b"<p>\nfirst\n</p>")
+        store.save(Path(folder), [PAGE_URL])
+        write_pages(Path(folder), b"<p>\nsecond\n</p>")
+
+        version = store.save(Path(folder), [PAGE_URL])
+
+        assert version.stored_bytes == len(b"<p>\nsecond\n</p>")
+        assert not list(Path(root, "deltas").iterdir())
+
+
+def test_prune_keeps_bases_of_kept_deltas():
+    with TemporaryDirectory() as root, TemporaryDirectory() as folder:
+        store = SnapshotStore(Path(root))
+        for changed in (-1, 1, 2):
+            write_pages(Path(folder), make_page(200, changed=changed))
+            store.save(Path(folder), [PAGE_URL])
+
+        assert store.prune(keep=2) == [1]
+        assert [version.id for version in store.versions()] == [2, 3]
+        assert store.read(store.get_version(3).files[PAGE_NAME]) == make_page(
+            200, changed=2
+        )
+
+        write_pages(Path(folder), b"<p>\nnew\n</p>", asset=b"new")
+        store.save(Path(folder), [PAGE_URL])
+
+        assert store.prune(keep=1) == [2, 3]
+        assert len(list(Path(root, "objects").iterdir())) == 2
+        assert not list(Path(root, "deltas").iterdir())
+
+
+def test_materialize_raises_if_version_does_not_exist():
+    with TemporaryDirectory() as root:
+        patch("logging.Logger.error").start()
+
+        with pytest.raises(RuntimeError):
+            SnapshotStore(Path(root)).materialize(1, Path(root))
+
+        patch.stopall()
+
+
+def test_save_snapshot_leaves_out_failed_pages():
+    def download_with_report(page_url, output, options):
+        if page_url == "https://foo.bar/broken":
+            raise RuntimeError("boom")
+        write_pages(Path(output), make_page(10))
+        return DownloadReport(file_path=str(Path(output, PAGE_NAME)), failures=[])
+
+    with TemporaryDirectory() as root:
+        patch(
+            "page_loader.snapshots.download_with_report",
+            side_effect=download_with_report,
+        ).start()
+        patch("logging.Logger.error").start()
+        store = SnapshotStore(Path(root))
+
+        version = save_snapshot(store, [PAGE_URL, "https://foo.bar/broken"])
+
+        assert version.pages == (PAGE_URL,)
+        assert set(version.files) == {PAGE_NAME, ASSET_NAME}
+        assert not list(store.staging_folder.iterdir())
+        with pytest.raises(RuntimeError):
+            save_snapshot(store, ["https://foo.bar/broken"])
+
+        patch.stopall()
@@ -0,0 +1,79 @@
+import pytest
+from page_loader.srcset import (
+    SRCSET_ALL,
+    SRCSET_LARGEST,
+    SRCSET_SMALLEST,
+    SrcsetCandidate,
+    parse_srcset,
+    select_candidates,
+    serialize_srcset,
+)
+
+
+@pytest.mark.parametrize(
+    "srcset, expected_candidates",
+    [
+        pytest.param(
+            "a.jpg 1x, b.jpg 2x",
+            [SrcsetCandidate("a.jpg", "1x"), SrcsetCandidate("b.jpg", "2x")],
+            id="densities",
+        ),
+        pytest.param(
+            "/img/a.jpg 480w,/img/b.jpg 800w",
+            [
+                SrcsetCandidate("/img/a.jpg", "480w"),
+                SrcsetCandidate("/img/b.jpg", "800w"),
+            ],
+            id="widths without spaces after comma",
+        ),
+        pytest.param(
+            "a.jpg, b.jpg 2x",
+            [SrcsetCandidate("a.jpg"), SrcsetCandidate("b.jpg", "2x")],
+            id="candidate without descriptor",
+        ),
+        pytest.param(
+            "data:image/png;base64,AAA 1x, b.jpg 2x",
+            [
+                SrcsetCandidate("data:image/png;base64,AAA", "1x"),
+                SrcsetCandidate("b.jpg", "2x"),
+            ],
+            id="data url with comma",
+        ),
+        pytest.param("", [], id="empty"),
+    ],
+)
+def test_parse_srcset(srcset, expected_candidates):
+    assert parse_srcset(srcset) == expected_candidates
+
+
+def test_serialize_srcset():
+    candidates = [SrcsetCandidate("a.jpg", "480w"), SrcsetCandidate("b.jpg")]
+
+    assert serialize_srcset(candidates) == "a.jpg 480w, b.jpg"
+
+
+@pytest.mark.parametrize(
+    "policy, expected_urls",
+    [
+        (SRCSET_ALL, ["a.jpg", "b.jpg", "c.jpg"]),
+        (SRCSET_LARGEST, ["b.jpg"]),
+        (SRCSET_SMALLEST, ["c.jpg"]),
+    ],
+)
+def test_select_candidates(policy, expected_urls):
+    candidates = parse_srcset("a.jpg 800w, b.jpg 1600w, c.jpg 320w")
+
+    selected_candidates = select_candidates(candidates, policy)
+
+    assert [candidate.url for candidate in selected_candidates] == expected_urls
+
+
+def test_select_candidates_treats_missing_descriptor_as_1x():
+    candidates = parse_srcset("a.jpg, b.jpg 2x")
+
+    assert select_candidates(candidates, SRCSET_SMALLEST) == [SrcsetCandidate("a.jpg")]
+
+
+def test_select_candidates_raises_on_unknown_policy():
+    with pytest.raises(ValueError):
+        select_candidates([], "foo")
@@ -0,0 +1,83 @@
+import pytest
+from bs4 import BeautifulSoup
+from page_loader.urls import (
+    UrlResolver,
+    get_base_url,
+    get_url_resolver,
+    normalize_url,
+    remove_dot_segments,
+)
+
+
+@pytest.mark.parametrize(
+    "path, expected_path",
+    [
+        ("/a/b/c/./../../g", "/a/g"),
+        ("/a/b/../c/", "/a/c/"),
+        ("/../a", "/a"),
+        ("/a/..", "/"),
+        ("/a/.", "/a/"),
+        ("", ""),
+    ],
+)
+def test_remove_dot_segments(path, expected_path):
+    assert remove_dot_segments(path) == expected_path
+
+
+@pytest.mark.parametrize(
+    "url, expected_url",
+    [
+        pytest.param(
+            "HTTPS://Foo.BAR:443/Assets/a.png",
+            "https://foo.bar/Assets/a.png",
+            id="scheme, host and default port",
+        ),
+        pytest.param(
+            "http://foo.bar:8080/a/../b.png?x=1#top",
+            "http://foo.bar:8080/b.png?x=1",
+            id="dot segments and fragment",
+        ),
+        pytest.param("http://foo.bar", "http://foo.bar/", id="empty path"),
+        pytest.param("http://user@Foo.bar:80/", "http://user@foo.bar/", id="user info"),
+        pytest.param("data:image/png;base64,AA", "data:image/png;base64,AA", id="data"),
+    ],
+)
+def test_normalize_url(url, expected_url):
+    assert normalize_url(url) == expected_url
+
+
+@pytest.mark.parametrize(
+    "reference, expected_url",
+    [
+        ("/assets/a.png", "https://foo.bar/assets/a.png"),
+        ("a.png", "https://foo.bar/blog/a.png"),
+        ("../a.png", "https://foo.bar/a.png"),
+        ("./a.png?v=2", "https://foo.bar/blog/a.png?v=2"),
+        ("//cdn.foo.bar/a.js", "https://cdn.foo.bar/a.js"),
+        ("http://Other.com:80/a.js", "http://other.com/a.js"),
+        (" /a.png\n", "https://foo.bar/a.png"),
+    ],
+)
+def test_url_resolver_resolve(reference, expected_url):
+    resolver = UrlResolver("https://foo.bar/blog/post")
+
+    assert resolver.resolve(reference) == expected_url
+
+
+def test_get_url_resolver_reuses_resolver_of_base_url():
+    assert get_url_resolver("https://foo.bar/") is get_url_resolver("https://foo.bar/")
+
+
+@pytest.mark.parametrize(
+    "content, expected_base_url",
+    [
+        ('<base href="/static/">', "https://foo.bar/static/"),
+        ('<base href="https://CDN.foo.bar/x/">', "https://cdn.foo.bar/x/"),
+        ('<base target="_blank">', None),
+        ("<p>no base</p>", None),
+    ],
+)
+def test_get_base_url(content, expected_base_url):
+    soup = BeautifulSoup(content, features="html.parser")
+
+    assert get_base_url(soup, "https://foo.bar/page") == expected_base_url